@@ -0,0 +1,619 @@
+import argparse
+import base64
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+import io
+import json
+from pathlib import Path
+import platform
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import zlib
+
+textbook_root_path = Path(__file__).parents[1]
+sys.path.insert(0, str(textbook_root_path))
+
+from scripts.create_indices import (  # noqa: E402
+    create_flat_index,
+    create_hier_index,
+    scan_content,
+)
+from scripts.create_sidebar_html import _build_dynamic_sidebar  # noqa: E402
+from scripts.execute_and_convert_nbs import (  # noqa: E402
+    execute_and_convert_nbs_to_json,
+    load_nb_json_output,
+)
+from scripts.generate_page_html import _add_nb_to_html, generate_page_html  # noqa: E402
+from scripts.nb_output_index import (  # noqa: E402
+    _load_nb_output_index,
+    read_nb_output_sections,
+)
+
+# Bump this whenever the layout of saved results changes, or the synthetic textbook
+# changes in a way that makes timings incomparable to those of earlier results
+BENCHMARK_RESULTS_FORMAT_VERSION = 1
+
+# Results are saved here by default, as '<commit>.json' (or '<commit>-dirty.json' if
+# the working tree has uncommitted changes), see `_get_results_path`
+default_results_path = textbook_root_path / "benchmarks" / "results"
+
+# Parts of the build that are timed, in the order they are run
+# --------------------------------------------------------------------------------------
+# - "scan_content": One walk of the content directory, reading every markdown file
+# - "create_hier_index": The hierarchical index, from its own walk
+# - "create_flat_index": The flat index, from its own walk
+# - "_build_dynamic_sidebar": The navigation links of the sidebar shared by every page
+# - "execute_and_convert_nbs_to_json": Converting every (already executed) notebook to
+#     its JSON output, with no execution and no Pandoc cache
+# - "load_nb_json_output": Parsing the whole JSON output file of every notebook
+# - "read_nb_output_sections": Reading every notebook through its index file, with an
+#     empty in-memory cache
+# - "_add_nb_to_html": Embedding a notebook section in every page
+# - "generate_page_html": Generating every page, with no caches
+# - "generate_page_html (unchanged)": Generating every page again, when none of them
+#     have changed since the last time
+BENCHMARK_STAGES = (
+    "scan_content",
+    "create_hier_index",
+    "create_flat_index",
+    "_build_dynamic_sidebar",
+    "execute_and_convert_nbs_to_json",
+    "load_nb_json_output",
+    "read_nb_output_sections",
+    "_add_nb_to_html",
+    "generate_page_html",
+    "generate_page_html (unchanged)",
+)
+
+
+def _make_png(width, height, seed):
+    """Make a PNG image of pseudo-random grayscale noise, which hardly compresses."""
+
+    def _chunk(chunk_type, data):
+        chunk = chunk_type + data
+        return (
+            struct.pack(">I", len(data)) + chunk + struct.pack(">I", zlib.crc32(chunk))
+        )
+
+    rows = []
+    state = seed or 1
+    for _ in range(height):
+        row = bytearray([0])  # No filter
+        for _ in range(width):
+            # xorshift32
+            state ^= (state << 13) & 0xFFFFFFFF
+            state ^= state >> 17
+            state ^= (state << 5) & 0xFFFFFFFF
+            row.append(state & 0xFF)
+        rows.append(bytes(row))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + _chunk(b"IDAT", zlib.compress(b"".join(rows)))
+        + _chunk(b"IEND", b"")
+    )
+
+
+def _make_nb(n_cells, n_images, nb_idx):
+    """
+    Make an executed notebook with `n_cells` cells, as a dict in the nbformat 4 layout.
+
+    Every fourth cell is a markdown cell starting a new '## Part <n>' section, and the
+    rest are code cells with text output, `n_images` of which also output a PNG image.
+    """
+    cells = []
+    # Spread the images evenly over the code cells
+    n_code_cells = n_cells - (n_cells + 3) // 4
+    image_cell_idxs = {
+        image_idx * n_code_cells // n_images
+        for image_idx in range(min(n_images, n_code_cells))
+    }
+    code_cell_idx = 0
+    for cell_idx in range(n_cells):
+        cell_id = f"cell-{nb_idx}-{cell_idx}"
+        if cell_idx % 4 == 0:
+            cells.append(
+                {
+                    "cell_type": "markdown",
+                    "id": cell_id,
+                    "metadata": {},
+                    "source": (
+                        f"## Part {cell_idx // 4 + 1}\n\n"
+                        "This part of the notebook *simulates* a network, and plots "
+                        "its `dipole` with [a link](https://hnn.brown.edu), where "
+                        "$I = V / R$."
+                    ),
+                }
+            )
+            continue
+        outputs = [
+            {
+                "name": "stdout",
+                "output_type": "stream",
+                "text": [f"Simulating trial {trial}...\n" for trial in range(5)],
+            }
+        ]
+        if code_cell_idx in image_cell_idxs:
+            png = _make_png(160, 120, seed=nb_idx * 1000 + cell_idx)
+            outputs.append(
+                {
+                    "data": {
+                        "image/png": base64.b64encode(png).decode("ascii"),
+                        "text/plain": ["<Figure size 640x480 with 1 Axes>"],
+                    },
+                    "metadata": {},
+                    "output_type": "display_data",
+                }
+            )
+        cells.append(
+            {
+                "cell_type": "code",
+                "execution_count": code_cell_idx + 1,
+                "id": cell_id,
+                "metadata": {},
+                "outputs": outputs,
+                "source": (
+                    "from hnn_core import jones_2009_model, simulate_dipole\n"
+                    "\n"
+                    f"net = jones_2009_model(seed={cell_idx})\n"
+                    "dpls = simulate_dipole(net, tstop=170.0, n_trials=5)\n"
+                    "for dpl in dpls:\n"
+                    "    dpl.smooth(30).scale(3000)\n"
+                    "dpls[0].plot()"
+                ),
+            }
+        )
+        code_cell_idx += 1
+    return {
+        "cells": cells,
+        "metadata": {
+            "kernelspec": {
+                "display_name": "Python 3",
+                "language": "python",
+                "name": "python3",
+            },
+            "language_info": {"name": "python"},
+        },
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+
+
+def _write_synthetic_textbook(
+    root_path,
+    n_sections,
+    n_pages,
+    n_cells,
+    n_images,
+    n_bib_entries,
+):
+    """
+    Write a synthetic textbook to `root_path`, in the same layout as this repository.
+
+    The textbook has a preface page, and `n_sections` sections of `n_pages` pages each.
+    Every section has a notebook with `n_cells` cells and `n_images` images (see
+    `_make_nb`), and each of its pages embeds one part of that notebook (cycling
+    through them), cites two entries of the bibliography (which has `n_bib_entries`
+    entries), and has some typical markdown. The real templates and stylesheet are
+    used.
+
+    Returns the paths of the notebooks.
+    """
+    content_path = root_path / "content"
+    (content_path / "assets").mkdir(parents=True)
+    shutil.copy(
+        textbook_root_path / "content" / "assets" / "styles.css",
+        content_path / "assets" / "styles.css",
+    )
+    shutil.copytree(textbook_root_path / "templates", root_path / "templates")
+    (root_path / "scripts").mkdir()
+    with open(root_path / "scripts" / "nbs_to_skip.json", "w") as f:
+        json.dump({"skip_if_stable": [], "skip_if_dev": []}, f)
+
+    with open(root_path / "textbook-bibliography.bib", "w") as f:
+        for entry_idx in range(n_bib_entries):
+            f.write(
+                textwrap.dedent(f"""\
+                @article{{synthetic_{entry_idx:05d},
+                  title = {{Synthetic Results, Part {entry_idx}}},
+                  author = {{Author, Alice and Other, Bob and Third, Carol}},
+                  journal = {{Journal of Synthetic Neuroscience}},
+                  volume = {{{entry_idx % 50 + 1}}},
+                  pages = {{{entry_idx}--{entry_idx + 10}}},
+                  year = {{{1990 + entry_idx % 35}}},
+                }}
+
+            """)
+            )
+
+    def _write_page(md_path, title, body):
+        md_path.write_text(
+            f"<!--\n# Title: {title}\n# Updated: 2025-01-01\n-->\n\n# {title}\n\n{body}"
+        )
+
+    _write_page(content_path / "00_preface.md", "Preface", "Welcome.\n")
+
+    nb_paths = []
+    n_nb_parts = (n_cells + 3) // 4
+    for section_idx in range(1, n_sections + 1):
+        section_path = content_path / f"{section_idx:02d}_section"
+        (section_path / "images").mkdir(parents=True)
+        (section_path / "images" / "figure.png").write_bytes(
+            _make_png(320, 240, seed=section_idx)
+        )
+        (section_path / "README.md").write_text(
+            f"<!--\n# Title: {section_idx}. Section {section_idx}\n-->\n"
+        )
+        nb_path = section_path / f"section_{section_idx:02d}_notebook.ipynb"
+        with open(nb_path, "w") as f:
+            json.dump(_make_nb(n_cells, n_images, section_idx), f, indent=1)
+        nb_paths.append(nb_path)
+
+        for page_idx in range(1, n_pages + 1):
+            cited_entries = [
+                (section_idx * n_pages + page_idx + offset) % max(1, n_bib_entries)
+                for offset in (0, 7)
+            ]
+            citations = (
+                " [" + "; ".join(f"@synthetic_{idx:05d}" for idx in cited_entries) + "]"
+                if n_bib_entries
+                else ""
+            )
+            nb_embed = (
+                f"[[{nb_path.name}][Part {(page_idx - 1) % n_nb_parts + 1}]]\n"
+                if n_nb_parts
+                else ""
+            )
+            _write_page(
+                section_path / f"{page_idx:02d}_page_{page_idx}.md",
+                f"{section_idx}.{page_idx} Page {page_idx}",
+                (
+                    "Evoked responses are simulated with **exogenous drives**, and "
+                    f"compared to recordings{citations}.\n\n"
+                    "- A list item with `code`\n- Another, with $x^2$\n\n"
+                    "![A figure](images/figure.png)\n\n"
+                    f"{nb_embed}"
+                ),
+            )
+    return nb_paths
+
+
+def _time_call(func, n_repeats, setup=None):
+    """
+    Time `func` `n_repeats` times, calling `setup` (if given) untimed before each run.
+
+    Anything printed while running is hidden. Returns the duration (in seconds) of
+    every run.
+    """
+    durations = []
+    for _ in range(n_repeats):
+        with redirect_stdout(io.StringIO()):
+            if setup is not None:
+                setup()
+            start_time = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start_time)
+    return durations
+
+
+def _run_benchmarks(root_path, nb_paths, n_repeats, n_jobs):
+    """
+    Time every stage in `BENCHMARK_STAGES` on a synthetic textbook.
+
+    Returns a mapping of each stage to the durations of its runs.
+    """
+    content_path = root_path / "content"
+    templates_path = root_path / "templates"
+    build_cache_path = root_path / ".build_cache"
+    json_paths = [nb_path.with_suffix(".json") for nb_path in nb_paths]
+    timings = {}
+
+    # Indices and sidebar
+    # ----------------------------------------------------------------------------------
+    timings["scan_content"] = _time_call(lambda: scan_content(content_path), n_repeats)
+    timings["create_hier_index"] = _time_call(
+        lambda: create_hier_index(content_path),
+        n_repeats,
+    )
+    timings["create_flat_index"] = _time_call(
+        lambda: create_flat_index(content_path, False),
+        n_repeats,
+    )
+    hier_index = create_hier_index(content_path)
+    flat_index = create_flat_index(content_path, False)
+    timings["_build_dynamic_sidebar"] = _time_call(
+        lambda: _build_dynamic_sidebar(hier_index, flat_index),
+        n_repeats,
+    )
+
+    # Notebooks
+    # ----------------------------------------------------------------------------------
+    def _remove_nb_hashes():
+        (root_path / "scripts" / "nb_hashes.json").unlink(missing_ok=True)
+
+    timings["execute_and_convert_nbs_to_json"] = _time_call(
+        lambda: execute_and_convert_nbs_to_json(
+            content_path,
+            root_path / "scripts" / "nb_hashes.json",
+            root_path / "scripts" / "nbs_to_skip.json",
+            "no-execution",
+            False,
+            None,
+            False,
+            n_jobs=n_jobs,
+        ),
+        n_repeats,
+        setup=_remove_nb_hashes,
+    )
+    timings["load_nb_json_output"] = _time_call(
+        lambda: [
+            load_nb_json_output(nb_path, nb_path.parent) for nb_path in nb_paths
+        ],
+        n_repeats,
+    )
+    timings["read_nb_output_sections"] = _time_call(
+        lambda: [read_nb_output_sections(json_path) for json_path in json_paths],
+        n_repeats,
+        setup=_load_nb_output_index.cache_clear,
+    )
+
+    # Pages
+    # ----------------------------------------------------------------------------------
+    # The notebook embeds as they are after Pandoc has converted each page
+    nb_embeds = [
+        (page["absolute_input_md_path"].parent, embed_line)
+        for page in flat_index
+        for embed_line in page["absolute_input_md_path"].read_text().splitlines()
+        if embed_line.startswith("[[")
+    ]
+    timings["_add_nb_to_html"] = _time_call(
+        lambda: [
+            _add_nb_to_html(f"<p>{embed_line}</p>", input_dir_path, False)
+            for input_dir_path, embed_line in nb_embeds
+        ],
+        n_repeats,
+        setup=_load_nb_output_index.cache_clear,
+    )
+
+    def _generate_pages(page_dependencies_path=None):
+        generate_page_html(
+            content_path,
+            templates_path,
+            False,
+            page_dependencies_path=page_dependencies_path,
+            n_jobs=n_jobs,
+        )
+
+    timings["generate_page_html"] = _time_call(
+        _generate_pages,
+        n_repeats,
+        setup=_load_nb_output_index.cache_clear,
+    )
+    page_dependencies_path = build_cache_path / "page_dependencies.json"
+    with redirect_stdout(io.StringIO()):
+        _generate_pages(page_dependencies_path)
+    timings["generate_page_html (unchanged)"] = _time_call(
+        lambda: _generate_pages(page_dependencies_path),
+        n_repeats,
+        setup=_load_nb_output_index.cache_clear,
+    )
+    return timings
+
+
+def _get_git_commit():
+    """Get the current commit, and whether the working tree has uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=textbook_root_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=textbook_root_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(status.strip())
+
+
+def _get_results_path(results_dir, commit, is_dirty):
+    """Get the default path of the results of a commit, see `default_results_path`."""
+    name = commit[:12] if commit is not None else "unknown"
+    if is_dirty:
+        name += "-dirty"
+    return results_dir / f"{name}.json"
+
+
+def _print_comparison(results, prior_results):
+    """Print the median time of every stage next to that of earlier results."""
+    print(
+        "Benchmark: Comparing with results of commit "
+        f"{(prior_results.get('commit') or 'unknown')[:12]}"
+    )
+    if prior_results.get("format_version") != BENCHMARK_RESULTS_FORMAT_VERSION:
+        print("Benchmark: WARNING: Results were saved by another benchmark version.")
+    if prior_results.get("parameters") != results["parameters"]:
+        print("Benchmark: WARNING: Results are for a different synthetic textbook.")
+    for scale, stages in results["scales"].items():
+        prior_stages = prior_results.get("scales", {}).get(scale)
+        if prior_stages is None:
+            continue
+        for stage, timing in stages.items():
+            if stage not in prior_stages:
+                continue
+            prior_median = prior_stages[stage]["median"]
+            ratio = timing["median"] / prior_median if prior_median else float("nan")
+            print(
+                f"Benchmark: scale {scale}: {stage}: {prior_median:.4f} s -> "
+                f"{timing['median']:.4f} s ({ratio:.2f}x)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=textwrap.dedent("""
+Time the build pipeline on synthetic textbooks: index creation, sidebar construction,
+notebook-to-JSON conversion, notebook JSON loading, notebook embedding, and page
+generation. Notebooks are never executed, so hnn-core is not needed, but Pandoc is.
+
+Every textbook has a preface page, and '--sections' sections of '--pages' pages each.
+Every section has a notebook with '--cells' cells and '--images' images, which its
+pages embed parts of, and every page cites a bibliography of '--bib-entries' entries.
+With '--scales', the number of sections is multiplied by each scale in turn, to show
+how each stage scales with the size of the textbook.
+
+Results are saved to 'benchmarks/results/<commit>.json' (see '--output'), so that they
+can be compared across commits with '--compare'.
+"""),
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--sections",
+        type=int,
+        default=8,
+        help="Number of sections. Defaults to 8.",
+    )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        default=10,
+        help="Number of pages in every section. Defaults to 10.",
+    )
+    parser.add_argument(
+        "--cells",
+        type=int,
+        default=40,
+        help="Number of cells in every notebook. Defaults to 40.",
+    )
+    parser.add_argument(
+        "--images",
+        type=int,
+        default=8,
+        help="Number of images in every notebook. Defaults to 8.",
+    )
+    parser.add_argument(
+        "--bib-entries",
+        type=int,
+        default=500,
+        help="Number of entries in the bibliography. Defaults to 500.",
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=[1],
+        help="Multipliers of the number of sections to benchmark. Defaults to 1.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of times to run each stage. Defaults to 3.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help=textwrap.dedent("""\
+Number of workers for notebook conversion and page generation, as in
+'python build.py --jobs'. Defaults to 1."""),
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help=textwrap.dedent("""\
+Path to save the results to. Defaults to 'benchmarks/results/<commit>.json', with a
+'-dirty' suffix if there are uncommitted changes."""),
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        default=None,
+        help="Path of earlier results to compare with, e.g. those of another commit.",
+    )
+    args = parser.parse_args()
+
+    parameters = {
+        "sections": args.sections,
+        "pages": args.pages,
+        "cells": args.cells,
+        "images": args.images,
+        "bib_entries": args.bib_entries,
+        "repeat": args.repeat,
+        "jobs": args.jobs,
+    }
+    commit, is_dirty = _get_git_commit()
+    results = {
+        "format_version": BENCHMARK_RESULTS_FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "dirty": is_dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "scales": {},
+    }
+
+    for scale in args.scales:
+        n_sections = args.sections * scale
+        print(
+            f"Benchmark: Scale {scale}: {n_sections} sections, "
+            f"{n_sections * args.pages + 1} pages, {n_sections} notebooks"
+        )
+        with tempfile.TemporaryDirectory(prefix="textbook-benchmark-") as tmp_dir:
+            root_path = Path(tmp_dir) / "textbook"
+            nb_paths = _write_synthetic_textbook(
+                root_path,
+                n_sections,
+                args.pages,
+                args.cells,
+                args.images,
+                args.bib_entries,
+            )
+            timings = _run_benchmarks(root_path, nb_paths, args.repeat, args.jobs)
+
+        results["scales"][str(scale)] = {}
+        for stage in BENCHMARK_STAGES:
+            durations = timings[stage]
+            results["scales"][str(scale)][stage] = {
+                "median": round(statistics.median(durations), 6),
+                "min": round(min(durations), 6),
+                "durations": [round(duration, 6) for duration in durations],
+            }
+            print(
+                f"Benchmark: scale {scale}: {stage}: "
+                f"{statistics.median(durations):.4f} s (median)"
+            )
+
+    results_path = args.output or _get_results_path(
+        default_results_path,
+        commit,
+        is_dirty,
+    )
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"Benchmark: Saved results to '{results_path}'")
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            _print_comparison(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
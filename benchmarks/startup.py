@@ -0,0 +1,105 @@
+import argparse
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import textwrap
+import time
+
+textbook_root_path = Path(__file__).parents[1]
+
+# Modules that are slow to import, and that builds which do not execute or convert
+# notebooks (and '--help') should never import
+HEAVY_MODULES = (
+    "hnn_core",
+    "neuron",
+    "matplotlib",
+    "scipy",
+    "nbformat",
+    "nbconvert",
+    "requests",
+    "PIL",
+)
+
+# Python snippets whose startup time is measured, each run in a fresh interpreter
+# --------------------------------------------------------------------------------------
+# - "build.py --help": Everything 'python build.py --help' imports
+# - "import generate_page_html": Everything an HTML-only build (i.e. with
+#     '--regenerate-html-only') imports before it starts generating pages
+# - "import hnn_core": For reference, the cost that the two above avoid
+STARTUP_SNIPPETS = {
+    "build.py --help": "import build",
+    "import generate_page_html": "import scripts.generate_page_html",
+    "import hnn_core": "import hnn_core",
+}
+
+
+def _time_snippet(snippet, n_repeats):
+    """
+    Time a Python snippet in fresh interpreters, and list the heavy modules it imports.
+
+    Returns the wall-clock duration (in seconds) of every run, including interpreter
+    startup, and the names of the `HEAVY_MODULES` that were imported.
+    """
+    check_imports = (
+        "import sys; "
+        "print('Imported:', "
+        f"','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    durations = []
+    for _ in range(n_repeats):
+        start_time = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", f"{snippet}; {check_imports}"],
+            cwd=textbook_root_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        durations.append(time.perf_counter() - start_time)
+    # hnn-core prints to stdout when it is imported, so only the last line is used
+    imported_modules = completed.stdout.splitlines()[-1].removeprefix("Imported:")
+    return durations, [m for m in imported_modules.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=textwrap.dedent("""
+Measure how long it takes to start the build, in fresh Python interpreters, and check
+that '--help' and HTML-only builds do not import hnn-core (or NEURON, etc.).
+
+Exits with status 1 if either of them imports any of the heavy modules.
+"""),
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of times to run each measurement. Defaults to 5.",
+    )
+    args = parser.parse_args()
+
+    # Interpreter startup on its own, which every measurement includes
+    baseline_durations, _ = _time_snippet("pass", args.repeat)
+    baseline = statistics.median(baseline_durations)
+    print(f"Benchmark: Python interpreter startup: {baseline:.3f} s (median)")
+
+    success = True
+    for name, snippet in STARTUP_SNIPPETS.items():
+        durations, imported_modules = _time_snippet(snippet, args.repeat)
+        print(
+            f"Benchmark: {name}: {statistics.median(durations) - baseline:.3f} s "
+            f"(median, excluding interpreter startup), imports "
+            f"{', '.join(imported_modules) or 'no heavy modules'}"
+        )
+        if snippet != "import hnn_core" and imported_modules:
+            success = False
+
+    if not success:
+        print("Benchmark: ERROR: Heavy modules are imported at startup.")
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
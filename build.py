@@ -2,9 +2,14 @@ import argparse
 from pathlib import Path
 import textwrap
 
+from scripts.create_indices import create_flat_index
 from scripts.execute_and_convert_nbs import execute_and_convert_nbs_to_json
 from scripts.generate_page_html import generate_page_html
+from scripts.optimize_images import is_image_optimization_available
+from scripts.pandoc_conversion import prune_md_conversion_cache
 from scripts.process_hnn_commit_hashes import get_hnn_commit_hash, validate_hnn_versions
+from scripts.profiling import enable_profiling, profile_phase, save_profile_report
+from scripts.serve import serve
 
 textbook_root_path = Path(__file__).parents[0]
 
@@ -81,7 +86,14 @@ Synopsis:
     updated), and 'output_nb_*' tends to store heavy image assets which tend *not* to
     change between hnn-core code versions. In other words, you should feel free to
     delete HTML files (which can do using `make clean`) but should refrain from deleting
-    JSON and 'output_nb_*' files.
+    JSON and 'output_nb_*' files. Images in 'output_nb_*' are named by a hash of their
+    contents (e.g. 'fig_3f2a9c0d1e4b5a67.png'), so unchanged figures keep their file
+    (and their git history) across re-executions, and any 'fig_*' image that is no
+    longer referenced by its notebook's output is deleted automatically. Next to each
+    JSON file, a '.nbidx' index file (see 'textbook/scripts/nb_output_index.py') stores
+    its metadata separately from its compressed HTML, so that reading either does not
+    require parsing the entire JSON file. Index files are not tracked on git, and are
+    rebuilt automatically whenever they are missing or their JSON file changes.
 
     For example, a valid and minimal file structure of the content directory might look
     like this, before website building:
@@ -135,7 +147,8 @@ Synopsis:
     want to indicate that a new or existing notebook should be skipped from execution.
 
     Data:
-        - nb_hashes.json : SHA-256 hashes of notebook content to detect changes
+        - nb_hashes.json : SHA-256 hashes of notebook code and markdown content to
+            detect changes
         - nbs_to_skip.json : List of notebooks to skip during execution
         - hier_index.json : Hierarchical page index (generated if --save-indices=True)
         - flat_index.json : Flat page index for navigation (generated if
@@ -159,6 +172,16 @@ Synopsis:
     ==================
     - textbook/textbook-bibliography.bib : BibTeX bibliography for citations in markdown
 
+    Build Cache Directory: 'textbook/.build_cache/'
+    ==============================================
+    This directory is created automatically and stores local caches that speed up
+    repeated builds (e.g. the HTML of previously-converted markdown pages and notebook
+    markdown cells, the inputs every HTML page was last generated from, so that
+    unchanged pages are not regenerated, the titles and references of every markdown
+    file, so that unchanged markdown files are not re-read, and the hnn-core versions
+    and commits last looked up online, see '--offline'). It is not committed, and can be
+    safely deleted at any time, which forces a full rebuild.
+
     Website Construction Process
     ----------------------------
     1. **Parse command-line arguments** to determine:
@@ -169,9 +192,11 @@ Synopsis:
             directory type to the '--build-directory' argument
 
     2. **Validate hnn-core installation** (via `get_hnn_commit_hash`):
-        - Retrieve installed hnn-core version/commit from `pip freeze`
+        - Retrieve installed hnn-core version/commit from its distribution metadata
+            (the same version/commit that `pip freeze` would report)
         - Fetch requested version/commit from PyPI or GitHub API (unless
-            '--code-version=no-check')
+            '--code-version=no-check'), or from the versions cached by previous builds
+            (see '--offline')
         - Verify installed version matches requested version (unless
             '--code-version=no-check')
         - Determine commit hash for notebook execution history tracking
@@ -183,7 +208,8 @@ Synopsis:
         - Execute notebooks based on '--execution-type' argument and skip list (i.e.
             'textbook/scripts/nbs_to_skip.json')
         - Extract HTML from executed notebook cells (code, output, and markdown cells)
-        - Save structured notebook outputs as '.json' files alongside '.ipynb' files
+        - Save structured notebook outputs as '.json' files alongside '.ipynb' files,
+            each with a '.nbidx' index file
         - Optionally generate standalone HTML files for each notebook (if
             '--save-standalone-nb-html' is true)
     4. **Generate HTML pages** (via `generate_page_html`):
@@ -193,10 +219,27 @@ Synopsis:
             a. Create hierarchical- and flat-indices of pages for navigation (footer and
                  sidebar)
             b. Convert markdown page content to HTML using Pandoc with citation support
-            c. Embed notebook outputs using [[<notebook_name>.ipynb]] syntax
+                 (all conversions go through one long-lived Pandoc process, see
+                 'textbook/scripts/pandoc_conversion.py')
+            c. Embed notebook outputs using [[<notebook_name>.ipynb]] syntax (only the
+                 leading sections of each notebook, with the rest loaded as the reader
+                 scrolls, if '--lazy-nb-sections' is used)
             d. Inject HTML templates (header, navbar, topbar, footer, scripts)
             e. Adjust relative image asset paths based on page depth
-            f. Save final HTML page
+            f. Optionally optimize every local image in the page (if
+                 '--optimize-images' is used, see
+                 'textbook/scripts/optimize_images.py'), and lazy-load every image
+            g. Save final HTML page
+
+    Serving the Website Locally
+    ---------------------------
+    Running 'python build.py serve' (instead of the default 'python build.py build')
+    first builds the website as usual, and then serves it at 'http://127.0.0.1:8000'
+    (see '--port'). While it is running, markdown page files, notebooks, images,
+    'textbook/content/assets/', 'textbook/templates/', and the bibliography are watched
+    for changes. On every change, only the changed notebooks are re-converted (using the
+    same '--execution-type'), only the affected HTML pages are regenerated (see the
+    Build Cache Directory above), and any pages open in your browser are reloaded.
 
     Notes
     -----
@@ -280,9 +323,49 @@ Synopsis:
 
         $ python build.py --code-version=no-check --build-directory=content
         --regenerate-html-only
+
+    12. Re-execute all notebooks, excluding those set to be skipped, using the latest
+        stable release (default), running up to 16 notebooks at the same time:
+
+        $ python build.py --execution-type=all-unskipped-notebooks --jobs=16
+
+    13. Do not execute any notebooks, and only regenerate the HTML pages using 8
+        threads:
+
+        $ python build.py --regenerate-html-only --jobs=8
+
+    14. Build the website without executing any notebooks, then serve it locally and
+        rebuild it whenever a markdown page, notebook, or template changes:
+
+        $ python build.py serve
+
+    15. Do not execute any notebooks, and build the website with optimized images:
+
+        $ python build.py --optimize-images
+
+    16. Do not execute any notebooks, and build the website such that long notebooks
+        are loaded section-by-section as the reader scrolls:
+
+        $ python build.py --lazy-nb-sections
 """),
         formatter_class=argparse.RawTextHelpFormatter,
     )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="build",
+        choices=[
+            "build",
+            "serve",
+        ],
+        help=textwrap.dedent("""
+Specify what to do. The two options are:
+
+- 'build': (default) Build the website once.
+- 'serve': Build the website, then serve it locally and incrementally rebuild it
+    whenever its source files change. See 'Serving the Website Locally' above.
+"""),
+    )
     parser.add_argument(
         "--build-directory",
         action="store",
@@ -409,6 +492,89 @@ during the build process. Defaults to False.
         help=textwrap.dedent("""
 Optionally skip all execution and conversion of Notebooks and JSON files, and instead
 ONLY rebuild the HTML output from existing JSON and MD files. Defaults to False.
+"""),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help=textwrap.dedent("""
+Optionally provide the number of worker processes to use when executing and converting
+notebooks. Each worker runs its own Jupyter kernel, so up to this many notebooks are
+executed at the same time. The same number of threads is used to generate the HTML
+pages, each with its own Pandoc process. Defaults to 1, which processes notebooks and
+pages sequentially.
+"""),
+    )
+
+    parser.add_argument(
+        "--optimize-images",
+        action="store_true",  # Confusingly, this defaults to False
+        help=textwrap.dedent("""
+Optionally optimize every local image (i.e. notebook output figures and images in
+'content/**/images/') embedded in the HTML pages. PNG files get a losslessly recompressed
+version, animated GIF files get a smaller animated WebP version (which browsers that
+support it use instead), and the dimensions of every image are added to its HTML tag.
+PNG and JPEG files also get downscaled variants (wherever these are much smaller), which
+are offered to browsers through 'srcset'. All of these are saved in an 'optimized/'
+subdirectory next to each image, and the images themselves are never modified. Every
+image is only optimized once, see '.build_cache/image_manifest.json'. Requires Pillow.
+Images are lazy-loaded whether or not this is used. Defaults to False.
+"""),
+    )
+    parser.add_argument(
+        "--optimize-images-in-place",
+        action="store_true",  # Confusingly, this defaults to False
+        help=textwrap.dedent("""
+Optionally optimize images like '--optimize-images' (which this implies), except that
+PNG files are overwritten with their recompressed versions, instead of these being saved
+next to them, so that the website only contains the smallest version of every image.
+This is meant for deploying the website (see '.github/workflows/deploy.yml'), and
+modifies the image files in your working tree, so never commit after using it. Defaults
+to False.
+"""),
+    )
+    parser.add_argument(
+        "--lazy-nb-sections",
+        action="store_true",  # Confusingly, this defaults to False
+        help=textwrap.dedent("""
+Optionally lazy-load long notebooks in the HTML pages. Only the first top-level sections
+of each notebook are included in its page, and every later section is saved to its own
+'<page name>_nb_sections/section_<number>.html' file next to the page, which is only
+loaded once the reader scrolls near it. Defaults to False.
+"""),
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",  # Confusingly, this defaults to False
+        help=textwrap.dedent("""
+Optionally validate the installed hnn-core version (see '--code-version') without any
+network access, using only the versions and commits looked up by previous builds (see
+'.build_cache/hnn_versions.json'). Without this, looked-up versions are reused for a few
+hours and branch commits for a few minutes, and are only looked up again after that.
+Defaults to False.
+"""),
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",  # Confusingly, this defaults to False
+        help=textwrap.dedent("""
+Optionally time every phase of the build, down to every notebook, executed code cell,
+page, Pandoc conversion, and optimization of the images of a page. When the build is
+done, a timing report (with the slowest items of every kind) is saved to
+'.build_cache/build_profile.json', and a trace of the whole build to
+'.build_cache/build_trace.json', which can be opened in 'chrome://tracing' or
+https://ui.perfetto.dev. When serving, both are saved again after every rebuild.
+Defaults to False.
+"""),
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help=textwrap.dedent("""
+Optionally provide the port to serve the website on when using 'python build.py serve'.
+Defaults to 8000.
 """),
     )
 
@@ -416,6 +582,20 @@ ONLY rebuild the HTML output from existing JSON and MD files. Defaults to False.
     # ----------------------------------------------------------------------------------
     args = parser.parse_args()
 
+    if args.jobs < 1:
+        parser.error("'--jobs' must be a positive integer.")
+
+    if args.optimize_images_in_place:
+        if args.command == "serve":
+            parser.error("'--optimize-images-in-place' cannot be used with 'serve'.")
+        args.optimize_images = True
+
+    if args.optimize_images and not is_image_optimization_available():
+        parser.error("'--optimize-images' requires Pillow, e.g. 'pip install pillow'.")
+
+    if args.profile:
+        enable_profiling()
+
     if args.custom_root_path:
         root_path = args.custom_root_path
     else:
@@ -426,6 +606,9 @@ ONLY rebuild the HTML output from existing JSON and MD files. Defaults to False.
     flat_index_path = Path(root_path / "scripts" / "flat_index.json")
     nb_hashes_path = Path(root_path / "scripts" / "nb_hashes.json")
     nb_skips_path = Path(root_path / "scripts" / "nbs_to_skip.json")
+    # Local, disposable caches that speed up repeated builds. It is always safe to
+    # delete this directory.
+    build_cache_path = Path(root_path / ".build_cache")
     # The "templates" directory is assumed to contain at least the following files:
     # - footer.html
     # - header.html
@@ -451,15 +634,18 @@ ONLY rebuild the HTML output from existing JSON and MD files. Defaults to False.
 
     # Begin the actual work: First, figure out the environment and version:
     # ----------------------------------------------------------------------------------
-    installed_commit = get_hnn_commit_hash()
-
-    # We can't pre-empt this function in the no-validation case, since the value of
-    # the hash varies between "content" and "dev" builds
-    hnn_commit_hash = validate_hnn_versions(
-        installed_commit,
-        args.code_version,
-        custom_owner_commit=args.custom_owner_commit,
-    )
+    with profile_phase("validate_hnn_versions", "build"):
+        installed_commit = get_hnn_commit_hash()
+
+        # We can't pre-empt this function in the no-validation case, since the value
+        # of the hash varies between "content" and "dev" builds
+        hnn_commit_hash = validate_hnn_versions(
+            installed_commit,
+            args.code_version,
+            custom_owner_commit=args.custom_owner_commit,
+            version_cache_path=build_cache_path / "hnn_versions.json",
+            offline=args.offline,
+        )
 
     # Determine if we're in a "dev" build or not
     if args.build_directory == "auto":
@@ -473,32 +659,104 @@ ONLY rebuild the HTML output from existing JSON and MD files. Defaults to False.
         # Override default behavior and force a "dev" build
         is_dev_build = True
 
-    if not args.regenerate_html_only:
-        # Execute appropriate Jupyter notebooks, and save their output for later webpage
-        # assembly:
-        # --------------------------------------------------------------------------------
-        execute_and_convert_nbs_to_json(
-            content_path,
-            nb_hashes_path,
-            nb_skips_path,
-            args.execution_type,
-            is_dev_build,
-            hnn_commit_hash,
-            args.save_standalone_nb_html,
+    def _build_website(nb_paths=None):
+        """
+        Run the build steps, which are re-run for every change when serving.
+
+        If `nb_paths` is given, only those notebooks are (re-)converted, and none at all
+        if it is empty.
+        """
+        if not args.regenerate_html_only and (nb_paths is None or nb_paths):
+            # Execute appropriate Jupyter notebooks, and save their output for later
+            # webpage assembly:
+            # --------------------------------------------------------------------------
+            with profile_phase("execute_and_convert_nbs_to_json", "build"):
+                execute_and_convert_nbs_to_json(
+                    content_path,
+                    nb_hashes_path,
+                    nb_skips_path,
+                    args.execution_type,
+                    is_dev_build,
+                    hnn_commit_hash,
+                    args.save_standalone_nb_html,
+                    n_jobs=args.jobs,
+                    pandoc_cache_dir=build_cache_path / "pandoc_cache",
+                    nb_paths=nb_paths,
+                )
+
+        # Finally, use the Markdown files and Jupyter notebook output to assemble the
+        # webpages and website as a whole:
+        # ------------------------------------------------------------------------------
+        with profile_phase("generate_page_html", "build"):
+            generate_page_html(
+                content_path,
+                templates_path,
+                is_dev_build,
+                save_indices=args.save_indices,
+                hier_index_path=hier_index_path,
+                flat_index_path=flat_index_path,
+                pandoc_cache_dir=build_cache_path / "pandoc_cache",
+                page_dependencies_path=build_cache_path / "page_dependencies.json",
+                n_jobs=args.jobs,
+                page_metadata_cache_path=build_cache_path / "page_metadata.json",
+                image_manifest_path=(
+                    build_cache_path / "image_manifest.json"
+                    if args.optimize_images
+                    else None
+                ),
+                optimize_images_in_place=args.optimize_images_in_place,
+                lazy_nb_sections=args.lazy_nb_sections,
+            )
+
+        # Keep the markdown conversion cache from growing without bound, by evicting
+        # the conversions that have gone unused for the longest
+        with profile_phase("prune_md_conversion_cache", "build"):
+            prune_md_conversion_cache(build_cache_path / "pandoc_cache")
+
+        if args.profile:
+            n_profile_events = save_profile_report(
+                build_cache_path / "build_profile.json",
+                build_cache_path / "build_trace.json",
+            )
+            print(
+                f"Profiling: Saved {n_profile_events} timed events to "
+                f"\n    '{build_cache_path / 'build_profile.json'}'"
+                f"\n    '{build_cache_path / 'build_trace.json'}'"
+            )
+
+    _build_website()
+
+    if args.command == "serve":
+        # Watch only source files, never the files written by the build itself. In
+        # particular, '**/images/*' only matches the files directly in each 'images/'
+        # directory, and not the files that '--optimize-images' saves in its
+        # 'optimized/' subdirectory (see `scripts/optimize_images.py`).
+        watch_patterns = [
+            (content_path, "**/*.md"),
+            (content_path, "**/*.ipynb"),
+            (content_path, "**/images/*"),
+            (content_path / "assets", "**/*"),
+            (templates_path, "*"),
+            (Path(root_path / "textbook-bibliography.bib"), ""),
+        ]
+
+        def _rebuild_website(changed_paths):
+            _build_website(
+                nb_paths=[path for path in changed_paths if path.suffix == ".ipynb"]
+            )
+
+        # Page links are relative to the parent of the textbook root, e.g.
+        # '/textbook/content/preface.html'
+        serve(
+            root_path.parent,
+            create_flat_index(content_path, is_dev_build)[0][
+                "relative_output_html_path"
+            ],
+            watch_patterns,
+            _rebuild_website,
+            port=args.port,
         )
 
-    # Finally, use the Markdown files and Jupyter notebook output to assemble the
-    # webpages and website as a whole:
-    # ----------------------------------------------------------------------------------
-    generate_page_html(
-        content_path,
-        templates_path,
-        is_dev_build,
-        save_indices=args.save_indices,
-        hier_index_path=hier_index_path,
-        flat_index_path=flat_index_path,
-    )
-
 
 if __name__ == "__main__":
     main()
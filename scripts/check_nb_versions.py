@@ -1,6 +1,5 @@
 import json
 from pathlib import Path
-import requests
 import sys
 
 sys.path.insert(
@@ -9,6 +8,8 @@ sys.path.insert(
 )
 
 from logger_setup import setup_logger
+from nb_output_index import read_nb_output_metadata
+from process_hnn_commit_hashes import resolve_latest_stable_version
 
 textbook_root_path = Path(__file__).parents[1]
 
@@ -117,21 +118,25 @@ def check_version(enable_debug=False, root_path=None):
         filename = json_fpath.name
         if filename not in execution_statuses.keys():
             execution_statuses[filename] = dict()
-        with open(json_fpath, "r") as f:
-            contents = json.load(f)
-            if "hnn_version" in contents:
-                nb_versions.append(contents["hnn_version"])
-                execution_statuses[filename]["hnn_version"] = contents["hnn_version"]
-            else:
-                print(f"Version key not found in {json_fpath}")
-            # if "master_commit" in contents:
-            # execution_statuses[json_fpath]['master_commit'] =
+        # Only the metadata of the JSON output is read, not its HTML
+        contents = read_nb_output_metadata(json_fpath)
+        if "hnn_version" in contents:
+            nb_versions.append(contents["hnn_version"])
+            execution_statuses[filename]["hnn_version"] = contents["hnn_version"]
+        else:
+            print(f"Version key not found in {json_fpath}")
+        # if "master_commit" in contents:
+        # execution_statuses[json_fpath]['master_commit'] =
 
     # unique versions for executed nbs
     nb_versions = list(set(nb_versions))
 
-    resp = requests.get("https://pypi.org/pypi/hnn-core/json")
-    latest = resp.json()["info"]["version"]
+    # Always ask PyPI, since a cached version could predate a new release and let
+    # outdated notebooks pass; the cached version is only used if PyPI cannot be reached
+    latest, _ = resolve_latest_stable_version(
+        root_path / ".build_cache" / "hnn_versions.json",
+        refresh=True,
+    )
 
     if len(nb_versions) != 1:
         latest_version_check_success = False
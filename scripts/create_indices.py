@@ -1,7 +1,14 @@
+from collections import defaultdict
 from copy import deepcopy
 import json
+import os
 from pathlib import Path
+import textwrap
+import warnings
 
+# Bump this whenever the metadata stored for each markdown file changes, which
+# invalidates the entire page metadata cache (see `_load_page_metadata_cache`)
+PAGE_METADATA_CACHE_FORMAT_VERSION = 2
 
 def _get_title(file_path):
     """
@@ -9,7 +16,9 @@ def _get_title(file_path):
 
     This function reads through a markdown file line-by-line looking for a special
     comment tag in the format '# Title: <title text>'. This tag is used to specify the
-    display title for pages and sections in the website navigation.
+    display title for pages and sections in the website navigation. Since the tag is
+    always inside the comment at the top of the file, reading stops at the first tag,
+    or at the end of that comment ('-->'), instead of reading the entire file.
 
     Arguments
     ---------
@@ -25,16 +34,155 @@ def _get_title(file_path):
     """
     match_string = "# Title: "
     with open(file_path, "r") as file:
-        title = "NA"
         for line in file:
             if match_string in line:
                 title = line[9:]
                 if title.endswith("\n"):
                     title = title[0:-1]
-    return title
+                return title
+            if "-->" in line:
+                break
+    return "NA"
 
 
-def create_hier_index(content_path, save_indices=False, hier_index_path=None):
+def _read_page_metadata(md_path):
+    """
+    Read the metadata of a single markdown file, for the page metadata cache.
+
+    Returns a dict with the following keys:
+    - "title": The title of the page or section, see `_get_title`
+
+    Only the comment at the top of the file (which ends at the first '-->') is read,
+    never the page's content, so the cost of a cache miss does not grow with the length
+    of the page.
+    """
+    return {"title": _get_title(md_path)}
+
+
+def _load_page_metadata_cache(page_metadata_cache_path):
+    """
+    Load the page metadata cache, see `scan_content`. Returns an empty cache if there
+    is none, or if it was written by a different `PAGE_METADATA_CACHE_FORMAT_VERSION`.
+    """
+    try:
+        with open(page_metadata_cache_path, "r", encoding="utf-8") as f:
+            page_metadata_cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        page_metadata_cache = {}
+    if page_metadata_cache.get("format_version") != PAGE_METADATA_CACHE_FORMAT_VERSION:
+        page_metadata_cache = {
+            "format_version": PAGE_METADATA_CACHE_FORMAT_VERSION,
+            "files": {},
+        }
+    return page_metadata_cache
+
+
+def _save_page_metadata_cache(page_metadata_cache, page_metadata_cache_path):
+    """Save the page metadata cache, see `scan_content`."""
+    page_metadata_cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(page_metadata_cache_path, "w", encoding="utf-8") as f:
+        json.dump(page_metadata_cache, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def scan_content(content_path, page_metadata_cache_path=None):
+    """
+    Walk the '<textbook-root>/content' directory once, collecting every page and title.
+
+    Both the hierarchical index and the flat index are derived from the result of this
+    function (see the `content_scan` arguments of `create_hier_index` and
+    `create_flat_index`), so that a build only lists every directory, and reads the
+    title of every markdown file, once.
+
+    If `page_metadata_cache_path` is given, the metadata of every markdown file is
+    additionally cached there, keyed on the file's path, modification time, and size,
+    so that markdown files which have not changed since the last build are not opened
+    at all.
+
+    Arguments
+    ---------
+    content_path : pathlib.Path
+        Path to the '<textbook-root>/content' directory containing markdown page files
+        and section subdirectories.
+    page_metadata_cache_path : pathlib.Path, optional
+        Path of the JSON file caching the metadata of every markdown file. Typically
+        '<textbook-root>/.build_cache/page_metadata.json'. Default is None, which
+        disables the cache.
+
+    Returns
+    -------
+    dict
+        The "content scan", with the following keys:
+        - "pages": list of dict, one for every markdown file (including 'README.md'
+            files), sorted by path. Each contains:
+            - 'absolute_input_md_path' : pathlib.Path, markdown file path
+            - 'relative_input_md_path' : str, markdown file path relative to
+              `content_path` (e.g., '05_erps/01_erp_overview.md')
+            - 'title' : str, title extracted from the markdown file, see `_get_title`
+        - "children": dict, mapping `content_path` and every directory inside it to
+            the sorted list of paths of all files and directories directly inside it
+    """
+    content_path = Path(content_path)
+    children = {}
+    md_paths = []
+    for dir_path, dir_names, file_names in os.walk(content_path, followlinks=True):
+        dir_path = Path(dir_path)
+        children[dir_path] = sorted(dir_path / name for name in dir_names + file_names)
+        md_paths += [dir_path / name for name in file_names if name.endswith(".md")]
+
+    if page_metadata_cache_path is not None:
+        page_metadata_cache = _load_page_metadata_cache(page_metadata_cache_path)
+    else:
+        page_metadata_cache = {"files": {}}
+
+    pages = []
+    updated_cached_files = {}
+    n_cache_misses = 0
+    for md_path in sorted(md_paths):
+        relative_md_path = md_path.relative_to(content_path).as_posix()
+        md_stat = md_path.stat()
+        cached_file = page_metadata_cache["files"].get(relative_md_path)
+        if (
+            (cached_file is not None)
+            and (cached_file["mtime_ns"] == md_stat.st_mtime_ns)
+            and (cached_file["size"] == md_stat.st_size)
+        ):
+            page_metadata = cached_file["metadata"]
+        else:
+            page_metadata = _read_page_metadata(md_path)
+            n_cache_misses += 1
+        # Only files that still exist are kept
+        updated_cached_files[relative_md_path] = {
+            "mtime_ns": md_stat.st_mtime_ns,
+            "size": md_stat.st_size,
+            "metadata": page_metadata,
+        }
+        pages.append(
+            {
+                "absolute_input_md_path": md_path,
+                "relative_input_md_path": relative_md_path,
+                **page_metadata,
+            }
+        )
+
+    if (page_metadata_cache_path is not None) and (
+        n_cache_misses or len(updated_cached_files) != len(page_metadata_cache["files"])
+    ):
+        page_metadata_cache["files"] = updated_cached_files
+        _save_page_metadata_cache(page_metadata_cache, page_metadata_cache_path)
+
+    return {
+        "pages": pages,
+        "children": children,
+    }
+
+
+def create_hier_index(
+    content_path,
+    save_indices=False,
+    hier_index_path=None,
+    content_scan=None,
+):
     """
     Create a hierarchical index of all markdown pages and sections for sidebar navigation.
 
@@ -56,6 +204,9 @@ def create_hier_index(content_path, save_indices=False, hier_index_path=None):
     hier_index_path : pathlib.Path, optional
         Path where the hierarchical index JSON file should be saved if `save_indices` is
         True.
+    content_scan : dict, optional
+        The result of `scan_content(content_path)`, if it has already been computed.
+        Default is None, which scans `content_path`.
 
     Returns
     -------
@@ -76,6 +227,11 @@ def create_hier_index(content_path, save_indices=False, hier_index_path=None):
     - Uses recursive traversal to build the hierarchy
     - Does NOT compute output file paths
     """
+    if content_scan is None:
+        content_scan = scan_content(content_path)
+    titles = {
+        page["absolute_input_md_path"]: page["title"] for page in content_scan["pages"]
+    }
 
     def _recur_create_hier_index(input_path):
         """
@@ -86,13 +242,13 @@ def create_hier_index(content_path, save_indices=False, hier_index_path=None):
         index", unlike in the case of the "flat index".
         """
         page_index = {}
-        directory_contents = sorted(Path(input_path).glob("*"))
+        directory_contents = content_scan["children"][input_path]
         for item_path in directory_contents:
             readme_path = item_path / "README.md"
-            if item_path.is_dir() and readme_path.exists():
+            if (item_path in content_scan["children"]) and (readme_path in titles):
                 # Check for README inside any directories, which indicate a directory to be
                 # indexed
-                section_title = _get_title(readme_path)
+                section_title = titles[readme_path]
                 # Recursively search directories for files to index
                 page_index[item_path.name] = [
                     section_title,
@@ -100,10 +256,10 @@ def create_hier_index(content_path, save_indices=False, hier_index_path=None):
                 ]
             elif (item_path.suffix == ".md") and (item_path.name != "README.md"):
                 # Check for non-README markdown files
-                page_index[item_path.name] = _get_title(item_path)
+                page_index[item_path.name] = titles[item_path]
         return page_index
 
-    hier_index = _recur_create_hier_index(content_path)
+    hier_index = _recur_create_hier_index(Path(content_path))
 
     # Save our hierarchical index, if desired:
     if save_indices and hier_index_path:
@@ -113,8 +269,57 @@ def create_hier_index(content_path, save_indices=False, hier_index_path=None):
     return hier_index
 
 
+def get_flat_index_lookup(flat_index):
+    """
+    Get a mapping of every page's 'relative_input_md_path' to its flat index element.
+
+    Build this once, and use it for looking up pages from the hierarchical index (e.g.
+    '05_erps/01_erp_overview.md' for the page '01_erp_overview.md' in the section
+    '05_erps'), instead of searching the whole flat index for every page.
+
+    Arguments
+    ---------
+    flat_index : list of dict
+        The flat index, as created by `create_flat_index`
+
+    Returns
+    -------
+    dict
+        Mapping of each page's 'relative_input_md_path' to its element of `flat_index`
+    """
+    return {page["relative_input_md_path"]: page for page in flat_index}
+
+
+def _warn_on_duplicate_titles(flat_index):
+    """
+    Warn about pages that share the same title.
+
+    Pages are never looked up by their titles, but readers cannot tell such pages apart
+    in the sidebar or in the footer navigation, which is almost always a mistake (such
+    as a copied page whose '# Title: ' was not updated).
+    """
+    pages_by_title = defaultdict(list)
+    for page in flat_index:
+        pages_by_title[page["title"]].append(page["relative_input_md_path"])
+    for title, page_paths in pages_by_title.items():
+        if len(page_paths) > 1:
+            warnings.warn(
+                textwrap.dedent(f"""
+                # ----------------------------------------------------------------------
+                # WARNING: The following pages all have the same title '{title}':
+                # {", ".join(page_paths)}
+                # Please give each page a unique '# Title: ' in its markdown file.
+                # ----------------------------------------------------------------------
+            """)
+            )
+
+
 def create_flat_index(
-    content_path, is_dev_build, save_indices=False, flat_index_path=None
+    content_path,
+    is_dev_build,
+    save_indices=False,
+    flat_index_path=None,
+    content_scan=None,
 ):
     """
     Create a flat index of all markdown pages with their paths and titles.
@@ -124,6 +329,10 @@ def create_flat_index(
     dictionary with the following keys, along with the appropriate values for each:
     - "absolute_input_md_path": Absolute filesystem path to the existing 'input'
         markdown file with actual page contents.
+    - "relative_input_md_path": Path of the 'input' markdown file relative to
+        '<textbook-root>/content', e.g. "05_erps/01_erp_overview.md". This uniquely
+        identifies every page, and matches the keys of the hierarchical index (see
+        `get_flat_index_lookup`).
     - "absolute_output_html_path": Absolute filesystem path to the not-yet-existing
         'output' HTML file corresponding to this markdown page.
     - "relative_output_html_path": Relative path to the not-yet-existing 'output' HTML
@@ -153,12 +362,17 @@ def create_flat_index(
         'build.py'.
     flat_index_path : pathlib.Path, optional
         Path where the flat index JSON file should be saved if `save_indices` is True.
+    content_scan : dict, optional
+        The result of `scan_content(content_path)`, if it has already been computed.
+        Default is None, which scans `content_path`.
 
     Returns
     -------
     list of dict
         A sequential list of all pages in navigation order. Each dict element contains:
         - 'absolute_input_md_path' : pathlib.Path, input markdown file path
+        - 'relative_input_md_path' : str, input markdown file path relative to
+          '<textbook-root>/content' (e.g., '05_erps/01_erp_overview.md')
         - 'absolute_output_html_path' : pathlib.Path, output HTML file path
         - 'relative_output_html_path' : str, website-relative HTML path (e.g.,
           '/textbook/content/page.html')
@@ -167,19 +381,16 @@ def create_flat_index(
     # Get all markdown files, but excluding 'README.md' files. We don't care about the
     # sections.
     # ----------------------------------------------------------------------------------
-    # This glob is recursive, see
-    # https://docs.python.org/3/library/pathlib.html#pathlib-pattern-language
-    paths_all = sorted(content_path.glob("**/*.md"))
-    paths_excluding_readme = [p for p in paths_all if ("README" not in str(p))]
+    # These come from a recursive walk of `content_path`, see `scan_content`
+    if content_scan is None:
+        content_scan = scan_content(content_path)
 
     # Create the initial flat index, containing only input files:
     # ----------------------------------------------------------------------------------
     flat_index = [
-        {
-            "absolute_input_md_path": input_path,
-            "title": _get_title(input_path),
-        }
-        for input_path in paths_excluding_readme
+        dict(page)
+        for page in content_scan["pages"]
+        if "README" not in str(page["absolute_input_md_path"])
     ]
 
     # Update the flat index to include output files:
@@ -219,6 +430,8 @@ def create_flat_index(
             }
         )
 
+    _warn_on_duplicate_titles(flat_index)
+
     # Save our flat index, if desired:
     if save_indices and flat_index_path:
         flat_index_serializable = deepcopy(flat_index)
@@ -1,5 +1,7 @@
 import textwrap
 
+from .create_indices import get_flat_index_lookup
+
 
 def _create_toggle_section(toggle_label):
     """
@@ -43,7 +45,8 @@ def _build_dynamic_sidebar(hier_index, flat_index):
     This function processes the hierarchical index to generate HTML links for all pages
     and sections in the sidebar. It handles both top-level pages (non-collapsible links)
     and nested sections (collapsible groups of links). The flat index is used to lookup
-    the relative file paths for each page based on matching titles.
+    the relative file paths for each page based on the path of its markdown file (see
+    `scripts/create_indices.py::get_flat_index_lookup()`).
 
     Arguments
     ---------
@@ -59,6 +62,8 @@ def _build_dynamic_sidebar(hier_index, flat_index):
         A sequential list of all pages in navigation order, as created by
         `scripts/create_indices.py::create_flat_index()`. Each dict element contains:
         - 'absolute_input_md_path' : pathlib.Path, input markdown file path
+        - 'relative_input_md_path' : str, input markdown file path relative to
+          '<textbook-root>/content'
         - 'absolute_output_html_path' : pathlib.Path, output HTML file path
         - 'relative_output_html_path' : str, website-relative HTML path (e.g.,
           '/textbook/content/page.html')
@@ -69,15 +74,17 @@ def _build_dynamic_sidebar(hier_index, flat_index):
     str
         HTML string containing all navigation links for the sidebar
     """
+    # The keys of `hier_index` are file and directory names, which together make up the
+    # path of each page's markdown file relative to '<textbook-root>/content'
+    pages_by_input_path = get_flat_index_lookup(flat_index)
+
     dynamic_links_html = ""
     indent = "\t\t"
     for section, contents in hier_index.items():
         # For pages that are not nested in a toggle
         if isinstance(contents, str):
             label = contents  # The title of this non-dropdown Markdown page
-            for page in flat_index:
-                if page["title"] == contents:
-                    link = page["relative_output_html_path"]
+            link = pages_by_input_path[section]["relative_output_html_path"]
 
             dynamic_links_html += f'\n{indent}<a href="{link}">{label}</a>'
         # For pages that are nested in a toggle
@@ -89,9 +96,9 @@ def _build_dynamic_sidebar(hier_index, flat_index):
             # Add pages under toggle
             for sub_filename, sub_title in toggle_contents.items():
                 label = sub_title
-                for page in flat_index:
-                    if page["title"] == sub_title:
-                        link = page["relative_output_html_path"]
+                link = pages_by_input_path[f"{section}/{sub_filename}"][
+                    "relative_output_html_path"
+                ]
                 dynamic_links_html += f'\n{indent + indent}<a href="{link}">{label}</a>'
 
             # Close toggle <div> sections
@@ -128,6 +135,8 @@ def create_sidebar_html(
         A sequential list of all pages in navigation order, as created by
         `scripts/create_indices.py::create_flat_index()`. Each dict element contains:
         - 'absolute_input_md_path' : pathlib.Path, input markdown file path
+        - 'relative_input_md_path' : str, input markdown file path relative to
+          '<textbook-root>/content'
         - 'absolute_output_html_path' : pathlib.Path, output HTML file path
         - 'relative_output_html_path' : str, website-relative HTML path (e.g.,
           '/textbook/content/page.html')
@@ -1,22 +1,45 @@
 # %%
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
+from datetime import datetime
 import base64
 import hashlib
 import html
 import json
+import math
+import multiprocessing
 from pathlib import Path
 import re
 import textwrap
+import time
 import warnings
 
-import nbformat
-import pypandoc
-from hnn_core import __version__ as hnn_version
-from nbconvert.preprocessors import (
-    ClearOutputPreprocessor,
-    ExecutePreprocessor,
+# Note that nbformat, nbconvert, and packaging are only imported by the functions that
+# use them, so that builds which do not convert any notebooks (e.g. with
+# '--regenerate-html-only') do not spend time importing them. For the same reason,
+# hnn-core itself is never imported, see `get_installed_hnn_version`.
+
+from .nb_output_index import (
+    read_nb_output_metadata,
+    read_nb_output_sections,
+    write_nb_output_index,
+)
+from .optimize_images import IMAGE_OPTIMIZED_DIR_NAME
+from .pandoc_conversion import (
+    convert_md_to_html,
+    get_md_conversion_cache_key,
+    read_cached_md_conversion,
+    write_cached_md_conversion,
+)
+from .process_hnn_commit_hashes import get_installed_hnn_version
+from .profiling import (
+    add_profile_events,
+    collect_profile_events,
+    enable_profiling,
+    is_profiling_enabled,
+    profile_phase,
+    record_profile_event,
 )
-from packaging.version import Version
 
 
 def load_nb_json_output(
@@ -56,6 +79,69 @@ def load_nb_json_output(
     return nb_outputs_if_any
 
 
+def load_nb_json_output_metadata(
+    nb_path,
+    nb_json_output_dir,
+):
+    """
+    Load only the execution metadata of the JSON output for a notebook file.
+
+    This is the same as the top-level keys of `load_nb_json_output` other than the
+    notebook's sections (e.g. "last_hnn_version_used"), but is read from the small
+    header of the JSON output's index file (see `scripts/nb_output_index.py`) instead
+    of parsing the entire JSON output.
+
+    Parameters
+    ----------
+    nb_path : pathlib.Path
+        Path to the Jupyter notebook file (.ipynb)
+    nb_json_output_dir : pathlib.Path
+        Directory where the notebook's JSON output file will be located (and, if it
+        exists, is present currently from a prior execution)
+
+    Returns
+    -------
+    nb_metadata_if_any : dict or None
+    """
+    return read_nb_output_metadata(nb_json_output_dir / f"{nb_path.stem}.json")
+
+
+def load_nb_json_output_sections(
+    nb_path,
+    nb_json_output_dir,
+    section_header=None,
+):
+    """
+    Load only the sections of the JSON output for a notebook file.
+
+    This is the same as the value under the notebook's filename in
+    `load_nb_json_output`, but is read from the JSON output's index file (see
+    `scripts/nb_output_index.py`), which only decompresses the HTML of the sections
+    that are returned. The index is kept in memory for the rest of the build, so
+    notebooks that are embedded several times are only read once.
+
+    Parameters
+    ----------
+    nb_path : pathlib.Path
+        Path to the Jupyter notebook file (.ipynb)
+    nb_json_output_dir : pathlib.Path
+        Directory where the notebook's JSON output file will be located (and, if it
+        exists, is present currently from a prior execution)
+    section_header : str, optional
+        If given, only this section and its sub-sections are returned, see
+        `read_nb_output_sections` in `scripts/nb_output_index.py`. Default is None,
+        which returns every section.
+
+    Returns
+    -------
+    nb_outputs_if_any : dict or None
+    """
+    return read_nb_output_sections(
+        nb_json_output_dir / f"{nb_path.stem}.json",
+        section_header,
+    )
+
+
 def _convert_nb_html_to_json(
     html_input: str,
     nb_path: Path,
@@ -146,34 +232,6 @@ def _convert_nb_html_to_json(
 
     return contents
 
-def _get_section_outputs(nb_outputs, section_header):
-    items = list(nb_outputs.items())
-
-    # locate target section
-    start_idx = None
-    for i, (title, data) in enumerate(items):
-        if title == section_header:
-            start_idx = i
-            break
-
-    if start_idx is None:
-        raise KeyError(f"Section not found: {section_header}")
-
-    start_level = items[start_idx][1]["level"]
-
-    # collect until boundary
-    result = {}
-
-    for title, data in items[start_idx:]:
-        level = data["level"]
-
-        # stop if we hit a new section that is same-or-higher level
-        if title != section_header and level <= start_level:
-            break
-
-        result[title] = data
-
-    return result
 
 def _structure_json(contents):
     """
@@ -234,11 +292,282 @@ def _structure_json(contents):
     return hierarchy
 
 
+def _convert_escaped_md_to_html(markdown_content):
+    """
+    Convert (already HTML-escaped) notebook markdown to HTML using Pandoc.
+
+    Parameters
+    ----------
+    markdown_content : str
+        Markdown content whose '<' and '>' characters have already been escaped
+
+    Returns
+    -------
+    str
+        The converted HTML
+    """
+    return convert_md_to_html(markdown_content)
+
+
+def _can_batch_md_cell(markdown_content):
+    """
+    Check if a markdown cell converts identically on its own and inside a batch.
+
+    Footnotes are collected at the end of the whole Pandoc document, and link reference
+    definitions apply to the whole document, so cells using either are always converted
+    on their own.
+    """
+    if "[^" in markdown_content:
+        return False
+    if re.search(r"^ {0,3}\[[^\]]+\]:", markdown_content, flags=re.MULTILINE):
+        return False
+    return True
+
+
+def _renumber_code_block_ids(html_content, offset):
+    """
+    Shift the 'cbN' ids Pandoc gives to highlighted code blocks down by `offset`.
+
+    Pandoc numbers code blocks across the whole document, so inside a batch the code
+    blocks of later cells do not start at 'cb1' like they do when converted alone.
+    """
+    if offset == 0:
+        return html_content
+    return re.sub(
+        r'((?:id="|href="#)cb)(\d+)',
+        lambda match: f"{match.group(1)}{int(match.group(2)) - offset}",
+        html_content,
+    )
+
+
+def _batch_convert_escaped_md_cells_to_html(markdown_contents):
+    """
+    Convert many (already HTML-escaped) notebook markdown cells with one Pandoc call.
+
+    Every call to Pandoc has a fixed overhead, which dominates the conversion time of
+    notebooks with many markdown cells. Instead, this joins the cells into a single
+    document, separated by a unique HTML comment (which Pandoc passes through
+    unchanged), converts it once, and splits the result back into one HTML string per
+    cell. The result is identical to converting each cell separately:
+    - Each cell's '<' and '>' characters are escaped before conversion, so no cell can
+      contain the delimiter comment itself.
+    - The document-wide code block ids Pandoc adds ('cb1', 'cb2', ...) are renumbered
+      to restart in every cell.
+    - Cells with footnotes or link reference definitions, whose meaning depends on the
+      whole document, are converted on their own (see `_can_batch_md_cell`).
+
+    If the batched result still cannot be split back into the right number of cells
+    (e.g. because a construct left open at the end of a cell swallowed a delimiter),
+    every cell is instead converted separately.
+
+    Parameters
+    ----------
+    markdown_contents : list of str
+        The HTML-escaped sources of the markdown cells, in notebook order
+
+    Returns
+    -------
+    list of str
+        The converted HTML of each markdown cell, in the same order as
+        `markdown_contents`
+    """
+    batch_idxs = [
+        idx
+        for idx, content in enumerate(markdown_contents)
+        if _can_batch_md_cell(content)
+    ]
+    if len(batch_idxs) <= 1:
+        return [_convert_escaped_md_to_html(content) for content in markdown_contents]
+
+    # The delimiter token only needs to be unique within this notebook
+    delimiter_token = hashlib.sha256(
+        "\0".join(markdown_contents).encode("utf-8")
+    ).hexdigest()
+    delimiter = f"<!-- nb-markdown-cell-boundary-{delimiter_token} -->"
+
+    batched_html = _convert_escaped_md_to_html(
+        f"\n\n{delimiter}\n\n".join(markdown_contents[idx] for idx in batch_idxs)
+    )
+    batched_html_contents = batched_html.split(f"{delimiter}\n")
+
+    if len(batched_html_contents) != len(batch_idxs):
+        print(
+            "Execution: Could not convert markdown cells in a single batch, falling "
+            "back to converting each cell separately."
+        )
+        return [_convert_escaped_md_to_html(content) for content in markdown_contents]
+
+    html_contents = [None] * len(markdown_contents)
+    n_prior_code_blocks = 0
+    for idx, html_content in zip(batch_idxs, batched_html_contents):
+        html_contents[idx] = _renumber_code_block_ids(html_content, n_prior_code_blocks)
+        n_prior_code_blocks += len(re.findall(r'id="cb\d+"', html_content))
+    for idx, content in enumerate(markdown_contents):
+        if html_contents[idx] is None:
+            html_contents[idx] = _convert_escaped_md_to_html(content)
+
+    return html_contents
+
+
+def _convert_md_cells_to_html(markdown_sources, pandoc_cache_dir=None):
+    """
+    Convert the sources of all markdown cells of a notebook to HTML.
+
+    Cells are first looked up individually in the markdown conversion cache (see
+    `scripts/pandoc_conversion.py`), so that editing one cell does not require
+    re-converting the rest of the notebook. All remaining cells are converted together
+    by `_batch_convert_escaped_md_cells_to_html`, and then added to the cache.
+
+    Parameters
+    ----------
+    markdown_sources : list of str
+        The sources of the markdown cells, in notebook order
+    pandoc_cache_dir : pathlib.Path, optional
+        The markdown conversion cache directory, typically
+        '<textbook-root>/.build_cache/pandoc_cache/'. Default is None, which disables
+        the cache.
+
+    Returns
+    -------
+    list of str
+        The converted HTML of each markdown cell, in the same order as
+        `markdown_sources`
+    """
+    # escape < and > characters
+    markdown_contents = [html.escape(source) for source in markdown_sources]
+
+    if pandoc_cache_dir is None:
+        return _batch_convert_escaped_md_cells_to_html(markdown_contents)
+
+    cache_keys = [
+        get_md_conversion_cache_key(content) for content in markdown_contents
+    ]
+    html_contents = [
+        read_cached_md_conversion(cache_key, pandoc_cache_dir)
+        for cache_key in cache_keys
+    ]
+
+    uncached_idxs = [
+        idx for idx, html_content in enumerate(html_contents) if html_content is None
+    ]
+    if uncached_idxs:
+        converted_html_contents = _batch_convert_escaped_md_cells_to_html(
+            [markdown_contents[idx] for idx in uncached_idxs]
+        )
+        for idx, html_content in zip(uncached_idxs, converted_html_contents):
+            html_contents[idx] = html_content
+            write_cached_md_conversion(cache_keys[idx], html_content, pandoc_cache_dir)
+
+    return html_contents
+
+
+def _get_nb_image_path(img_bytes, img_output_dir, suffix=".png"):
+    """
+    Get the path of a notebook output image, named by a hash of its contents.
+
+    Naming images by their contents (instead of by their order in the notebook) means
+    that adding, removing, or re-ordering figures does not rename every later figure,
+    and that identical figures are only stored once. Since the name changes whenever
+    the contents do, an existing file never needs to be rewritten.
+
+    Parameters
+    ----------
+    img_bytes : bytes
+        The decoded image file contents
+    img_output_dir : pathlib.Path
+        The notebook's image output directory, i.e. 'output_nb_<notebook name>/'
+    suffix : str, optional
+        The image file extension. Default is ".png"
+
+    Returns
+    -------
+    pathlib.Path
+        Path of the image file
+    """
+    img_hash = hashlib.sha256(img_bytes).hexdigest()[:16]
+    return img_output_dir / f"fig_{img_hash}{suffix}"
+
+
+def _remove_unreferenced_nb_images(nb_json_output_dir, save_standalone_nb_html=False):
+    """
+    Delete notebook output images that are no longer referenced by any output.
+
+    Since images are named by their contents (see `_get_nb_image_path`), an image
+    that changes is saved under a new name, and the old file would otherwise be left
+    behind forever. This is run once ALL notebooks have been converted, over every
+    'output_nb_*' directory in an output directory at once, so that the images of
+    notebooks that were skipped in this build are also collected. It only ever deletes
+    'fig_*' files inside 'output_nb_*' directories (and the files saved for them, if
+    images are optimized).
+
+    Parameters
+    ----------
+    nb_json_output_dir : pathlib.Path
+        Directory containing the JSON output files of notebooks, and their 'output_nb_*'
+        image directories
+    save_standalone_nb_html : bool, optional
+        Whether standalone HTML files were saved for the notebooks, in which case the
+        images they refer to are also kept. Default is False.
+
+    Returns
+    -------
+    int
+        The number of deleted images
+    """
+    img_output_dirs = sorted(
+        path for path in nb_json_output_dir.glob("output_nb_*") if path.is_dir()
+    )
+    if not img_output_dirs:
+        return 0
+
+    # Every output that may reference the images: the JSON output files as written
+    # (which may be previous JSON outputs, if notebooks were not re-executed), and the
+    # standalone HTML files, if any
+    referenced_html_paths = sorted(nb_json_output_dir.glob("*.json"))
+    if save_standalone_nb_html:
+        for img_output_dir in img_output_dirs:
+            nb_name = img_output_dir.name.removeprefix("output_nb_")
+            referenced_html_paths.append(nb_json_output_dir / f"{nb_name}.html")
+
+    referenced_img_paths = set()
+    img_reference_pattern = re.compile(r"(output_nb_[^/'\"\s<>\\]+)/([^'\"\s<>\\]+)")
+    for html_path in referenced_html_paths:
+        if html_path.is_file():
+            referenced_img_paths.update(
+                img_reference_pattern.findall(html_path.read_text(encoding="utf-8"))
+            )
+
+    n_removed = 0
+    for img_output_dir in img_output_dirs:
+        for img_path in img_output_dir.glob("fig_*"):
+            if (img_output_dir.name, img_path.name) not in referenced_img_paths:
+                img_path.unlink()
+                n_removed += 1
+
+        # Also delete the files saved for deleted images when optimizing them (see
+        # `scripts/optimize_images.py`), which are named '<image name>.<suffix>' or,
+        # for downscaled variants, '<image name>_<width>w.<suffix>'
+        optimized_dir = img_output_dir / IMAGE_OPTIMIZED_DIR_NAME
+        for optimized_path in optimized_dir.glob("fig_*"):
+            variant_match = re.fullmatch(r"(fig_.+)_\d+w", optimized_path.stem)
+            img_stem = variant_match.group(1) if variant_match else optimized_path.stem
+            if not any(img_output_dir.glob(f"{img_stem}.*")):
+                optimized_path.unlink()
+    if n_removed:
+        print(
+            f"Execution: Removed {n_removed} unreferenced image(s) from "
+            f"'{nb_json_output_dir}'."
+        )
+    return n_removed
+
+
 def _extract_html_from_nb(
     nb,
     nb_path,
     nb_json_output_dir,
     use_base64=False,
+    pandoc_cache_dir=None,
+    save_images=True,
 ):
     """
     Extract and convert notebook cells to HTML, including code, outputs, and markdown.
@@ -246,13 +575,16 @@ def _extract_html_from_nb(
     This function processes all cells in a Jupyter notebook and converts them to
     formatted HTML. Code cells are rendered with their source and outputs (text,
     images, errors). Markdown cells are converted to HTML using Pandoc. Images from
-    notebook outputs are either embedded as Base64 strings or saved as PNG files.
+    notebook outputs are either embedded as Base64 strings or saved as PNG files named
+    by a hash of their contents (see `_get_nb_image_path`).
 
     The function handles:
     - Code cell source formatting
     - Multiple output types (text/plain, stdout, images, errors)
     - Image output processing (Base64 embedding or file saving)
-    - Markdown cell conversion with MathML support
+    - Markdown cell conversion with MathML support (all markdown cells of the notebook
+      that are not already cached are converted by a single Pandoc call, see
+      `_convert_md_cells_to_html`)
     - Proper HTML structure with CSS classes for styling
 
     Parameters
@@ -269,6 +601,13 @@ def _extract_html_from_nb(
         If True, embed images as Base64-encoded strings in the HTML.
         If False, save images as separate PNG files and link to them.
         Default is False
+    pandoc_cache_dir : pathlib.Path, optional
+        The markdown conversion cache directory, see `_convert_md_cells_to_html`.
+        Default is None, which disables the cache.
+    save_images : bool, optional
+        If False, image files are not written (but are still linked to), for when the
+        returned HTML will not be used. Only used if `use_base64` is False. Default is
+        True
 
     Returns
     -------
@@ -278,12 +617,20 @@ def _extract_html_from_nb(
     """
 
     html_output = []
-    fig_id = 0
     aggregated_output = ""
 
     img_output_dir = nb_json_output_dir / f"output_nb_{nb_path.stem}"
     img_output_dir.mkdir(parents=True, exist_ok=True)
 
+    # Convert all markdown cells to HTML up-front, using a single Pandoc call for the
+    # whole notebook instead of one per cell
+    markdown_html_contents = iter(
+        _convert_md_cells_to_html(
+            [cell["source"] for cell in nb["cells"] if cell["cell_type"] == "markdown"],
+            pandoc_cache_dir=pandoc_cache_dir,
+        )
+    )
+
     # Helper for aggregating outputs
     # -----------------------------------------------------------------------
     def _aggregate_outputs(
@@ -381,10 +728,11 @@ def _extract_html_from_nb(
                     # standard image processing using saved .png file
                     # ------------------------------
                     else:
-                        fig_id += 1
-                        img_path = img_output_dir / f"fig_{fig_id:02d}.png"
-                        with open(img_path, "wb") as img_file:
-                            img_file.write(base64.b64decode(img_data))
+                        img_bytes = base64.b64decode(img_data)
+                        img_path = _get_nb_image_path(img_bytes, img_output_dir)
+                        if save_images and not img_path.exists():
+                            with open(img_path, "wb") as img_file:
+                                img_file.write(img_bytes)
 
                         relative_img_path = img_path.relative_to(img_path.parents[1])
                         output_img_html = textwrap.dedent(f"""
@@ -428,21 +776,8 @@ def _extract_html_from_nb(
         # process "markdown" cells
         # ------------------------------
         elif cell["cell_type"] == "markdown":
-            # escape < and > characters
-            markdown_content = html.escape(cell["source"])
-
-            html_content = pypandoc.convert_text(
-                markdown_content,
-                format="md",
-                to="html",
-                extra_args=[
-                    "--mathml",
-                    # the "-f", "markdown-auto_identifiers" arguments below
-                    # disable the automatic ids added to header tags
-                    "-f",
-                    "markdown-auto_identifiers",
-                ],
-            )
+            # markdown cells were all converted at once, before the loop
+            html_content = next(markdown_html_contents)
             markdown_html_output = textwrap.dedent(f"""
                 <!-- markdown cell -->
                 <div class='markdown-cell'>
@@ -483,6 +818,9 @@ def _calculate_nb_hash(loaded_nb):
         A 64-character hexadecimal string representing the SHA256 hash of the cleaned
         notebook content
     """
+    import nbformat
+    from nbconvert.preprocessors import ClearOutputPreprocessor
+
     nb = deepcopy(loaded_nb)
 
     # clear all cell outputs
@@ -509,6 +847,85 @@ def _calculate_nb_hash(loaded_nb):
     return hasher.hexdigest()
 
 
+def _calculate_nb_hashes(loaded_nb):
+    """
+    Generate separate content-based SHA256 hashes of a notebook's code and markdown.
+
+    Splitting the hash lets the build distinguish changes that require re-execution
+    (any change to a code cell) from changes that only require re-rendering (changes
+    to markdown or raw cells), see `_rerender_nb_with_prior_outputs`. Like
+    `_calculate_nb_hash`, outputs, execution counts, and metadata are ignored.
+
+    - The "code" hash covers the source of every code cell, in order. Moving a markdown
+      cell does not change it.
+    - The "markdown" hash covers the source and position (cell index) of every
+      non-code cell, so moving a markdown cell between code cells changes it.
+
+    Parameters
+    ----------
+    loaded_nb : nbformat.notebooknode.NotebookNode
+        The notebook object, either freshly loaded or executed with outputs
+
+    Returns
+    -------
+    dict
+        Dictionary with the keys 'code' and 'markdown', each a 64-character
+        hexadecimal SHA256 hash string
+    """
+    code_hasher = hashlib.sha256()
+    markdown_hasher = hashlib.sha256()
+    for cell_idx, cell in enumerate(loaded_nb.cells):
+        # Include a separator so that e.g. ["ab", "c"] and ["a", "bc"] differ
+        if cell.cell_type == "code":
+            code_hasher.update(cell.source.encode("utf-8") + b"\0")
+        else:
+            markdown_hasher.update(
+                f"{cell_idx}:{cell.cell_type}:".encode("utf-8")
+                + cell.source.encode("utf-8")
+                + b"\0"
+            )
+    return {
+        "code": code_hasher.hexdigest(),
+        "markdown": markdown_hasher.hexdigest(),
+    }
+
+
+def _get_prior_nb_hashes(filename, nb_hashes, loaded_nb):
+    """
+    Get the previously-recorded code and markdown hashes of a notebook.
+
+    Older versions of 'nb_hashes.json' stored a single hash of the whole notebook (see
+    `_calculate_nb_hash`) instead of separate code and markdown hashes. Since such a
+    hash cannot be split, it is only treated as "unchanged" if it matches the whole
+    notebook exactly, and otherwise as a change to the code.
+
+    Parameters
+    ----------
+    filename : str
+        The local filename of the notebook (e.g., "example.ipynb")
+    nb_hashes : dict
+        The previously-recorded hashes, as loaded by `_load_nb_hashes`
+    loaded_nb : nbformat.notebooknode.NotebookNode
+        The notebook object in its current state
+
+    Returns
+    -------
+    dict or None
+        Dictionary with the keys 'code' and 'markdown', or None if the notebook has no
+        recorded hashes (i.e. it is new)
+    """
+    if filename not in nb_hashes:
+        return None
+
+    prior_nb_hashes = nb_hashes[filename]
+    if isinstance(prior_nb_hashes, str):
+        if prior_nb_hashes == _calculate_nb_hash(loaded_nb):
+            return _calculate_nb_hashes(loaded_nb)
+        return {"code": prior_nb_hashes, "markdown": prior_nb_hashes}
+
+    return prior_nb_hashes
+
+
 def _load_nb_hashes(nb_hashes_path):
     """
     Load previously-recorded notebook content hashes from JSON file.
@@ -532,10 +949,11 @@ def _load_nb_hashes(nb_hashes_path):
     Returns
     -------
     dict
-        Mapping of notebook filenames (str) to their SHA256 hash values (str). Keys are
-        local notebook filenames (e.g., "example.ipynb"), values are 64-character
-        hexadecimal hash strings. Returns an empty dictionary if the hash file does not
-        exist
+        Mapping of notebook filenames (str) to their hashes. Keys are local notebook
+        filenames (e.g., "example.ipynb"), values are dicts with 'code' and 'markdown'
+        SHA256 hash strings, as generated by `_calculate_nb_hashes` (or, for files
+        written by older versions of this code, a single hash string). Returns an empty
+        dictionary if the hash file does not exist
     """
     # AES if we want to support optional or fresh hash building, we should do it at the
     # CLI in main, not here, but leaving this as-is for now.
@@ -561,9 +979,9 @@ def _save_nb_hashes(
     Parameters
     ----------
     new_hashes : dict
-        Mapping of notebook filenames (str) to their SHA256 hash values (str).
-        Keys are local notebook filenames (e.g., "example.ipynb"), values are 64-character
-        hexadecimal hash strings
+        Mapping of notebook filenames (str) to their hashes. Keys are local notebook
+        filenames (e.g., "example.ipynb"), values are dicts with 'code' and 'markdown'
+        SHA256 hash strings, as generated by `_calculate_nb_hashes`
     nb_hashes_path : pathlib.Path
         Path to the JSON file where hashes will be saved, typically
         'scripts/nb_hashes.json' in the textbook-root directory
@@ -591,6 +1009,8 @@ def _load_nb(nb_path):
     nbformat.notebooknode.NotebookNode
         The loaded notebook object
     """
+    import nbformat
+
     with open(nb_path, "r", encoding="utf-8") as f:
         nb = nbformat.read(f, as_version=4)
     return nb
@@ -660,8 +1080,9 @@ def _read_nb_json_output_metadata(
     prior_execution_if_any = False
     prior_version_if_any = False
 
-    # Has content if the file is found, otherwise returns None
-    nb_outputs_if_any = load_nb_json_output(nb_path, nb_json_output_dir)
+    # Has content if the file is found, otherwise returns None. Only the metadata is
+    # read, not the (much larger) HTML of the notebook itself.
+    nb_outputs_if_any = load_nb_json_output_metadata(nb_path, nb_json_output_dir)
 
     # if the json output exists, get the execution status, base version,
     # and latest commit used to execute the nb
@@ -682,6 +1103,34 @@ def _read_nb_json_output_metadata(
     return prior_commit_if_any, prior_execution_if_any, prior_version_if_any
 
 
+def _read_nb_expected_duration(
+    nb_path,
+    nb_json_output_dir,
+):
+    """
+    Retrieve how long a notebook took to execute the last time it was executed.
+
+    Parameters
+    ----------
+    nb_path : pathlib.Path
+        Path to the Jupyter notebook file (.ipynb)
+    nb_json_output_dir : pathlib.Path
+        Directory where the notebook's JSON output file will be located (and, if it
+        exists, is present currently from a prior execution)
+
+    Returns
+    -------
+    float
+        The last recorded wall-clock execution duration in seconds. If no duration has
+        been recorded (e.g. a new notebook), this is `math.inf`, so that notebooks of
+        unknown cost are scheduled as if they were the most expensive.
+    """
+    nb_outputs_if_any = load_nb_json_output_metadata(nb_path, nb_json_output_dir)
+    if nb_outputs_if_any and "last_execution_duration" in nb_outputs_if_any:
+        return float(nb_outputs_if_any["last_execution_duration"])
+    return math.inf
+
+
 def _load_nbs_to_skip(nb_skips_path, is_dev_build):
     """
     Load list of notebooks to skip during execution based on build type.
@@ -729,6 +1178,65 @@ def _load_nbs_to_skip(nb_skips_path, is_dev_build):
     return nbs_to_skip
 
 
+def _get_nb_cell_durations(nb):
+    """
+    Get the wall-clock execution duration of each code cell in an executed notebook.
+
+    This relies on the timestamps that nbclient records in each cell's
+    'metadata.execution' during execution (see `_execute_nb`).
+
+    Parameters
+    ----------
+    nb : nbformat.notebooknode.NotebookNode
+        The executed notebook object
+
+    Returns
+    -------
+    list of float or None
+        The duration in seconds of each code cell, in notebook order. Cells without
+        timing information (e.g. empty cells, or cells that were not reached because
+        of an error) are None.
+    """
+    cell_durations = []
+    for cell in nb.get("cells", []):
+        if cell.get("cell_type") != "code":
+            continue
+        timing = cell.get("metadata", {}).get("execution", {})
+        if "iopub.status.busy" in timing and "shell.execute_reply" in timing:
+            start = datetime.fromisoformat(timing["iopub.status.busy"])
+            end = datetime.fromisoformat(timing["shell.execute_reply"])
+            cell_durations.append(round((end - start).total_seconds(), 3))
+        else:
+            cell_durations.append(None)
+    return cell_durations
+
+
+def _record_nb_cell_profile_events(nb, nb_path):
+    """
+    Record the execution of every code cell of an executed notebook as a profiling
+    event (see `scripts/profiling.py`), using the same timestamps as
+    `_get_nb_cell_durations`.
+    """
+    if not is_profiling_enabled():
+        return
+    code_cell_idx = 0
+    for cell_idx, cell in enumerate(nb.get("cells", [])):
+        if cell.get("cell_type") != "code":
+            continue
+        code_cell_idx += 1
+        timing = cell.get("metadata", {}).get("execution", {})
+        if "iopub.status.busy" in timing and "shell.execute_reply" in timing:
+            start = datetime.fromisoformat(timing["iopub.status.busy"])
+            end = datetime.fromisoformat(timing["shell.execute_reply"])
+            record_profile_event(
+                f"{nb_path.name}: code cell {code_cell_idx}",
+                "cell",
+                start.timestamp(),
+                (end - start).total_seconds(),
+                cell_index=cell_idx,
+            )
+
+
 def _execute_nb(nb_path, timeout=600):
     """
     Execute a Jupyter notebook using nbconvert's ExecutePreprocessor.
@@ -750,7 +1258,14 @@ def _execute_nb(nb_path, timeout=600):
     execution_successful : bool
         True if all non-empty code cells were successfully executed,
         False otherwise
+    execution_durations : dict
+        Wall-clock timing of this execution, with the keys:
+        - 'notebook' : float, total duration in seconds, including kernel startup
+        - 'cells' : list of float or None, duration in seconds of each code cell (see
+          `_get_nb_cell_durations`)
     """
+    from nbconvert.preprocessors import ExecutePreprocessor
+
     execution_initiated = True
     print(f"Execution: Notebook {nb_path.name} execution has been initiated.")
     loaded_nb = _load_nb(nb_path)
@@ -758,19 +1273,56 @@ def _execute_nb(nb_path, timeout=600):
     ep = ExecutePreprocessor(
         timeout=timeout,
         kernel_name="python3",
+        record_timing=True,
     )
-    ep.preprocess(
-        loaded_nb,
-        {"metadata": {"path": nb_path.parents[0]}},
-    )
+    start_time = time.perf_counter()
+    with profile_phase(f"{nb_path.name}: execute", "execution"):
+        ep.preprocess(
+            loaded_nb,
+            {"metadata": {"path": nb_path.parents[0]}},
+        )
+    execution_durations = {
+        "notebook": round(time.perf_counter() - start_time, 3),
+        "cells": _get_nb_cell_durations(loaded_nb),
+    }
+    _record_nb_cell_profile_events(loaded_nb, nb_path)
 
     execution_successful = _is_nb_fully_executed(
         loaded_nb,
     )
     if execution_successful:
-        print(f"Execution: Notebook {nb_path.name} execution has been successful.")
+        print(
+            f"Execution: Notebook {nb_path.name} execution has been successful "
+            f"({execution_durations['notebook']:.1f} s)."
+        )
+
+    return loaded_nb, execution_initiated, execution_successful, execution_durations
+
+
+def _rerender_nb_with_prior_outputs(loaded_nb):
+    """
+    Combine a notebook's current cells with the outputs of its last execution.
+
+    This is used when only the markdown of a notebook has changed since it was last
+    executed, so that the new markdown can be rendered without starting a kernel. Since
+    code cells are unchanged, the outputs already stored in the notebook file itself
+    are still valid, as long as it is fully executed.
 
-    return loaded_nb, execution_initiated, execution_successful
+    Parameters
+    ----------
+    loaded_nb : nbformat.notebooknode.NotebookNode
+        The notebook object, as loaded from its file
+
+    Returns
+    -------
+    nbformat.notebooknode.NotebookNode or None
+        The notebook with its current cells and prior outputs, or None if no prior
+        outputs could be found
+    """
+    if _is_nb_fully_executed(loaded_nb):
+        return loaded_nb
+
+    return None
 
 
 def _process_nb(
@@ -791,16 +1343,18 @@ def _process_nb(
     3. Checking prior execution status from pre-existing JSON output files
     4. Determining if the notebook should be executed based on various criteria
     5. Executing the notebook if needed
-    6. Issuing warnings for execution failures
+    6. If not executing, but only the markdown of a successfully-executed notebook has
+       changed, combining the new markdown with its prior outputs so that it can be
+       re-rendered without a kernel (see `_rerender_nb_with_prior_outputs`)
+    7. Issuing warnings for execution failures
 
     Parameters
     ----------
     nb_path : pathlib.Path
         Path to the Jupyter notebook file (.ipynb) to process
     nb_hashes : dict
-        Mapping of notebook filenames (str) to their SHA256 hash values (str).
-        Keys are notebook filenames (e.g., "example.ipynb"), values are 64-character
-        hexadecimal hash strings
+        Mapping of notebook filenames (str) to their previously-recorded hashes, as
+        loaded by `_load_nb_hashes`
     nbs_to_skip : list
         List of notebook filenames that should be skipped during execution
     nb_json_output_dir : pathlib.Path
@@ -824,16 +1378,26 @@ def _process_nb(
 
     Returns
     -------
-    current_nb_hash : str
-        The SHA256 hash of the notebook in its current state
+    current_nb_hashes : dict
+        The code and markdown SHA256 hashes of the notebook in its current state, as
+        generated by `_calculate_nb_hashes`
     loaded_nb : nbformat.notebooknode.NotebookNode
-        The notebook object, either freshly loaded or executed with outputs
+        The notebook object, either freshly loaded, executed with outputs, or
+        re-rendered with prior outputs
     current_execution_initiated : bool
         True if execution was attempted for this notebook, False otherwise
     execution_successful : bool
         True if the notebook was fully executed successfully (all non-empty
         code cells have execution_count), False otherwise. For non-executed
         notebooks, this reflects the prior execution status
+    execution_durations : dict or None
+        Wall-clock timing of the current execution as returned by `_execute_nb`, or
+        None if the notebook was not executed
+    outputs_rerendered : bool
+        True if the notebook was not executed, but only its markdown changed and
+        `loaded_nb` contains the new markdown combined with its prior outputs. In this
+        case the new JSON output should be written while keeping the prior execution
+        metadata, see `_write_nb_json_output`
     """
     # Don't need to show the whole path in logging and warning messages
     filename = nb_path.name
@@ -842,10 +1406,13 @@ def _process_nb(
     loaded_nb = _load_nb(nb_path)
 
     # hash the nb in its current state
-    current_nb_hash = _calculate_nb_hash(loaded_nb)
+    current_nb_hashes = _calculate_nb_hashes(loaded_nb)
+    prior_nb_hashes = _get_prior_nb_hashes(filename, nb_hashes, loaded_nb)
 
     # flag for whether the nb was run, initialized as false
     current_execution_initiated = False
+    execution_durations = None
+    outputs_rerendered = False
 
     # If the data exists, obtain the prior commit used (in the "dev" cases), whether the
     # last nb execution was successful, and/or what was the last HNN version used to run
@@ -862,8 +1429,8 @@ def _process_nb(
     print(f"Configuration: Checking whether '{filename}' should be newly re-executed.")
     should_execute = _determine_should_execute_nb(
         filename,
-        nb_hashes,
-        current_nb_hash,
+        prior_nb_hashes,
+        current_nb_hashes,
         nbs_to_skip,
         execution_type,
         prior_commit_if_any,
@@ -874,9 +1441,12 @@ def _process_nb(
     )
     # execute nb as needed
     if should_execute:
-        loaded_nb, current_execution_initiated, current_execution_successful = (
-            _execute_nb(nb_path)
-        )
+        (
+            loaded_nb,
+            current_execution_initiated,
+            current_execution_successful,
+            execution_durations,
+        ) = _execute_nb(nb_path)
         execution_successful = current_execution_successful
 
         # AES: I've tried to reorganize the warnings. The warnings here are now only for
@@ -914,13 +1484,50 @@ def _process_nb(
     else:
         execution_successful = prior_execution_if_any
 
-    return current_nb_hash, loaded_nb, current_execution_initiated, execution_successful
+        # If only the markdown has changed since the last successful execution, the
+        # prior outputs are still valid, so re-render the notebook with its new
+        # markdown without starting a kernel.
+        markdown_only_change = (
+            (prior_nb_hashes is not None)
+            and (prior_nb_hashes["code"] == current_nb_hashes["code"])
+            and (prior_nb_hashes["markdown"] != current_nb_hashes["markdown"])
+        )
+        if markdown_only_change and prior_execution_if_any:
+            rerendered_nb = _rerender_nb_with_prior_outputs(loaded_nb)
+            if rerendered_nb is not None:
+                print(
+                    f"Execution: Only the markdown of '{filename}' has changed. "
+                    "Re-rendering it with its prior outputs, without executing."
+                )
+                loaded_nb = rerendered_nb
+                outputs_rerendered = True
+            else:
+                warnings.warn(
+                    textwrap.dedent(f"""
+                    # ------------------------------------------------------------------
+                    # WARNING: Only the markdown of notebook
+                    # '{filename}'
+                    # has changed, but the notebook file itself is not fully executed,
+                    # so its prior outputs cannot be re-used. The JSON output will not
+                    # include the markdown changes until the notebook is re-executed.
+                    # ------------------------------------------------------------------
+                """)
+                )
+
+    return (
+        current_nb_hashes,
+        loaded_nb,
+        current_execution_initiated,
+        execution_successful,
+        execution_durations,
+        outputs_rerendered,
+    )
 
 
 def _determine_should_execute_nb(
     filename,
-    nb_hashes,
-    current_nb_hash,
+    prior_nb_hashes,
+    current_nb_hashes,
     nbs_to_skip,
     execution_type,
     prior_commit_if_any,
@@ -937,7 +1544,8 @@ def _determine_should_execute_nb(
     - Whether the notebook is flagged for skipping
     - Whether the notebook is "new" (not associated with a JSON output)
     - Whether the user is performing a 'dev' build
-    - Whether the notebook hash has changed since last execution
+    - Whether the code of the notebook has changed since last execution (changes to
+      only its markdown never require execution, see `_process_nb`)
     - The execution type specified by the user
 
     Warnings are printed if the notebook appears outdated or if execution
@@ -947,12 +1555,12 @@ def _determine_should_execute_nb(
     ----------
     filename : str
         The local filename of the notebook (e.g., "example.ipynb")
-    nb_hashes : dict
-        Mapping of notebook filenames (str) to their SHA256 hash values (str).
-        Keys are notebook filenames (e.g., "example.ipynb"), values are 64-character
-        hexadecimal hash strings
-    current_nb_hash : str
-        Newly-determined SHA256 hash of the notebook based on its current state
+    prior_nb_hashes : dict or None
+        Previously-recorded code and markdown hashes of the notebook, as returned by
+        `_get_prior_nb_hashes`. None if the notebook is new
+    current_nb_hashes : dict
+        Newly-determined code and markdown hashes of the notebook based on its current
+        state, as generated by `_calculate_nb_hashes`
     nbs_to_skip : list
         List of notebook filenames that should be skipped during execution
     execution_type : str
@@ -986,6 +1594,8 @@ def _determine_should_execute_nb(
     bool
         True if the notebook should be executed, False otherwise
     """
+    from packaging.version import Version
+
     # 1. Handle SUPER-OMEGA-execute-all-notebooks, including skipped
     # ----------------------------------------------------------------------------------
     # AES: This is a brand-new option.
@@ -1001,7 +1611,7 @@ def _determine_should_execute_nb(
     # no args.
     if execution_type == "no-execution":
         # 2.1) if nb new
-        if filename not in nb_hashes:
+        if prior_nb_hashes is None:
             print(
                 textwrap.dedent(f"""
                 # ----------------------------------------------------------------------
@@ -1012,8 +1622,8 @@ def _determine_should_execute_nb(
                 # ----------------------------------------------------------------------
             """)
             )
-        # 2.2) if nb hash has changed
-        elif nb_hashes[filename] != current_nb_hash:
+        # 2.2) if nb code hash has changed
+        elif prior_nb_hashes["code"] != current_nb_hashes["code"]:
             print(
                 textwrap.dedent(f"""
                 # ----------------------------------------------------------------------
@@ -1030,6 +1640,7 @@ def _determine_should_execute_nb(
         # three) values. May need more refactoring.
         elif prior_version_if_any != "NA":
             if prior_version_if_any is not False:
+                hnn_version = get_installed_hnn_version()
                 if Version(hnn_version) > Version(prior_version_if_any):
                     warnings.warn(
                         textwrap.dedent(f"""
@@ -1128,8 +1739,10 @@ def _determine_should_execute_nb(
     # ----------------------------------------------------------------------------------
     # AES: This was formerly called via the "--execute-notebooks" CLI arg.
     if execution_type == "updated-unskipped-notebooks":
-        # 5.1) if the hash has not changed
-        if (filename in nb_hashes) and (nb_hashes[filename] == current_nb_hash):
+        # 5.1) if the code hash has not changed
+        if (prior_nb_hashes is not None) and (
+            prior_nb_hashes["code"] == current_nb_hashes["code"]
+        ):
             if is_dev_build:
                 # check if the commit specified to use by the dev build
                 # matches the commit last used to run the nb per the
@@ -1149,7 +1762,7 @@ def _determine_should_execute_nb(
                     f"Not executing: Notebook '{filename}' is unchanged and already fully executed."
                 )
                 return False
-        # 5.2) if the hash has changed or it's a new notebook
+        # 5.2) if the code hash has changed or it's a new notebook
         else:
             print(
                 f"Executing '{filename}' due to notebook being either new or changed."
@@ -1165,13 +1778,16 @@ def _write_nb_json_output(
     execution_successful,
     is_dev_build,
     hnn_commit_hash,
+    execution_durations=None,
+    outputs_rerendered=False,
 ):
     """
     Save structured JSON output file containing notebook HTML and metadata.
 
     The processed structured JSON output from the notebook is combined with execution
-    metadata (execution status, hnn-core version, and optional commit hash for dev
-    builds), and then saved to file.
+    metadata (execution status, hnn-core version, execution durations, and optional
+    commit hash for dev builds), and then saved to file. The index file of the JSON
+    output (see `scripts/nb_output_index.py`) is saved next to it.
 
     Parameters
     ----------
@@ -1198,6 +1814,17 @@ def _write_nb_json_output(
         The commit hash of the hnn_core code version to use for either new execution or
         comparison with the old execution history. None if doing a 'stable' build,
         otherwise (i.e. 'dev' build) is the full commit SHA.
+    execution_durations : dict, optional
+        Wall-clock timing of the current execution as returned by `_execute_nb`. If
+        provided, it is recorded in the JSON output as 'last_execution_duration' and
+        'last_execution_cell_durations' (used to schedule the longest notebooks first
+        in later builds). If the notebook was not executed, any previously-recorded
+        durations are kept.
+    outputs_rerendered : bool, optional
+        Only used if `execution_initiated` is False. If True, the notebook was
+        re-rendered with its prior outputs (see `_process_nb`), so `nb_json_content` is
+        written while keeping the execution metadata of the previous JSON output. If
+        False (the default), the previous JSON output is kept entirely.
 
     Returns
     -------
@@ -1212,18 +1839,36 @@ def _write_nb_json_output(
         # Track version used in nb execution
         nb_json_content = {
             "last_execution_successful": execution_successful,
-            "last_hnn_version_used": hnn_version,
+            "last_hnn_version_used": get_installed_hnn_version(),
             **nb_json_content,
         }
         if is_dev_build:
             print("Commit to use:", hnn_commit_hash)
             nb_json_content["last_hnn_dev_commit_used"] = hnn_commit_hash
+        if execution_durations is not None:
+            nb_json_content["last_execution_duration"] = execution_durations["notebook"]
+            nb_json_content["last_execution_cell_durations"] = execution_durations[
+                "cells"
+            ]
     else:
         # get previously-used hnn version from json file
         previous_version = "NA"
         if output_json_path.exists():
             with open(output_json_path, "r") as f:
-                nb_json_content = json.load(f)
+                previous_nb_json_content = json.load(f)
+            if outputs_rerendered:
+                # Keep the newly-rendered cells, but carry over the metadata of the
+                # execution that produced their outputs
+                nb_json_content = {
+                    **{
+                        key: val
+                        for key, val in previous_nb_json_content.items()
+                        if key != nb_path.name
+                    },
+                    **nb_json_content,
+                }
+            else:
+                nb_json_content = previous_nb_json_content
             # check for hnn_version key
             if "last_hnn_version_used" in nb_json_content:
                 previous_version = nb_json_content["last_hnn_version_used"]
@@ -1238,6 +1883,7 @@ def _write_nb_json_output(
 
     with open(output_json_path, "w") as f:
         json.dump(nb_json_content, f, indent=4)
+    write_nb_output_index(output_json_path, nb_json_content)
 
     return output_json_path
 
@@ -1281,6 +1927,159 @@ def _save_standalone_nb_html(
         f.write("\n</body></html>")
 
 
+def _process_and_convert_nb(
+    nb_path,
+    nb_hashes,
+    nbs_to_skip,
+    nb_json_output_dir,
+    execution_type,
+    is_dev_build,
+    hnn_commit_hash,
+    save_standalone_nb_html,
+    use_base64,
+    pandoc_cache_dir=None,
+):
+    """
+    Process, (possibly) execute, and convert a single notebook to its JSON output.
+
+    This contains all of the per-notebook work of `execute_and_convert_nbs_to_json`,
+    and only writes files that belong to this notebook (its JSON output, images, and
+    optional standalone HTML). This makes it safe to run for multiple notebooks at once
+    in separate worker processes.
+
+    Parameters
+    ----------
+    nb_path : pathlib.Path
+        Path to the Jupyter notebook file (.ipynb) to process
+    nb_hashes : dict
+        Mapping of notebook filenames (str) to their previously-recorded SHA256 hash
+        values (str), as loaded by `_load_nb_hashes`
+    nbs_to_skip : list
+        List of notebook filenames that should be skipped during execution
+    nb_json_output_dir : pathlib.Path
+        Directory where the notebook's JSON output file (and images) will be saved
+    execution_type : str
+        Execution mode that determines which notebooks to execute. See
+        `execute_and_convert_nbs_to_json` for valid values
+    is_dev_build : bool
+        Flag for if we are doing a "dev" build
+    hnn_commit_hash : str or None
+        The commit hash of the hnn_core code version to use for either new execution or
+        comparison with the old execution history. None if doing a 'stable' build
+    save_standalone_nb_html : bool
+        If True, also write a standalone HTML preview file for the notebook
+    use_base64 : bool
+        If True, embed images as Base64 strings instead of saving them as PNG files
+    pandoc_cache_dir : pathlib.Path, optional
+        The markdown conversion cache directory, see `_convert_md_cells_to_html`.
+        Default is None, which disables the cache.
+
+    Returns
+    -------
+    processed_hashes : dict
+        The code and markdown SHA256 hashes of the notebook in its current state, to be
+        recorded in 'nb_hashes.json'
+    """
+    print(f"\nProcessing notebook: '{nb_path.name}'")
+
+    # process nb and update hash
+    with profile_phase(f"{nb_path.name}: process", "processing"):
+        (
+            processed_hashes,
+            loaded_nb,
+            execution_initiated,
+            execution_successful,
+            execution_durations,
+            outputs_rerendered,
+        ) = _process_nb(
+            nb_path,
+            nb_hashes,
+            nbs_to_skip,
+            nb_json_output_dir,
+            execution_type,
+            is_dev_build,
+            hnn_commit_hash,
+        )
+
+    # If the notebook was neither executed nor re-rendered, then its previous JSON
+    # output is kept as-is (see `_write_nb_json_output`), so the images of the newly
+    # extracted HTML only need to be saved if it goes into a standalone HTML file
+    keeps_prior_json_output = (
+        not execution_initiated
+        and not outputs_rerendered
+        and (nb_json_output_dir / f"{nb_path.stem}.json").exists()
+    )
+
+    # extract the html from the nb, including saving any images if needed
+    with profile_phase(f"{nb_path.name}: convert to HTML", "conversion"):
+        nb_html_content = _extract_html_from_nb(
+            loaded_nb,
+            nb_path,
+            nb_json_output_dir,
+            use_base64=use_base64,
+            pandoc_cache_dir=pandoc_cache_dir,
+            save_images=(not keeps_prior_json_output) or save_standalone_nb_html,
+        )
+
+    # optionally write standalone nb to an html file
+    if save_standalone_nb_html:
+        _save_standalone_nb_html(
+            nb_html_content,
+            nb_path,
+            nb_json_output_dir,
+        )
+
+    # Generate structured json output
+    nb_json_content = _convert_nb_html_to_json(
+        nb_html_content,
+        nb_path,
+    )
+
+    # Save the final json output file
+    _write_nb_json_output(
+        nb_json_content,
+        nb_path,
+        nb_json_output_dir,
+        execution_initiated,
+        execution_successful,
+        is_dev_build,
+        hnn_commit_hash,
+        execution_durations=execution_durations,
+        outputs_rerendered=outputs_rerendered,
+    )
+
+    print(
+        f"\nExecution: Success: Converted '{nb_path.name}' "
+        "to HTML, then structured JSON."
+    )
+
+    return processed_hashes
+
+
+def _run_nb_job(nb_job_args, profile=False):
+    """
+    Process a single notebook with `_process_and_convert_nb`, timed as a profiling
+    event (see `scripts/profiling.py`).
+
+    Worker processes (see `execute_and_convert_nbs_to_json`) start with profiling
+    disabled, so `profile` is given to enable it in them. Their events are then
+    returned, for the main process to add to its own.
+
+    Returns
+    -------
+    processed_hashes : dict
+        See `_process_and_convert_nb`
+    profile_events : list of dict
+        The profiling events recorded by this job if `profile` is True, otherwise an
+        empty list (any events are then kept in this process)
+    """
+    if profile:
+        enable_profiling()
+    with profile_phase(nb_job_args[0].name, "notebook"):
+        processed_hashes = _process_and_convert_nb(*nb_job_args)
+    return processed_hashes, collect_profile_events() if profile else []
+
+
 def execute_and_convert_nbs_to_json(
     content_path,
     nb_hashes_path,
@@ -1290,6 +2089,9 @@ def execute_and_convert_nbs_to_json(
     hnn_commit_hash,
     save_standalone_nb_html,
     use_base64=False,
+    n_jobs=1,
+    pandoc_cache_dir=None,
+    nb_paths=None,
 ):
     """
     Main orchestration function for processing all Jupyter notebooks in the textbook.
@@ -1352,6 +2154,23 @@ def execute_and_convert_nbs_to_json(
     use_base64 : bool, optional
         If True, embed notebook output images as Base64 strings in HTML. If False,
         save images as separate PNG files. Default is False
+    n_jobs : int, optional
+        Number of worker processes to use for processing notebooks. Each worker runs
+        its own Jupyter kernel, so up to `n_jobs` notebooks are executed concurrently.
+        If 1, notebooks are processed sequentially in the current process. This is the
+        same as the value passed to the '--jobs' argument of the CLI in `build.py`.
+        Default is 1
+    pandoc_cache_dir : pathlib.Path, optional
+        Directory for caching the HTML of every converted markdown cell, so that
+        unchanged markdown cells are not re-converted by Pandoc (see
+        `scripts/pandoc_conversion.py`). Typically
+        '<textbook-root>/.build_cache/pandoc_cache/'. Default is None, which disables
+        the cache.
+    nb_paths : list of pathlib.Path, optional
+        If given, only these notebooks (out of all notebooks found in `content_path`)
+        are processed, and the recorded hashes of all other notebooks are kept as they
+        are. This is used by 'python build.py serve' to only re-convert notebooks that
+        have changed. Default is None, which processes all notebooks.
 
     Returns
     -------
@@ -1365,6 +2184,14 @@ def execute_and_convert_nbs_to_json(
     - JSON output files contain HTML, execution metadata, and hnn-core version info
     - Images from notebook outputs are saved to output_nb_{notebook_name}/ directories
     - For dev builds, JSON output is written to a parallel 'dev/' directory structure
+    - When `n_jobs` > 1, each notebook writes only its own output files, and the
+      updated hashes are collected in sorted notebook order before being saved, so the
+      results are identical to a sequential build
+    - When `n_jobs` > 1, notebooks are started in order of their last recorded
+      execution duration (longest first), see `_read_nb_expected_duration`
+    - If profiling is enabled (see `scripts/profiling.py`), every notebook, its
+      processing, execution, and conversion, and each of its executed code cells are
+      timed, including in worker processes
     """
     # Setup
     # ----------------------------------------------------------------------------------
@@ -1377,6 +2204,14 @@ def execute_and_convert_nbs_to_json(
     )
     # #################### [END BUGFIX] ####################
 
+    if nb_paths is not None:
+        selected_nb_paths = {Path(nb_path).resolve() for nb_path in nb_paths}
+        all_nb_paths = [
+            nb_path
+            for nb_path in all_nb_paths
+            if nb_path.resolve() in selected_nb_paths
+        ]
+
     # get nb hashes from json
     nb_hashes = _load_nb_hashes(nb_hashes_path)
     updated_hashes = nb_hashes.copy()
@@ -1384,12 +2219,10 @@ def execute_and_convert_nbs_to_json(
     # get list of nbs to skip
     nbs_to_skip = _load_nbs_to_skip(nb_skips_path, is_dev_build)
 
-    # Loop through all notebooks
+    # Determine where each notebook's outputs go
     # ----------------------------------------------------------------------------------
+    nb_json_output_dirs = []
     for nb_path in all_nb_paths:
-        print(f"\nProcessing notebook: '{nb_path.name}'")
-
-        nb_path = Path(nb_path)
         if is_dev_build:
             # This needs to be done separately in both the notebook-execution code here
             # and later in the page-generation code, since there is not necessarily a
@@ -1402,59 +2235,78 @@ def execute_and_convert_nbs_to_json(
             nb_json_output_dir.mkdir(parents=True, exist_ok=True)
         else:
             nb_json_output_dir = nb_path.parents[0]
+        nb_json_output_dirs.append(nb_json_output_dir)
 
-        # process nb and update hash
-        processed_hash, loaded_nb, execution_initiated, execution_successful = (
-            _process_nb(
-                nb_path,
-                nb_hashes,
-                nbs_to_skip,
-                nb_json_output_dir,
-                execution_type,
-                is_dev_build,
-                hnn_commit_hash,
-            )
-        )
-
-        # extract the html from the nb, including saving any images if needed
-        nb_html_content = _extract_html_from_nb(
-            loaded_nb,
-            nb_path,
-            nb_json_output_dir,
-            use_base64=use_base64,
-        )
-
-        # optionally write standalone nb to an html file
-        if save_standalone_nb_html:
-            _save_standalone_nb_html(
-                nb_html_content,
-                nb_path,
-                nb_json_output_dir,
-            )
-
-        # Generate structured json output
-        nb_json_content = _convert_nb_html_to_json(
-            nb_html_content,
-            nb_path,
-        )
-
-        # Save the final json output file
-        _write_nb_json_output(
-            nb_json_content,
-            nb_path,
+    nb_job_args = [
+        (
+            Path(nb_path),
+            nb_hashes,
+            nbs_to_skip,
             nb_json_output_dir,
-            execution_initiated,
-            execution_successful,
+            execution_type,
             is_dev_build,
             hnn_commit_hash,
+            save_standalone_nb_html,
+            use_base64,
+            pandoc_cache_dir,
         )
+        for nb_path, nb_json_output_dir in zip(all_nb_paths, nb_json_output_dirs)
+    ]
 
-        print(
-            f"\nExecution: Success: Converted '{nb_path.name}' "
-            "to HTML, then structured JSON."
+    # Process all notebooks, either one at a time or in a pool of worker processes
+    # ----------------------------------------------------------------------------------
+    if n_jobs == 1:
+        nb_job_results = [_run_nb_job(args) for args in nb_job_args]
+    else:
+        print(f"Execution: Processing notebooks using {n_jobs} worker processes.")
+        # Each worker starts its own Jupyter kernel(s), so we use "spawn" rather than
+        # "fork" to avoid copying the parent's ZMQ/threading state into the children.
+        # Submit notebooks in "longest processing time first" (LPT) order, based on
+        # how long each took the last time it was executed. The pool hands out work
+        # in submission order, so the slowest notebooks start first and the short
+        # ones fill in the gaps, instead of a long notebook running alone at the end.
+        # Notebooks with no recorded duration are treated as the most expensive.
+        expected_durations = [
+            _read_nb_expected_duration(nb_path, nb_json_output_dir)
+            for nb_path, nb_json_output_dir in zip(all_nb_paths, nb_json_output_dirs)
+        ]
+        submission_order = sorted(
+            range(len(nb_job_args)),
+            key=lambda idx: expected_durations[idx],
+            reverse=True,
         )
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = {
+                idx: executor.submit(
+                    _run_nb_job,
+                    nb_job_args[idx],
+                    profile=is_profiling_enabled(),
+                )
+                for idx in submission_order
+            }
+            # Gather results in the original (sorted) notebook order, regardless of
+            # which notebooks finish first, so that the hashes file is deterministic.
+            nb_job_results = [
+                futures[idx].result() for idx in range(len(nb_job_args))
+            ]
+
+    for nb_path, (processed_hashes, profile_events) in zip(
+        all_nb_paths,
+        nb_job_results,
+    ):
+        updated_hashes[nb_path.name] = processed_hashes
+        add_profile_events(profile_events)
 
-        updated_hashes[nb_path.name] = processed_hash
+    # Garbage-collect images that no output refers to anymore
+    # ----------------------------------------------------------------------------------
+    # This is only done once every notebook has been converted, and over all notebooks
+    # of each output directory at once, so that it also covers notebooks that were
+    # skipped (or not selected by `nb_paths`) in this build.
+    for nb_json_output_dir in sorted(set(nb_json_output_dirs)):
+        _remove_unreferenced_nb_images(nb_json_output_dir, save_standalone_nb_html)
 
     # Finally, save updated hashes
     _save_nb_hashes(
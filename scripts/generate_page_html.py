@@ -1,22 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import re
 import textwrap
 from copy import deepcopy
 from pathlib import Path
 
-import pypandoc
-
-from .create_indices import create_flat_index, create_hier_index
+from .create_indices import create_flat_index, create_hier_index, scan_content
 from .create_sidebar_html import create_sidebar_html
 from .execute_and_convert_nbs import (
-    _get_section_outputs,
-    load_nb_json_output,
+    _structure_json,
+    load_nb_json_output_sections,
+)
+from .optimize_images import (
+    add_lazy_loading_attributes,
+    load_image_manifest,
+    optimize_html_images,
+    save_image_manifest,
 )
+from .pandoc_conversion import (
+    PANDOC_WORKER_SCRIPT_PATH,
+    convert_md_to_html,
+    get_pandoc_version,
+)
+from .profiling import profile_phase
+
+# Bump this whenever the way pages are generated changes in a way that is not captured
+# by the hashes of the 'scripts' source files, which forces all pages to be regenerated
+PAGE_DEPENDENCIES_FORMAT_VERSION = 1
+
+# When notebook sections are lazy-loaded (see `_add_nb_to_html`), the leading sections
+# of every embedded notebook are still inlined into the page until at least this many
+# characters of HTML have been, which is roughly the first screen or two of a page
+NB_INLINE_HTML_MIN_CHARS = 20000
+
+# Placeholder for a lazy-loaded notebook section, which `templates/scripts.js` replaces
+# with the contents of the fragment file at 'data-src' once the reader scrolls near it.
+# Without Javascript, the link still leads to the section.
+NB_LAZY_SECTION_PLACEHOLDER = """
+<div class="nb-lazy-section" data-src="{fragment_src}">
+    <a href="{fragment_src}">Show the next part of this notebook</a>
+</div>
+"""
+
+# Matches the attributes of HTML tags that hold URLs, and their values, for making the
+# relative URLs of fragment files relative to their own directory (see
+# `_rebase_relative_urls`)
+URL_ATTRIBUTE_PATTERN = re.compile(r"""(\s(?:src|srcset|href)=)(["'])(.*?)\2""")
+
+# Matches URLs that are not relative to the current page, i.e. remote or embedded
+# (e.g. 'https://...' or 'data:...'), root-relative, or anchors in the current page
+NON_RELATIVE_URL_PATTERN = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*:|/|#)")
 
 
 def _read_nb_json_output_html_contents(
     nb_path,
     nb_json_output_dir,
     section_header=None,
+    split_sections=False,
 ):
     """
     Get the HTML output from the JSON output file of a notebook.
@@ -28,26 +69,31 @@ def _read_nb_json_output_html_contents(
     nb_json_output_dir : pathlib.Path
         Directory where the notebook's JSON output file will be located (and, if it
         exists, is present currently from a prior execution)
+    section_header : str, optional
+        If given, only the output of this section (and its sub-sections) is returned.
+        Default is None.
+    split_sections : bool, optional
+        If True, the output is returned separately for every top-level section, see
+        `_split_nb_html_sections`. Default is False.
 
     Returns
     -------
-    agg_html : str
+    agg_html : str or list of str
         The aggregated HTML output inside the JSON output file, corresponding to the
-        notebook at `nb_path`.
+        notebook at `nb_path`. If `split_sections` is True, this is a list of the HTML
+        of each top-level section instead, which add up to the same HTML.
     """
-    # Has content if the file is found, otherwise returns None
-    nb_outputs_if_any = load_nb_json_output(nb_path, nb_json_output_dir)
-    if nb_outputs_if_any:
-        full_nb_outputs = nb_outputs_if_any.get(nb_path.name, {})
+    # Has content if the file is found, otherwise returns None. Only the HTML of the
+    # requested section (if any) is read.
+    nb_outputs = load_nb_json_output_sections(
+        nb_path,
+        nb_json_output_dir,
+        section_header,
+    )
+    if nb_outputs is not None:
         agg_html = ""
-        if section_header is not None:
-            section_nb_outputs = _get_section_outputs(
-                full_nb_outputs,
-                section_header,
-            )
-            nb_outputs = section_nb_outputs
-        else:
-            nb_outputs = full_nb_outputs
+        if split_sections:
+            return _split_nb_html_sections(nb_outputs)
         for section, content in nb_outputs.items():
             if isinstance(content, dict) and "html" in content:
                 agg_html += content["html"]
@@ -65,6 +111,53 @@ def _read_nb_json_output_html_contents(
         )
 
 
+def _split_nb_html_sections(nb_outputs):
+    """
+    Split the HTML output of a notebook into its top-level sections.
+
+    The sections are found using `_structure_json`. Since notebooks typically start
+    with a single title header that every other header is nested under, the sections
+    directly under a lone top-level section are used instead (with the HTML of that
+    top-level section itself kept at the start of the first one). Each section includes
+    the HTML of all of its sub-sections.
+
+    Arguments
+    ---------
+    nb_outputs : dict
+        Mapping of section titles to their "level" and "html", as in the notebook's
+        JSON output file
+
+    Returns
+    -------
+    list of str
+        The HTML of each section, in order. Joined together, these are exactly the
+        aggregated HTML output of the notebook.
+    """
+    nb_hierarchy = _structure_json(
+        {
+            section: content
+            for section, content in nb_outputs.items()
+            if isinstance(content, dict) and "html" in content
+        }
+    )
+
+    def _get_subtree_html(section_info):
+        return section_info["html"] + "".join(
+            _get_subtree_html(sub_section_info)
+            for sub_section_info in section_info.get("sub-sections", [])
+        )
+
+    top_sections = list(nb_hierarchy.values())
+    if len(top_sections) == 1 and top_sections[0].get("sub-sections"):
+        html_sections = [
+            _get_subtree_html(sub_section_info)
+            for sub_section_info in top_sections[0]["sub-sections"]
+        ]
+        html_sections[0] = top_sections[0]["html"] + html_sections[0]
+        return html_sections
+    return [_get_subtree_html(section_info) for section_info in top_sections]
+
+
 def _add_ordering_to_footer(input_footer, page_idx, flat_index):
     """
     Inject previous/next page navigation links into the footer HTML template.
@@ -162,6 +255,7 @@ def _add_nb_to_html(
     converted_html,
     input_dir_path,
     is_dev_build,
+    nb_fragment_dir_name=None,
 ):
     """
     Insert Jupyter notebook HTML outputs into HTML converted from markdown page files.
@@ -185,6 +279,14 @@ def _add_nb_to_html(
         Whether this is a development build. If True, notebook JSON outputs are read
         from their '<textbook-root>/dev/**' directory instead of their source
         '<textbook-root>/content/**' directory.
+    nb_fragment_dir_name : str, optional
+        If given, notebook sections are lazy-loaded: only the leading top-level sections
+        of each notebook (see `NB_INLINE_HTML_MIN_CHARS`) are inserted into the page,
+        and every later section is replaced by a placeholder, which
+        'templates/scripts.js' fills with the section's fragment file once the reader
+        scrolls near it. This is the name of the directory (next to the output HTML
+        page) that the fragment files go in. Default is None, which inserts the entire
+        notebook.
 
     Returns
     -------
@@ -192,6 +294,9 @@ def _add_nb_to_html(
         The modified HTML with notebook placeholders replaced by:
         - A download button linking to the .ipynb file
         - The notebook's executed output HTML content (from the JSON output file)
+    nb_fragments : dict
+        Mapping of the path of every lazy-loaded section's fragment file (relative to
+        the output HTML page) to its HTML. Empty unless `nb_fragment_dir_name` is given.
     """
     # regex pattern match for "[[notebook_name.ipynb]" with only
     # a single closing bracket, as additional parameters may be
@@ -242,6 +347,7 @@ def _add_nb_to_html(
     #   *single* notebook, but this could be expanded
     nb_download_btn_added = False
 
+    nb_fragments = {}
     output_lines = []
     for line in converted_html.splitlines():
         match = nb_match_pattern.search(line)
@@ -279,19 +385,231 @@ def _add_nb_to_html(
             else:
                 nb_json_output_dir = nb_path.parents[0]
 
-            nb_html = _read_nb_json_output_html_contents(
-                nb_path,
-                nb_json_output_dir,
-                section,
-            )
-            output_lines.append(nb_html)
+            if nb_fragment_dir_name is None:
+                nb_html = _read_nb_json_output_html_contents(
+                    nb_path,
+                    nb_json_output_dir,
+                    section,
+                )
+                output_lines.append(nb_html)
+            else:
+                nb_html_sections = _read_nb_json_output_html_contents(
+                    nb_path,
+                    nb_json_output_dir,
+                    section,
+                    split_sections=True,
+                )
+                nb_html = ""
+                for nb_html_section in nb_html_sections:
+                    if len(nb_html) < NB_INLINE_HTML_MIN_CHARS:
+                        nb_html += nb_html_section
+                        continue
+                    # Fragments are numbered across all notebooks in the page
+                    fragment_src = (
+                        f"{nb_fragment_dir_name}/"
+                        f"section_{len(nb_fragments) + 1:02d}.html"
+                    )
+                    nb_fragments[fragment_src] = nb_html_section
+                    nb_html += NB_LAZY_SECTION_PLACEHOLDER.format(
+                        fragment_src=fragment_src,
+                    )
+                output_lines.append(nb_html)
         else:
             # This line is very important! This is where most of the md-page content
             # passes through.
             output_lines.append(line)
 
     combined_html = "\n".join(output_lines)
-    return combined_html
+    return combined_html, nb_fragments
+
+
+def _rebase_relative_urls(html_content, url_prefix):
+    """
+    Prefix every relative URL in the 'src', 'srcset', and 'href' attributes of HTML.
+
+    The HTML of lazy-loaded notebook sections is written relative to the page that
+    embeds it, but is saved to a fragment file in a directory next to the page (see
+    `_add_nb_to_html`). Without Javascript, the fragment file is opened by itself, so
+    its images would not be found unless its URLs are relative to the fragment file
+    instead. `templates/scripts.js` resolves them against the fragment file's URL when
+    inserting it into the page.
+
+    Arguments
+    ---------
+    html_content : str
+        The HTML whose URLs are relative to the page
+    url_prefix : str
+        The path from the fragment file's directory to the page's, e.g. '../'
+
+    Returns
+    -------
+    str
+        The HTML with every relative URL prefixed with `url_prefix`
+    """
+
+    def _rebase_url(url):
+        if (not url) or NON_RELATIVE_URL_PATTERN.match(url):
+            return url
+        return url_prefix + url
+
+    def _rebase_attribute(attribute_match):
+        attribute, quote, value = attribute_match.groups()
+        if attribute.strip() == "srcset=":
+            # e.g. 'fig_480w.png 480w, fig.png 960w'
+            candidates = []
+            for candidate in value.split(","):
+                if candidate.strip():
+                    url, *descriptors = candidate.split()
+                    candidates.append(" ".join([_rebase_url(url), *descriptors]))
+            value = ", ".join(candidates)
+        else:
+            value = _rebase_url(value)
+        return f"{attribute}{quote}{value}{quote}"
+
+    return URL_ATTRIBUTE_PATTERN.sub(_rebase_attribute, html_content)
+
+
+def _hash_contents(contents):
+    """Get the SHA256 hash of a string or bytes."""
+    if isinstance(contents, str):
+        contents = contents.encode("utf-8")
+    return hashlib.sha256(contents).hexdigest()
+
+
+def _hash_file_if_exists(file_path):
+    """Get the SHA256 hash of a file's contents, or None if it does not exist."""
+    try:
+        with open(file_path, "rb") as f:
+            return _hash_contents(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _get_page_nb_json_paths(markdown_text, input_dir_path, is_dev_build):
+    """
+    Get the paths of the JSON output files of all notebooks embedded in a page.
+
+    This uses the same '[[<notebook_name>.ipynb]]' pattern and JSON output locations as
+    `_add_nb_to_html`, but on the markdown page itself, so that it can be checked
+    before the page is converted.
+    """
+    nb_json_paths = []
+    for nb_name in re.findall(r"\[\[(.+?\.ipynb)\]", markdown_text):
+        nb_path = input_dir_path / nb_name
+        if is_dev_build:
+            nb_json_output_dir = Path(str(nb_path).replace("content", "dev"))
+            nb_json_output_dir = nb_json_output_dir.parents[0]
+        else:
+            nb_json_output_dir = nb_path.parents[0]
+        nb_json_paths.append(nb_json_output_dir / f"{nb_path.stem}.json")
+    return sorted(set(nb_json_paths))
+
+
+def _hash_page_generator(
+    bibliography_path,
+    optimize_images=False,
+    lazy_nb_sections=False,
+):
+    """
+    Hash everything that affects how *every* page is generated.
+
+    This covers the bibliography, the Pandoc version, the source code of the build
+    scripts themselves (including the Pandoc worker), and the build options that change
+    the output of every page, so that changing any of these regenerates all pages.
+    """
+    scripts_path = Path(__file__).parent
+    generator_source_paths = sorted(scripts_path.glob("*.py")) + [
+        PANDOC_WORKER_SCRIPT_PATH
+    ]
+    generator_contents = {
+        "format_version": PAGE_DEPENDENCIES_FORMAT_VERSION,
+        "pandoc_version": get_pandoc_version(),
+        "bibliography": _hash_file_if_exists(bibliography_path),
+        "optimize_images": optimize_images,
+        "lazy_nb_sections": lazy_nb_sections,
+        "sources": {
+            source_path.name: _hash_file_if_exists(source_path)
+            for source_path in generator_source_paths
+        },
+    }
+    return _hash_contents(json.dumps(generator_contents, sort_keys=True))
+
+
+def _load_page_dependencies(page_dependencies_path):
+    """
+    Load the recorded inputs of every page from the last build, see
+    `generate_page_html`. Returns an empty dict if there are none.
+    """
+    try:
+        with open(page_dependencies_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_page_dependencies(page_dependencies, page_dependencies_path):
+    """Save the recorded inputs of every page, see `generate_page_html`."""
+    page_dependencies_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(page_dependencies_path, "w", encoding="utf-8") as f:
+        json.dump(page_dependencies, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def _get_page_input_hashes(
+    markdown_text,
+    page_components,
+    input_dir_path,
+    is_dev_build,
+    generator_hash,
+):
+    """
+    Hash every input that determines the contents of a single output page.
+
+    Arguments
+    ---------
+    markdown_text : str
+        The page's markdown, after the "MD+YAML" metadata has been added
+    page_components : dict
+        The page's HTML components, after they have been customized for this page. The
+        "body" component is ignored. Hashing the final components (instead of the
+        templates they are made from) also captures the sidebar (which contains the
+        titles of all pages) and the footer (which contains the titles and paths of the
+        previous/next pages).
+    input_dir_path : pathlib.Path
+        Path to the directory containing the markdown page file
+    is_dev_build : bool
+        Whether this is a development build, which determines which notebook JSON
+        output files are embedded
+    generator_hash : str
+        The hash of everything shared by all pages, from `_hash_page_generator`
+
+    Returns
+    -------
+    dict
+        The hashes of the page's inputs
+    """
+    return {
+        "generator": generator_hash,
+        "markdown": _hash_contents(markdown_text),
+        "components": _hash_contents(
+            json.dumps(
+                {
+                    section: html_part
+                    for section, html_part in page_components.items()
+                    if section != "body"
+                },
+                sort_keys=True,
+            )
+        ),
+        "nb_json_outputs": {
+            str(nb_json_path): _hash_file_if_exists(nb_json_path)
+            for nb_json_path in _get_page_nb_json_paths(
+                markdown_text,
+                input_dir_path,
+                is_dev_build,
+            )
+        },
+    }
 
 
 def generate_page_html(
@@ -301,6 +619,13 @@ def generate_page_html(
     save_indices=False,
     hier_index_path=None,
     flat_index_path=None,
+    pandoc_cache_dir=None,
+    page_dependencies_path=None,
+    n_jobs=1,
+    page_metadata_cache_path=None,
+    image_manifest_path=None,
+    optimize_images_in_place=False,
+    lazy_nb_sections=False,
 ):
     """
     Convert markdown page files (and embedded notebooks) into HTML pages and save them.
@@ -337,6 +662,51 @@ def generate_page_html(
         Path where the flat index JSON file should be saved if `save_indices` is True.
         The flat index contains a sequential list of all pages with their input/output
         paths and titles, determining the linear page navigation order.
+    pandoc_cache_dir : pathlib.Path, optional
+        Directory for caching the HTML of every converted markdown page, so that pages
+        whose markdown (and the bibliography) have not changed are not re-converted by
+        Pandoc (see `scripts/pandoc_conversion.py`). Typically
+        '<textbook-root>/.build_cache/pandoc_cache/'. Default is None, which disables
+        the cache.
+    page_dependencies_path : pathlib.Path, optional
+        Path of a JSON file recording the hashes of every input of every page when it
+        was last generated (see `_get_page_input_hashes`). If given, pages whose inputs
+        are unchanged, and whose output HTML file is exactly as it was last written,
+        are not regenerated. Typically
+        '<textbook-root>/.build_cache/page_dependencies.json'. Default is None, which
+        regenerates every page.
+    n_jobs : int, optional
+        Number of threads to use for generating pages. If 1, pages are generated
+        sequentially in the current thread. This is the same as the value passed to the
+        '--jobs' argument of the CLI in `build.py`. Default is 1.
+    page_metadata_cache_path : pathlib.Path, optional
+        Path of a JSON file caching the title of every markdown file, keyed on its
+        modification time and size, so that unchanged markdown files are not re-read
+        while building the page indices (see `scan_content` in
+        `scripts/create_indices.py`). Typically
+        '<textbook-root>/.build_cache/page_metadata.json'. Default is None, which
+        disables the cache.
+    image_manifest_path : pathlib.Path, optional
+        Path of a JSON file recording the dimensions and optimization results of every
+        image that has been optimized. If given, every local image embedded in a page
+        is optimized, and its '<img>' tag updated accordingly (see
+        `optimize_html_images` in `scripts/optimize_images.py`), which requires Pillow.
+        Typically '<textbook-root>/.build_cache/image_manifest.json'. This is only
+        passed if the '--optimize-images' argument of the CLI in `build.py` is used.
+        Default is None, which leaves all images as they are.
+    optimize_images_in_place : bool, optional
+        Whether optimized images replace the original image files, rather than being
+        saved next to them (see the `in_place` argument of `optimize_html_images`).
+        This is only used if `image_manifest_path` is given, and descends from the
+        '--optimize-images-in-place' argument passed to the CLI of 'build.py'. Default
+        is False.
+    lazy_nb_sections : bool, optional
+        Whether to lazy-load the later sections of embedded notebooks, so that the time
+        until a page is first displayed does not grow with the length of its notebooks
+        (see `_add_nb_to_html`). Each lazy-loaded section is written to a fragment file
+        in a '<page name>_nb_sections/' directory next to the page. This descends from
+        the '--lazy-nb-sections' argument passed to the CLI of 'build.py'. Default is
+        False.
 
     Returns
     -------
@@ -345,6 +715,7 @@ def generate_page_html(
     """
     print("Building: Beginning build of website HTML pages.")
     css_path = content_path / "assets" / "styles.css"
+    bibliography_path = content_path.parent / "textbook-bibliography.bib"
     js_path = templates_path / "scripts.js"
 
     # Create and possibly save the dynamically-generated hierarchical-index
@@ -353,11 +724,17 @@ def generate_page_html(
     # page names, their nested sections if any, and the titles of each section and/or
     # page. It does NOT contain output filenames or anything like it. It is unchanged
     # from before the Great Refactors.
-    hier_index = create_hier_index(
-        content_path,
-        save_indices,
-        hier_index_path,
-    )
+    #
+    # Both indices are derived from a single walk of the content directory.
+    with profile_phase("scan_content", "indexing"):
+        content_scan = scan_content(content_path, page_metadata_cache_path)
+    with profile_phase("create_hier_index", "indexing"):
+        hier_index = create_hier_index(
+            content_path,
+            save_indices,
+            hier_index_path,
+            content_scan=content_scan,
+        )
 
     # Create and possibly save the dynamically-generated flat-index
     # ----------------------------------------------------------------------------------
@@ -367,6 +744,8 @@ def generate_page_html(
     #
     # - "absolute_input_md_path": Absolute filesystem path to the existing 'input'
     #     markdown file with actual page contents.
+    # - "relative_input_md_path": Path of the 'input' markdown file relative to
+    #     'content', which is what pages are looked up by (e.g. for the sidebar).
     # - "absolute_output_html_path": Absolute filesystem path to the not-yet-existing
     #     'output' HTML file corresponding to this markdown page.
     # - "relative_output_html_path": Relative path to the not-yet-existing 'output' HTML
@@ -381,12 +760,14 @@ def generate_page_html(
     # Importantly, this is what determines the appropriate output paths and filenames
     # for every markdown page file. This does NOT create those directories, but instead
     # only figures out the paths.
-    flat_index = create_flat_index(
-        content_path,
-        is_dev_build,
-        save_indices,
-        flat_index_path,
-    )
+    with profile_phase("create_flat_index", "indexing"):
+        flat_index = create_flat_index(
+            content_path,
+            is_dev_build,
+            save_indices,
+            flat_index_path,
+            content_scan=content_scan,
+        )
 
     # Begin building each of the separate HTML components:
     # ----------------------------------------------------------------------------------
@@ -422,16 +803,39 @@ def generate_page_html(
             html_parts[template] = f.read()
 
     # Create the template for the sidebar based on both indices:
-    html_parts["sidebar"] = create_sidebar_html(hier_index, flat_index)
+    with profile_phase("create_sidebar_html", "sidebar"):
+        html_parts["sidebar"] = create_sidebar_html(hier_index, flat_index)
 
     # Load some "MD+YAML" metadata to go at the top of every markdown page, but before
     # it is sent to PyPandoc:
     with open((templates_path / "md_yaml_metadata.txt"), "r") as f:
         md_yaml_metadata = f.read()
 
-    # Main loop
+    # Load the inputs of every page from the last build, for skipping unchanged pages
+    # ----------------------------------------------------------------------------------
+    if page_dependencies_path is not None:
+        prior_page_dependencies = _load_page_dependencies(page_dependencies_path)
+        generator_hash = _hash_page_generator(
+            bibliography_path,
+            optimize_images=image_manifest_path is not None,
+            lazy_nb_sections=lazy_nb_sections,
+        )
+
+    # Load the dimensions and optimization results of every previously-seen image
+    # ----------------------------------------------------------------------------------
+    if image_manifest_path is not None:
+        image_manifest = load_image_manifest(image_manifest_path)
+
+    # Helper for generating a single page
     # ----------------------------------------------------------------------------------
-    for page_idx, page in enumerate(flat_index):
+    def _generate_page(page_idx, page):
+        """
+        Generate and write the HTML page for a single element of `flat_index`.
+
+        Returns the page's key and record for `page_dependencies_path` (both None if
+        pages are not being tracked), and whether the page was skipped because none of
+        its inputs had changed.
+        """
         # Unique-ify our components for this page
         page_components = html_parts.copy()
 
@@ -478,20 +882,46 @@ def generate_page_html(
         # add check for title section in markdown file
         markdown_text = markdown_text.replace("-->", "-->\n\n" + md_yaml_metadata, 1)
 
-        # Convert markdown to html with pypandoc
+        # Skip this page if none of its inputs have changed since it was last generated
         # ------------------------------------------------------------------------------
-        converted_html = pypandoc.convert_text(
+        # Editing a page's content only regenerates that page, but editing its title
+        # regenerates every page, since all of their sidebars include it.
+        if page_dependencies_path is not None:
+            page_key = str(abs_out_html_path)
+            page_input_hashes = _get_page_input_hashes(
+                markdown_text,
+                page_components,
+                input_dir_path,
+                is_dev_build,
+                generator_hash,
+            )
+            prior_page_record = prior_page_dependencies.get(page_key, {})
+            if (
+                (prior_page_record.get("inputs") == page_input_hashes)
+                and (
+                    prior_page_record.get("output")
+                    == _hash_file_if_exists(abs_out_html_path)
+                )
+                and all(
+                    _hash_file_if_exists(file_path) == file_hash
+                    for record_key in ["images", "fragments"]
+                    for file_path, file_hash in prior_page_record.get(
+                        record_key, {}
+                    ).items()
+                )
+            ):
+                return page_key, prior_page_record, True
+
+        # Convert markdown to html with Pandoc
+        # ------------------------------------------------------------------------------
+        # This goes through the build's long-lived Pandoc worker, which only parses the
+        # bibliography once for all pages, and is skipped entirely if this exact
+        # conversion is already cached, see `scripts/pandoc_conversion.py`
+        converted_html = convert_md_to_html(
             markdown_text,
-            format="md",
-            to="html",
-            extra_args=[
-                "--wrap=none",
-                "--bibliography=textbook-bibliography.bib",
-                "--citeproc",
-                "--mathml",
-                "-f",
-                "markdown-auto_identifiers",
-            ],
+            wrap="none",
+            bibliography_path=bibliography_path,
+            cache_dir=pandoc_cache_dir,
         )
 
         # Set relative image paths when doing a dev build
@@ -530,12 +960,72 @@ def generate_page_html(
         # Add any notebook content
         # ------------------------------------------------------------------------------
         # This line is very important, since all markdown-page content is replaced by it.
-        combined_html = _add_nb_to_html(
+        nb_fragment_dir_name = f"{abs_out_html_path.stem}_nb_sections"
+        combined_html, nb_fragments = _add_nb_to_html(
             converted_html,
             input_dir_path,
             is_dev_build,
+            nb_fragment_dir_name=nb_fragment_dir_name if lazy_nb_sections else None,
         )
 
+        # Optimize images, if requested
+        # ------------------------------------------------------------------------------
+        # Since this also sets the dimensions of every image in the page, the images
+        # themselves are recorded as inputs of the page. Lazy-loaded notebook sections
+        # are inserted into the page itself, so their image paths are also relative to
+        # the page. Optimizing (and writing) images is timed as its own event, apart
+        # from the rest of the page.
+        page_img_hashes = {}
+        if image_manifest_path is not None:
+            with profile_phase(
+                f"{page['relative_input_md_path']}: optimize images",
+                "images",
+            ) as event_args:
+                combined_html, page_img_hashes = optimize_html_images(
+                    combined_html,
+                    abs_out_dir_path,
+                    image_manifest,
+                    in_place=optimize_images_in_place,
+                )
+                for fragment_src, fragment_html in nb_fragments.items():
+                    (
+                        nb_fragments[fragment_src],
+                        fragment_img_hashes,
+                    ) = optimize_html_images(
+                        fragment_html,
+                        abs_out_dir_path,
+                        image_manifest,
+                        in_place=optimize_images_in_place,
+                    )
+                    page_img_hashes.update(fragment_img_hashes)
+                event_args["n_image_files"] = len(page_img_hashes)
+
+        # Every image is lazy-loaded, whether or not images are optimized
+        combined_html = add_lazy_loading_attributes(combined_html)
+        for fragment_src, fragment_html in nb_fragments.items():
+            nb_fragments[fragment_src] = add_lazy_loading_attributes(fragment_html)
+
+        # Write the fragment files of lazy-loaded notebook sections
+        # ------------------------------------------------------------------------------
+        # Fragments left over from a previous build (e.g. if the notebook got shorter,
+        # or sections are not lazy-loaded anymore) are deleted.
+        page_fragment_hashes = {}
+        nb_fragment_dir_path = abs_out_dir_path / nb_fragment_dir_name
+        if nb_fragments:
+            nb_fragment_dir_path.mkdir(exist_ok=True)
+        for fragment_src, fragment_html in nb_fragments.items():
+            fragment_path = abs_out_dir_path / fragment_src
+            fragment_html = _rebase_relative_urls(fragment_html, "../")
+            with open(fragment_path, "w", encoding="utf-8") as out:
+                out.write(fragment_html)
+            page_fragment_hashes[str(fragment_path)] = _hash_contents(fragment_html)
+        if nb_fragment_dir_path.is_dir():
+            for fragment_path in nb_fragment_dir_path.glob("section_*.html"):
+                if str(fragment_path) not in page_fragment_hashes:
+                    fragment_path.unlink()
+            if not any(nb_fragment_dir_path.iterdir()):
+                nb_fragment_dir_path.rmdir()
+
         # Aggregate all page components and write output
         # ------------------------------------------------------------------------------
         page_components["body"] = combined_html
@@ -548,4 +1038,64 @@ def generate_page_html(
         with open(abs_out_html_path, "w") as out:
             out.write(file_contents)
 
+        if page_dependencies_path is None:
+            return None, None, False
+        page_record = {
+            "inputs": page_input_hashes,
+            "output": _hash_file_if_exists(abs_out_html_path),
+        }
+        if page_img_hashes:
+            page_record["images"] = page_img_hashes
+        if page_fragment_hashes:
+            page_record["fragments"] = page_fragment_hashes
+        return page_key, page_record, False
+
+    def _generate_profiled_page(page_idx, page):
+        """Generate a single page with `_generate_page`, timed as a profiling event."""
+        with profile_phase(page["relative_input_md_path"], "page") as event_args:
+            page_result = _generate_page(page_idx, page)
+            event_args["skipped"] = page_result[2]
+        return page_result
+
+    # Main loop
+    # ----------------------------------------------------------------------------------
+    # Once the indices, templates, and sidebar are ready, every page is independent of
+    # the others, so pages are generated concurrently by `n_jobs` threads. Threads are
+    # enough here since nearly all of the time is spent waiting on Pandoc, and every
+    # thread converting at the same time uses its own Pandoc worker process (see
+    # `scripts/pandoc_conversion.py`). Results are gathered in `flat_index` order.
+    if n_jobs == 1:
+        page_results = [
+            _generate_profiled_page(page_idx, page)
+            for page_idx, page in enumerate(flat_index)
+        ]
+    else:
+        print(f"Building: Generating pages using {n_jobs} threads.")
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            page_results = list(
+                executor.map(
+                    _generate_profiled_page,
+                    range(len(flat_index)),
+                    flat_index,
+                )
+            )
+
+    updated_page_dependencies = {}
+    n_skipped_pages = 0
+    for page_key, page_record, page_skipped in page_results:
+        if page_key is not None:
+            updated_page_dependencies[page_key] = page_record
+        n_skipped_pages += page_skipped
+
+    if image_manifest_path is not None:
+        save_image_manifest(image_manifest, image_manifest_path)
+
+    if page_dependencies_path is not None:
+        # Only pages that still exist are kept
+        _save_page_dependencies(updated_page_dependencies, page_dependencies_path)
+        print(
+            f"Building: Regenerated {len(flat_index) - n_skipped_pages} of "
+            f"{len(flat_index)} pages ({n_skipped_pages} were unchanged)."
+        )
+
     print("Building: Finished building of website HTML pages.")
@@ -0,0 +1,346 @@
+from copy import deepcopy
+import functools
+import json
+import os
+import threading
+import zlib
+
+# Bump this whenever the layout of index files changes, which invalidates all existing
+# index files (they are then rebuilt from their JSON output files)
+NB_OUTPUT_INDEX_FORMAT_VERSION = 2
+
+# The first line of every index file, see `write_nb_output_index`
+NB_OUTPUT_INDEX_MAGIC = f"textbook-nb-output-index {NB_OUTPUT_INDEX_FORMAT_VERSION}\n"
+
+# Index files are saved next to their notebook's JSON output file, e.g.
+# 'plot_simulate_gamma.nbidx' next to 'plot_simulate_gamma.json'
+NB_OUTPUT_INDEX_SUFFIX = ".nbidx"
+
+# zlib level for the HTML of each section. The HTML of notebooks (which mostly consists
+# of syntax-highlighted code and links to images) compresses to about a fifth of its
+# size, and level 6 is both fast to compress and as fast to decompress as any other.
+NB_OUTPUT_INDEX_COMPRESSION_LEVEL = 6
+
+# Maximum number of notebooks whose index is kept in memory, see
+# `_load_nb_output_index`
+NB_OUTPUT_INDEX_CACHE_SIZE = 32
+
+# Per-index locks, since pages are generated concurrently (see the `n_jobs` argument of
+# `generate_page_html`) and several pages can embed the same notebook
+# --------------------------------------------------------------------------------------
+# - "paths": Mapping of each index file path to its lock
+# - "lock": Protects "paths"
+_index_locks = {
+    "paths": {},
+    "lock": threading.Lock(),
+}
+
+
+def _get_index_lock(index_path):
+    """Get the lock that must be held while building a single index file."""
+    with _index_locks["lock"]:
+        return _index_locks["paths"].setdefault(index_path, threading.Lock())
+
+
+def get_nb_output_index_path(json_path):
+    """Get the path of the index file of a notebook's JSON output file."""
+    return json_path.with_suffix(NB_OUTPUT_INDEX_SUFFIX)
+
+
+def write_nb_output_index(json_path, nb_json_content):
+    """
+    Save the index file of a notebook's JSON output file.
+
+    The JSON output file of a notebook (see `_write_nb_json_output` in
+    `scripts/execute_and_convert_nbs.py`) is a single JSON document, with a few
+    top-level execution metadata keys (e.g. "last_hnn_version_used") and the HTML of
+    every section of the notebook under the key of the notebook's filename. Reading
+    anything from it requires parsing all of it, which for the larger notebooks is
+    hundreds of KB of HTML. Its index file instead contains:
+
+    1. A header line, `NB_OUTPUT_INDEX_MAGIC`
+    2. A line with the length (in bytes) of the JSON header that follows
+    3. The JSON header, which contains:
+        - "source": The modification time (in ns) and size of the JSON output file that
+            the index was built from, so that stale indices are detected and rebuilt
+        - "metadata": Every top-level key of the JSON output except the notebook's
+            sections
+        - "sections": For every section (in order), its "title", its remaining keys
+            under "content" (e.g. "level"), the "offset" (relative to the end of the
+            header) and "length" of its compressed HTML if it has any, and its place in
+            the hierarchy of sections (see `_index_nb_sections`)
+    4. The zlib-compressed HTML of every section
+
+    So, metadata checks only read the first few hundred bytes of a notebook's output,
+    and pages only decompress the sections they embed. The JSON output file remains
+    the source of truth (and is what is committed), while index files are derived from
+    it, and can be safely deleted at any time.
+
+    Arguments
+    ---------
+    json_path : pathlib.Path
+        Path of the notebook's JSON output file, which must already be written
+    nb_json_content : dict
+        The contents of the JSON output file
+
+    Returns
+    -------
+    dict
+        The JSON header of the index file, plus the "body_offset" (in bytes) at which
+        the compressed HTML starts
+    """
+    nb_name = f"{json_path.stem}.ipynb"
+    json_stat = json_path.stat()
+
+    sections = []
+    compressed_html = []
+    offset = 0
+    for title, content in nb_json_content.get(nb_name, {}).items():
+        section = {"title": title, "offset": None, "length": None}
+        if isinstance(content, dict) and "html" in content:
+            section_html = zlib.compress(
+                content["html"].encode("utf-8"),
+                NB_OUTPUT_INDEX_COMPRESSION_LEVEL,
+            )
+            section["content"] = {
+                key: val for key, val in content.items() if key != "html"
+            }
+            section["offset"] = offset
+            section["length"] = len(section_html)
+            compressed_html.append(section_html)
+            offset += len(section_html)
+        else:
+            section["content"] = content
+        sections.append(section)
+    _index_nb_sections(sections)
+
+    header = {
+        "source": {
+            "mtime_ns": json_stat.st_mtime_ns,
+            "size": json_stat.st_size,
+        },
+        "metadata": {
+            key: val for key, val in nb_json_content.items() if key != nb_name
+        },
+        "sections": sections,
+    }
+    encoded_header = json.dumps(header).encode("utf-8")
+    encoded_preamble = (
+        NB_OUTPUT_INDEX_MAGIC + f"{len(encoded_header)}\n"
+    ).encode("utf-8")
+
+    index_path = get_nb_output_index_path(json_path)
+    tmp_index_path = index_path.with_name(
+        f".{index_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    with open(tmp_index_path, "wb") as f:
+        f.write(encoded_preamble)
+        f.write(encoded_header)
+        for section_html in compressed_html:
+            f.write(section_html)
+    os.replace(tmp_index_path, index_path)
+
+    header["body_offset"] = len(encoded_preamble) + len(encoded_header)
+    return header
+
+
+def _index_nb_sections(sections):
+    """
+    Record where every section of a notebook is in the hierarchy of its sections.
+
+    Sections are nested by their "level", in the same way as `_structure_json` in
+    `scripts/execute_and_convert_nbs.py`. Every section (as in the "sections" of the
+    index header, see `write_nb_output_index`) is given:
+    - "end": The position (exclusive) of the end of the section, which includes all of
+        its sub-sections. This is the position of the next section with the same or a
+        higher level, or the number of sections if there is none.
+    - "parent": The title of the section it is directly nested under, or None if it is
+        a top-level section
+
+    Sections without a level are treated as top-level sections with no sub-sections.
+    """
+    parent_stack = []
+    for position, section in enumerate(sections):
+        section["end"] = position + 1
+        section["parent"] = None
+        content = section["content"]
+        level = content.get("level") if isinstance(content, dict) else None
+        if level is None:
+            continue
+        while parent_stack and sections[parent_stack[-1]]["content"]["level"] >= level:
+            sections[parent_stack.pop()]["end"] = position
+        if parent_stack:
+            section["parent"] = sections[parent_stack[-1]]["title"]
+        parent_stack.append(position)
+    for position in parent_stack:
+        sections[position]["end"] = len(sections)
+
+
+def _read_nb_output_index_header(json_path):
+    """
+    Read the JSON header of the index file of a notebook's JSON output file.
+
+    If the index file is missing, or does not match the JSON output file (e.g. because
+    the JSON output was edited or checked out again by git), it is rebuilt first.
+    Returns None if the JSON output file does not exist.
+    """
+    try:
+        json_stat = json_path.stat()
+    except FileNotFoundError:
+        return None
+    source = {"mtime_ns": json_stat.st_mtime_ns, "size": json_stat.st_size}
+
+    index_path = get_nb_output_index_path(json_path)
+    header = _read_index_header_if_current(index_path, source)
+    if header is not None:
+        return header
+
+    with _get_index_lock(index_path):
+        # Another thread may have rebuilt the index while this one was waiting
+        header = _read_index_header_if_current(index_path, source)
+        if header is None:
+            with open(json_path, "r") as f:
+                nb_json_content = json.load(f)
+            header = write_nb_output_index(json_path, nb_json_content)
+    return header
+
+
+def _read_index_header_if_current(index_path, source):
+    """
+    Read an index file's JSON header (plus its "body_offset", see
+    `write_nb_output_index`), or None if it is missing or stale.
+    """
+    try:
+        with open(index_path, "rb") as f:
+            if f.readline().decode("utf-8") != NB_OUTPUT_INDEX_MAGIC:
+                return None
+            header_length = int(f.readline())
+            header = json.loads(f.read(header_length))
+            header["body_offset"] = f.tell()
+    except (FileNotFoundError, ValueError):
+        return None
+    if header["source"] != source:
+        return None
+    return header
+
+
+def read_nb_output_metadata(json_path):
+    """
+    Read the top-level metadata of a notebook's JSON output file, without its sections.
+
+    Arguments
+    ---------
+    json_path : pathlib.Path
+        Path of the notebook's JSON output file
+
+    Returns
+    -------
+    dict or None
+        Every top-level key of the JSON output (e.g. "last_execution_successful"),
+        except the HTML of the notebook itself. None if the JSON output file does not
+        exist.
+    """
+    header = _read_nb_output_index_header(json_path)
+    if header is None:
+        return None
+    return header["metadata"]
+
+
+@functools.lru_cache(maxsize=NB_OUTPUT_INDEX_CACHE_SIZE)
+def _load_nb_output_index(json_path, source_mtime_ns, source_size):
+    """
+    Load the index of a notebook's JSON output into memory.
+
+    This is cached for as long as the JSON output file keeps the same modification time
+    and size (which are only used as part of the cache key), so that a notebook embedded
+    in several pages (or in several sections of one page) is only read once per build.
+    If the JSON output file changes (e.g. while serving, see `scripts/serve.py`), it is
+    read again.
+
+    Returns
+    -------
+    dict or None
+        None if the JSON output file does not exist, otherwise a dict with:
+        - "sections": The sections of the index header, in order
+        - "positions": Mapping of each section title to its position in "sections"
+        - "body": The compressed HTML of every section, see `write_nb_output_index`
+        - "html": Mapping of section titles to their decompressed HTML, which is filled
+            in as sections are read
+    """
+    header = _read_nb_output_index_header(json_path)
+    if header is None:
+        return None
+    with open(get_nb_output_index_path(json_path), "rb") as f:
+        f.seek(header["body_offset"])
+        body = f.read()
+    return {
+        "sections": header["sections"],
+        "positions": {
+            section["title"]: position
+            for position, section in enumerate(header["sections"])
+        },
+        "body": body,
+        "html": {},
+    }
+
+
+def read_nb_output_sections(json_path, section_header=None):
+    """
+    Read the sections of a notebook's JSON output file.
+
+    Only the HTML of the requested sections is decompressed, and the index of each
+    notebook is kept in memory between calls (see `_load_nb_output_index`).
+
+    Arguments
+    ---------
+    json_path : pathlib.Path
+        Path of the notebook's JSON output file
+    section_header : str, optional
+        If given, only this section and the sections after it that are nested under it
+        (i.e. up to the next section of the same or a higher level) are read, which is
+        a single slice of the index (see the "end" of each section in
+        `_index_nb_sections`). Default is None, which reads every section.
+
+    Returns
+    -------
+    dict or None
+        Mapping of section titles to their content, exactly as under the notebook's
+        filename in the JSON output (e.g. `{"Title": {"level": 1, "html": "..."}}`).
+        None if the JSON output file does not exist.
+    """
+    try:
+        json_stat = json_path.stat()
+    except FileNotFoundError:
+        return None
+    nb_output_index = _load_nb_output_index(
+        json_path,
+        json_stat.st_mtime_ns,
+        json_stat.st_size,
+    )
+    if nb_output_index is None:
+        return None
+
+    sections = nb_output_index["sections"]
+    if section_header is None:
+        selected_sections = sections
+    else:
+        if section_header not in nb_output_index["positions"]:
+            raise KeyError(f"Section not found: {section_header}")
+        start_idx = nb_output_index["positions"][section_header]
+        selected_sections = sections[start_idx : sections[start_idx]["end"]]
+
+    nb_outputs = {}
+    for section in selected_sections:
+        title = section["title"]
+        if section["offset"] is None:
+            nb_outputs[title] = deepcopy(section["content"])
+            continue
+        section_html = nb_output_index["html"].get(title)
+        if section_html is None:
+            compressed_html = nb_output_index["body"][
+                section["offset"] : section["offset"] + section["length"]
+            ]
+            section_html = zlib.decompress(compressed_html).decode("utf-8")
+            nb_output_index["html"][title] = section_html
+        nb_outputs[title] = {**section["content"], "html": section_html}
+    return nb_outputs
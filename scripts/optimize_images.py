@@ -0,0 +1,579 @@
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import posixpath
+import re
+import threading
+
+# Bump this whenever the way images are optimized changes, which invalidates all
+# existing entries of the image manifest (see `load_image_manifest`)
+IMAGE_OPTIMIZATION_FORMAT_VERSION = 4
+
+# Widths (in pixels) of the downscaled variants saved for every image that is wider than
+# them, see `_make_image_variants`
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+
+# Name of the subdirectory (next to each image) that every file derived from the image
+# goes in, i.e. its recompressed version, WebP version, and downscaled variants. Source
+# images (including notebook output figures, whose names are the hashes of their
+# contents) are never modified, unless they are optimized in place (see
+# `optimize_html_images`).
+IMAGE_OPTIMIZED_DIR_NAME = "optimized"
+
+# Widest that images are displayed in a page, which is the 'max-width' of
+# '#content-wrapper' in 'content/assets/styles.css' minus its padding, and that of
+# '#content'. Below this width, images span (at most) the entire viewport.
+CONTENT_IMAGE_WIDTH = 820
+
+# Matches every '<img>' tag in a page, and the value of its 'src' attribute
+IMG_TAG_PATTERN = re.compile(r"<img\b[^>]*>")
+IMG_SRC_PATTERN = re.compile(r"""\ssrc=(["'])(.*?)\1""")
+IMG_SIZE_PATTERN = re.compile(r"""\s(?:width|height)=""")
+IMG_SRCSET_PATTERN = re.compile(r"""\ssrcset=""")
+IMG_LOADING_PATTERN = re.compile(r"""\sloading=""")
+IMG_DECODING_PATTERN = re.compile(r"""\sdecoding=""")
+
+# Per-image locks, since pages are generated concurrently (see the `n_jobs` argument of
+# `generate_page_html`) and several pages can embed the same image
+# --------------------------------------------------------------------------------------
+# - "paths": Mapping of each image path to its lock
+# - "lock": Protects "paths"
+_image_locks = {
+    "paths": {},
+    "lock": threading.Lock(),
+}
+
+
+def is_image_optimization_available():
+    """
+    Whether the optional dependencies for optimizing images are installed.
+
+    Pillow is an optional dependency, which is only needed for '--optimize-images'. It
+    is only looked up here, and only imported once an image is actually optimized (see
+    `_optimize_image`), so that importing this module stays fast.
+    """
+    return importlib.util.find_spec("PIL") is not None
+
+
+def _get_image_lock(img_path):
+    """Get the lock that must be held while optimizing a single image file."""
+    with _image_locks["lock"]:
+        return _image_locks["paths"].setdefault(img_path, threading.Lock())
+
+
+def load_image_manifest(image_manifest_path):
+    """
+    Load the dimensions and optimization results of every image seen by past builds.
+
+    The manifest maps the SHA256 hash of each source image file (as it is on disk, i.e.
+    after it is replaced by its recompressed version if images are optimized in place)
+    to a dict with the following keys:
+    - "optimizable": Whether Pillow could read the image at all. If not (e.g. for SVG
+        files), this is the only key, and the image's '<img>' tags are left as they are.
+    - "width": The width of the image in pixels
+    - "height": The height of the image in pixels
+    - "recompressed": Whether a smaller, losslessly recompressed version of the image
+        was saved (see `_recompress_png`), which pages then use instead
+    - "webp": Whether an animated WebP version of the image was saved (see
+        `_convert_gif_to_webp`)
+    - "variants": The widths of the downscaled variants of the image that were saved
+        (see `_make_image_variants`)
+    - "output_hashes": The SHA256 hash of every file saved for the image, by kind:
+        "recompressed", "webp", or "<width>w" for each variant (see
+        `_get_optimized_file_paths`)
+
+    Since images are looked up by their contents, an image is only ever optimized once,
+    and optimized again if it is replaced. Returns an empty manifest if there is none
+    (or if it was written by a different `IMAGE_OPTIMIZATION_FORMAT_VERSION`).
+    """
+    try:
+        with open(image_manifest_path, "r", encoding="utf-8") as f:
+            image_manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        image_manifest = {}
+    if image_manifest.get("format_version") != IMAGE_OPTIMIZATION_FORMAT_VERSION:
+        image_manifest = {
+            "format_version": IMAGE_OPTIMIZATION_FORMAT_VERSION,
+            "images": {},
+        }
+    return image_manifest
+
+
+def save_image_manifest(image_manifest, image_manifest_path):
+    """Save the image manifest, see `load_image_manifest`."""
+    image_manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(image_manifest_path, "w", encoding="utf-8") as f:
+        json.dump(image_manifest, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def _hash_file(file_path):
+    """Get the SHA256 hash of a file's contents."""
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _write_bytes_atomically(file_path, contents):
+    """Write a file such that it is never seen partially-written."""
+    tmp_file_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+    with open(tmp_file_path, "wb") as f:
+        f.write(contents)
+    os.replace(tmp_file_path, file_path)
+
+
+def _drop_opaque_alpha(img):
+    """
+    Drop the alpha channel of an image whose every pixel is fully opaque.
+
+    Matplotlib saves every figure with an alpha channel, even though nearly all of them
+    are entirely opaque, which makes their PNG files larger for nothing. Images with
+    any transparency are returned as they are.
+    """
+    if img.mode == "RGBA" and img.getextrema()[3][0] == 255:
+        return img.convert("RGB")
+    return img
+
+
+def _recompress_png(img):
+    """
+    Losslessly re-encode a PNG image with the highest level of compression.
+
+    Matplotlib (and most screenshot tools) save PNGs with fast, rather than small,
+    compression, and with an alpha channel even if they are entirely opaque (see
+    `_drop_opaque_alpha`). The pixels, transparency, and color profile are all kept
+    exactly as they are; only text metadata (such as the software used) is dropped.
+    """
+    png_buffer = io.BytesIO()
+    _drop_opaque_alpha(img).save(png_buffer, format="PNG", optimize=True)
+    return png_buffer.getvalue()
+
+
+def _convert_gif_to_webp(img):
+    """
+    Convert an animated GIF to a lossless animated WebP.
+
+    The animated GIFs in the textbook are screen recordings of the GUI, which lossless
+    WebP compresses much better than GIF does (and, unlike lossy WebP, without any
+    artifacts in the text of the GUI). Every frame and its duration are kept.
+    """
+    webp_buffer = io.BytesIO()
+    img.save(
+        webp_buffer,
+        format="WEBP",
+        save_all=True,
+        lossless=True,
+        method=4,
+    )
+    return webp_buffer.getvalue()
+
+
+def get_optimized_image_path(img_path):
+    """
+    Get the path of the recompressed version of an image, e.g.
+    'images/optimized/erp_fig_01.png' for 'images/erp_fig_01.png'.
+    """
+    return img_path.parent / IMAGE_OPTIMIZED_DIR_NAME / img_path.name
+
+
+def get_image_webp_path(img_path):
+    """
+    Get the path of the WebP version of an image, e.g.
+    'images/optimized/erp_gui_demo.webp' for 'images/erp_gui_demo.gif'.
+    """
+    return img_path.parent / IMAGE_OPTIMIZED_DIR_NAME / f"{img_path.stem}.webp"
+
+
+def get_image_variant_path(img_path, variant_width):
+    """
+    Get the path of a downscaled variant of an image, e.g.
+    'images/optimized/erp_fig_01_480w.png' for 'images/erp_fig_01.png'.
+    """
+    return (
+        img_path.parent
+        / IMAGE_OPTIMIZED_DIR_NAME
+        / f"{img_path.stem}_{variant_width}w{img_path.suffix}"
+    )
+
+
+def _get_optimized_image_src(img_src, optimized_path):
+    """Get the 'src' of a file saved for an image, relative to the same page."""
+    return posixpath.join(
+        posixpath.dirname(img_src),
+        IMAGE_OPTIMIZED_DIR_NAME,
+        optimized_path.name,
+    )
+
+
+def _make_image_variants(img):
+    """
+    Make downscaled variants of a (non-animated) PNG or JPEG image.
+
+    A variant is made for every width in `IMAGE_VARIANT_WIDTHS` that is narrower than
+    the image itself, in the same format as the image. These are offered to browsers
+    through the 'srcset' attribute, so that e.g. phones do not need to download figures
+    sized for desktop screens.
+
+    Arguments
+    ---------
+    img : PIL.Image.Image
+        The opened image
+
+    Returns
+    -------
+    dict
+        Mapping of the width of every variant to its contents
+    """
+    variant_widths = [width for width in IMAGE_VARIANT_WIDTHS if width < img.width]
+    if not variant_widths:
+        return {}
+    from PIL import Image
+
+    img_format = img.format
+    if img.mode in ("1", "P"):
+        # Pillow can only resize these modes with nearest-neighbor sampling
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    img = _drop_opaque_alpha(img)
+    variants = {}
+    for variant_width in variant_widths:
+        variant_height = max(1, round(img.height * variant_width / img.width))
+        variant_img = img.resize(
+            (variant_width, variant_height),
+            Image.Resampling.LANCZOS,
+        )
+        variant_buffer = io.BytesIO()
+        if img_format == "PNG":
+            variant_img.save(variant_buffer, format="PNG", optimize=True)
+        else:
+            variant_img.save(
+                variant_buffer,
+                format="JPEG",
+                quality=85,
+                optimize=True,
+                progressive=True,
+            )
+        variants[variant_width] = variant_buffer.getvalue()
+    return variants
+
+
+def _optimize_image(img_path, img_bytes, in_place=False):
+    """
+    Optimize a single image file, which is not in the image manifest yet.
+
+    PNG files get a losslessly recompressed version, and animated GIF files an animated
+    WebP version, either of which is only kept if it is actually smaller than the
+    original. PNG and JPEG files also get downscaled variants (see
+    `_make_image_variants`), each of which is only kept if it is smaller than the
+    displayed image by at least the same factor as its width, since otherwise (e.g. for
+    flat, few-colored figures, which resampling adds many colors to) it saves readers
+    little, and only adds to the size of the website. All of these are saved in the
+    image's `IMAGE_OPTIMIZED_DIR_NAME` directory, and the image file itself is never
+    modified, unless `in_place` is True.
+
+    Arguments
+    ---------
+    img_path : pathlib.Path
+        Path to the image file
+    img_bytes : bytes
+        The current contents of the image file
+    in_place : bool, optional
+        Whether to overwrite a PNG file with its recompressed version, instead of
+        saving the latter next to it. Default is False.
+
+    Returns
+    -------
+    dict
+        The image's entry for the image manifest, see `load_image_manifest`
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        img = Image.open(io.BytesIO(img_bytes))
+        img.load()
+    except (UnidentifiedImageError, OSError):
+        # e.g. SVG files, which Pillow cannot read
+        print(f"Building: Could not read image '{img_path.name}', leaving it as is.")
+        return {"optimizable": False}
+
+    output_files = {}
+    with img:
+        img_info = {
+            "optimizable": True,
+            "width": img.width,
+            "height": img.height,
+            "recompressed": False,
+            "webp": False,
+            "variants": [],
+        }
+        displayed_size = len(img_bytes)
+        if img.format == "PNG":
+            optimized_bytes = _recompress_png(img)
+            if len(optimized_bytes) < len(img_bytes):
+                print(
+                    f"Building: Recompressed '{img_path.name}' from "
+                    f"{len(img_bytes) // 1024} KB to {len(optimized_bytes) // 1024} KB."
+                )
+                displayed_size = len(optimized_bytes)
+                if in_place:
+                    _write_bytes_atomically(img_path, optimized_bytes)
+                else:
+                    output_files["recompressed"] = optimized_bytes
+                    img_info["recompressed"] = True
+        elif img.format == "GIF" and getattr(img, "is_animated", False):
+            webp_bytes = _convert_gif_to_webp(img)
+            if len(webp_bytes) < len(img_bytes):
+                output_files["webp"] = webp_bytes
+                print(
+                    f"Building: Converted '{img_path.name}' from "
+                    f"{len(img_bytes) // 1024} KB of GIF to "
+                    f"{len(webp_bytes) // 1024} KB of WebP."
+                )
+                img_info["webp"] = True
+        if img.format in ("PNG", "JPEG"):
+            for variant_width, variant_bytes in _make_image_variants(img).items():
+                if len(variant_bytes) > displayed_size * variant_width / img.width:
+                    continue
+                output_files[f"{variant_width}w"] = variant_bytes
+                img_info["variants"].append(variant_width)
+
+    img_info["output_hashes"] = {
+        output_kind: hashlib.sha256(output_bytes).hexdigest()
+        for output_kind, output_bytes in output_files.items()
+    }
+    output_paths = _get_optimized_file_paths(img_path, img_info)
+    if output_files:
+        (img_path.parent / IMAGE_OPTIMIZED_DIR_NAME).mkdir(exist_ok=True)
+    for output_kind, output_bytes in output_files.items():
+        _write_bytes_atomically(output_paths[output_kind], output_bytes)
+    return img_info
+
+
+def _get_optimized_file_paths(img_path, img_info):
+    """
+    Get the path of every file saved for an image (see `_optimize_image`), by the kinds
+    in the "output_hashes" of its manifest entry.
+
+    Paths are derived from `img_path` rather than stored in the manifest, since the same
+    image can be in several places (under different names).
+    """
+    output_paths = {}
+    for output_kind in img_info.get("output_hashes", {}):
+        if output_kind == "recompressed":
+            output_paths[output_kind] = get_optimized_image_path(img_path)
+        elif output_kind == "webp":
+            output_paths[output_kind] = get_image_webp_path(img_path)
+        else:
+            output_paths[output_kind] = get_image_variant_path(
+                img_path,
+                int(output_kind.removesuffix("w")),
+            )
+    return output_paths
+
+
+def _are_optimized_files_current(img_path, img_info):
+    """
+    Check that every file saved for an image (see `_optimize_image`) exists, and is
+    exactly as it was saved.
+    """
+    for output_kind, output_path in _get_optimized_file_paths(
+        img_path,
+        img_info,
+    ).items():
+        try:
+            if _hash_file(output_path) != img_info["output_hashes"][output_kind]:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def _get_optimized_image_info(img_path, image_manifest, in_place=False):
+    """
+    Optimize an image file if it has not been already, and get its manifest entry.
+
+    Returns the SHA256 hash of the image file as it is on disk (which is what the
+    manifest is keyed by), and its entry in `image_manifest`, which is updated if
+    necessary. If `in_place` is True, the image file may be replaced by its recompressed
+    version (see `_optimize_image`), in which case the hash of the latter is returned.
+    """
+    with _get_image_lock(img_path):
+        img_bytes = img_path.read_bytes()
+        img_hash = hashlib.sha256(img_bytes).hexdigest()
+        img_info = image_manifest["images"].get(img_hash)
+        if (
+            img_info is None
+            or not _are_optimized_files_current(img_path, img_info)
+            or (in_place and img_info.get("recompressed"))
+        ):
+            img_info = _optimize_image(img_path, img_bytes, in_place=in_place)
+            if in_place:
+                img_hash = _hash_file(img_path)
+            image_manifest["images"][img_hash] = img_info
+    return img_hash, img_info
+
+
+def add_lazy_loading_attributes(html_content):
+    """
+    Add 'loading="lazy"' and 'decoding="async"' attributes to every '<img>' tag.
+
+    Images far down the page are then only downloaded once the reader scrolls near them,
+    and decoding them does not hold up the rest of the page. Unlike the rest of this
+    module, this does not need Pillow, so it is done for every page, whether or not its
+    images are optimized (see `optimize_html_images`). Attributes that an '<img>' tag
+    already has are left as they are.
+    """
+
+    def _add_attributes(img_tag_match):
+        img_tag = img_tag_match.group(0)
+        added_attributes = []
+        if not IMG_LOADING_PATTERN.search(img_tag):
+            added_attributes.append('loading="lazy"')
+        if not IMG_DECODING_PATTERN.search(img_tag):
+            added_attributes.append('decoding="async"')
+        if not added_attributes:
+            return img_tag
+        return img_tag.replace("<img", "<img " + " ".join(added_attributes), 1)
+
+    return IMG_TAG_PATTERN.sub(_add_attributes, html_content)
+
+
+def optimize_html_images(
+    html_content,
+    html_dir_path,
+    image_manifest,
+    in_place=False,
+):
+    """
+    Optimize every local image embedded in a page, and update its '<img>' tags.
+
+    This covers both notebook output figures and images in the 'images/' directories
+    of 'content'. Remote images (e.g. 'https://...'), embedded Base64 images, and images
+    that Pillow cannot read (e.g. SVG files) are left as they are. Unless `in_place` is
+    True, image files themselves are never modified, instead every file derived from an
+    image is saved in the `IMAGE_OPTIMIZED_DIR_NAME` directory next to it. For every
+    local image:
+    - PNG files are losslessly recompressed, and the '<img>' tag points to the
+      recompressed version if it is smaller. If `in_place` is True, the recompressed
+      version replaces the PNG file instead, so that the website does not contain both.
+    - Animated GIF files get a (usually much smaller) animated WebP version, and their
+      '<img>' tag is wrapped in a '<picture>' element that offers the WebP version to
+      browsers that support it, with the GIF as the fallback.
+    - 'width' and 'height' attributes are added to the '<img>' tag (unless it already
+      has either of them), so that browsers can reserve the space for the image before
+      it has loaded, instead of shifting the page around once it has.
+    - PNG and JPEG files get downscaled variants (see `_make_image_variants`), which are
+      listed in 'srcset' and 'sizes' attributes, so that browsers only download as many
+      pixels as they will actually display.
+
+    Images are lazy-loaded whether or not they are optimized, see
+    `add_lazy_loading_attributes`.
+
+    Every image is only optimized once, and is looked up in `image_manifest` on later
+    builds. Requires Pillow, see `is_image_optimization_available`.
+
+    Arguments
+    ---------
+    html_content : str
+        The HTML of the page
+    html_dir_path : pathlib.Path
+        The directory of the page's output HTML file, which 'src' paths are relative to
+    image_manifest : dict
+        The image manifest from `load_image_manifest`, which is updated with any newly
+        optimized images. Since pages are generated concurrently, this may be shared
+        between threads.
+    in_place : bool, optional
+        Whether to overwrite PNG files with their recompressed versions. This is meant
+        for deploying the website, where only the smallest version of every image
+        should be published, and must never be used in a checkout that is committed
+        from, since it modifies the (tracked) image files. Default is False.
+
+    Returns
+    -------
+    str
+        The HTML of the page with its '<img>' tags updated
+    dict
+        Mapping of the path of every local image (and every file saved for it) in the
+        page to its SHA256 hash, for tracking whether the page needs to be regenerated
+    """
+    page_img_hashes = {}
+
+    def _replace_img_tag(img_tag_match):
+        img_tag = img_tag_match.group(0)
+        src_match = IMG_SRC_PATTERN.search(img_tag)
+        if src_match is None:
+            return img_tag
+        img_src = src_match.group(2)
+        if (not img_src) or re.match(r"^([a-zA-Z][a-zA-Z0-9+.-]*:|/|#)", img_src):
+            # Remote, Base64, or root-relative images
+            return img_tag
+
+        img_path = (html_dir_path / img_src).resolve()
+        if not img_path.is_file():
+            return img_tag
+        img_hash, img_info = _get_optimized_image_info(
+            img_path,
+            image_manifest,
+            in_place=in_place,
+        )
+        page_img_hashes[str(img_path)] = img_hash
+        if not img_info["optimizable"]:
+            return img_tag
+        for output_kind, output_path in _get_optimized_file_paths(
+            img_path,
+            img_info,
+        ).items():
+            page_img_hashes[str(output_path)] = img_info["output_hashes"][output_kind]
+
+        displayed_src = img_src
+        if img_info["recompressed"]:
+            displayed_src = _get_optimized_image_src(
+                img_src,
+                get_optimized_image_path(img_path),
+            )
+            img_tag = (
+                img_tag[: src_match.start(2)]
+                + displayed_src
+                + img_tag[src_match.end(2) :]
+            )
+
+        added_attributes = []
+        if not IMG_SIZE_PATTERN.search(img_tag):
+            added_attributes += [
+                f'width="{img_info["width"]}"',
+                f'height="{img_info["height"]}"',
+            ]
+            # The variants only help if the displayed size of the image is set (i.e.
+            # by its 'width' attribute), otherwise the browser would display the image
+            # at the width given in 'sizes', even if it is wider than the image.
+            if img_info["variants"] and not IMG_SRCSET_PATTERN.search(img_tag):
+                srcset_entries = []
+                for variant_width in img_info["variants"]:
+                    variant_src = _get_optimized_image_src(
+                        img_src,
+                        get_image_variant_path(img_path, variant_width),
+                    )
+                    srcset_entries.append(f"{variant_src} {variant_width}w")
+                srcset_entries.append(f"{displayed_src} {img_info['width']}w")
+                displayed_width = min(img_info["width"], CONTENT_IMAGE_WIDTH)
+                added_attributes += [
+                    f'srcset="{", ".join(srcset_entries)}"',
+                    f'sizes="(max-width: {displayed_width}px) 100vw, '
+                    f'{displayed_width}px"',
+                ]
+        if added_attributes:
+            img_tag = img_tag.replace(
+                "<img",
+                "<img " + " ".join(added_attributes),
+                1,
+            )
+        if img_info["webp"]:
+            webp_src = _get_optimized_image_src(img_src, get_image_webp_path(img_path))
+            img_tag = (
+                f'<picture><source srcset="{webp_src}" type="image/webp">'
+                f"{img_tag}</picture>"
+            )
+        return img_tag
+
+    html_content = IMG_TAG_PATTERN.sub(_replace_img_tag, html_content)
+    return html_content, page_img_hashes
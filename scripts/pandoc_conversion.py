@@ -0,0 +1,438 @@
+import atexit
+import functools
+import hashlib
+import json
+import os
+from pathlib import Path
+import subprocess
+import threading
+
+import pypandoc
+
+from .profiling import profile_phase
+
+# The Lua script run by the long-lived Pandoc worker process
+PANDOC_WORKER_SCRIPT_PATH = Path(__file__).parent / "pandoc_worker.lua"
+
+# Bump this whenever the contents of cached conversions change for reasons that are not
+# captured by their cache keys (e.g. changes to `scripts/pandoc_worker.lua`), which
+# invalidates all existing cache entries.
+MD_CONVERSION_CACHE_FORMAT_VERSION = 1
+
+# Default maximum total size of the markdown conversion cache, see
+# `prune_md_conversion_cache`
+MD_CONVERSION_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# State of this process's Pandoc workers
+# --------------------------------------------------------------------------------------
+# Starting a new Pandoc process (and, for pages with citations, re-parsing the entire
+# bibliography) takes far longer than converting a typical page or notebook cell. So,
+# instead of calling Pandoc through PyPandoc for every piece of markdown, every build
+# process starts a `pandoc lua scripts/pandoc_worker.lua` process the first time it
+# needs one, and sends all of its conversions to it over stdin/stdout.
+#
+# A worker handles one conversion at a time, so if several threads convert at once
+# (see the `n_jobs` argument of `generate_page_html`), extra workers are started as
+# needed. Workers are kept for reuse once their conversion is done, so a build starts
+# at most as many workers as it has threads.
+#
+# - "idle": Started workers that are not currently converting anything
+# - "available": None if no worker has been started yet, otherwise whether workers
+#     can be used. If False, all conversions use PyPandoc instead.
+# - "lock": Protects the other keys
+_pandoc_workers = {
+    "idle": [],
+    "available": None,
+    "lock": threading.Lock(),
+}
+
+
+def _start_pandoc_worker():
+    """
+    Start the Pandoc worker process, returning None if that is not possible.
+
+    The worker writes a single line to stdout once it has started, which is used to
+    check that the installed Pandoc supports everything the worker needs (such as
+    `pandoc lua`, which requires Pandoc 3.1.1 or newer).
+    """
+    try:
+        process = subprocess.Popen(
+            [
+                pypandoc.get_pandoc_path(),
+                "lua",
+                str(PANDOC_WORKER_SCRIPT_PATH),
+                pypandoc.get_pandoc_path(),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding="utf-8",
+        )
+    except OSError:
+        return None
+
+    ready_line = process.stdout.readline()
+    try:
+        ready = json.loads(ready_line).get("ready", False)
+    except json.JSONDecodeError:
+        ready = False
+    if not ready:
+        process.kill()
+        process.wait()
+        return None
+
+    return process
+
+
+def stop_pandoc_workers():
+    """
+    Stop all of this process's Pandoc workers that are not currently converting.
+
+    This is registered to run when the process exits, but can be called earlier. New
+    workers are started automatically the next time a conversion is requested.
+    """
+    with _pandoc_workers["lock"]:
+        idle_workers = _pandoc_workers["idle"]
+        _pandoc_workers["idle"] = []
+        _pandoc_workers["available"] = None
+    for process in idle_workers:
+        process.stdin.close()
+        process.wait()
+
+
+atexit.register(stop_pandoc_workers)
+
+
+def _convert_with_pandoc_worker(request):
+    """
+    Send a conversion request to an idle Pandoc worker, starting one if necessary.
+
+    Returns
+    -------
+    str or None
+        The converted HTML, or None if workers are unavailable or could not convert
+        this request (in which case the caller should fall back to PyPandoc).
+    """
+    with _pandoc_workers["lock"]:
+        if _pandoc_workers["available"] is None:
+            # Check that workers can be started at all, only once per process
+            process = _start_pandoc_worker()
+            _pandoc_workers["available"] = process is not None
+            if process is None:
+                print(
+                    "Building: Could not start a long-lived Pandoc worker (this needs "
+                    "Pandoc 3.1.1 or newer), falling back to running Pandoc separately "
+                    "for every conversion."
+                )
+            else:
+                _pandoc_workers["idle"].append(process)
+        if not _pandoc_workers["available"]:
+            return None
+        process = _pandoc_workers["idle"].pop() if _pandoc_workers["idle"] else None
+
+    # Other threads can use the other workers while this one is busy
+    if process is None:
+        process = _start_pandoc_worker()
+        if process is None:
+            return None
+
+    try:
+        process.stdin.write(json.dumps(request) + "\n")
+        process.stdin.flush()
+        response_line = process.stdout.readline()
+    except (BrokenPipeError, OSError):
+        response_line = ""
+
+    if not response_line:
+        # The worker died, so don't send any more requests to workers
+        print(
+            "Building: A long-lived Pandoc worker stopped unexpectedly, falling back "
+            "to running Pandoc separately for every conversion."
+        )
+        process.kill()
+        process.wait()
+        with _pandoc_workers["lock"]:
+            _pandoc_workers["available"] = False
+        return None
+
+    with _pandoc_workers["lock"]:
+        _pandoc_workers["idle"].append(process)
+
+    # If the worker reports an error, converting with PyPandoc instead will raise the
+    # same error as before the worker was introduced
+    return json.loads(response_line).get("html")
+
+
+@functools.lru_cache(maxsize=None)
+def get_pandoc_version():
+    """
+    Get the version of Pandoc used for conversions.
+
+    This is part of the key of every cached conversion, and of the inputs of every page
+    (see `_hash_page_generator` in `scripts/generate_page_html.py`), since a different
+    version of Pandoc can convert the same markdown differently.
+    """
+    return pypandoc.get_pandoc_version()
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_bibliography(bibliography_path, mtime_ns, size):
+    """
+    Get the SHA256 hash of a bibliography file.
+
+    The modification time and size are only used to key the in-memory cache, so that
+    the file is only re-read (and re-hashed) if it has changed.
+    """
+    with open(bibliography_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def get_md_conversion_cache_key(markdown_text, wrap="auto", bibliography_path=None):
+    """
+    Get the key identifying a conversion in the markdown conversion cache.
+
+    The key is a SHA256 hash of everything that determines the converted HTML: the
+    markdown text, the Pandoc options, the Pandoc version, and (if citations are
+    processed) the contents of the bibliography. Arguments are the same as for
+    `convert_md_to_html`.
+
+    Returns
+    -------
+    str
+        The hexadecimal cache key
+    """
+    bibliography_hash = None
+    if bibliography_path is not None:
+        bibliography_stat = Path(bibliography_path).stat()
+        bibliography_hash = _hash_bibliography(
+            str(bibliography_path),
+            bibliography_stat.st_mtime_ns,
+            bibliography_stat.st_size,
+        )
+    key_contents = {
+        "cache_format_version": MD_CONVERSION_CACHE_FORMAT_VERSION,
+        "pandoc_version": get_pandoc_version(),
+        "from": "markdown-auto_identifiers",
+        "to": "html",
+        "html_math_method": "mathml",
+        "wrap": wrap,
+        "bibliography_hash": bibliography_hash,
+        "text": markdown_text,
+    }
+    return hashlib.sha256(
+        json.dumps(key_contents, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def _get_md_conversion_cache_path(cache_key, cache_dir):
+    """Get the file storing a cached conversion, spread over 256 subdirectories."""
+    return Path(cache_dir) / cache_key[:2] / f"{cache_key}.html"
+
+
+def read_cached_md_conversion(cache_key, cache_dir):
+    """
+    Read a previously-cached conversion from the markdown conversion cache.
+
+    Reading an entry also updates its modification time, which is what
+    `prune_md_conversion_cache` uses to evict the least-recently-used entries.
+
+    Arguments
+    ---------
+    cache_key : str
+        The key of the conversion, from `get_md_conversion_cache_key`
+    cache_dir : pathlib.Path
+        The markdown conversion cache directory, typically
+        '<textbook-root>/.build_cache/pandoc_cache/'
+
+    Returns
+    -------
+    str or None
+        The cached HTML, or None if this conversion is not cached
+    """
+    cache_path = _get_md_conversion_cache_path(cache_key, cache_dir)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            converted_html = f.read()
+        os.utime(cache_path)
+    except FileNotFoundError:
+        return None
+    return converted_html
+
+
+def write_cached_md_conversion(cache_key, converted_html, cache_dir):
+    """
+    Add a conversion to the markdown conversion cache.
+
+    The file is written under a temporary name and then renamed, so that other build
+    processes (see '--jobs') never read a partially-written entry.
+
+    Arguments
+    ---------
+    cache_key : str
+        The key of the conversion, from `get_md_conversion_cache_key`
+    converted_html : str
+        The converted HTML to cache
+    cache_dir : pathlib.Path
+        The markdown conversion cache directory, typically
+        '<textbook-root>/.build_cache/pandoc_cache/'
+    """
+    cache_path = _get_md_conversion_cache_path(cache_key, cache_dir)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(converted_html)
+    os.replace(temp_path, cache_path)
+
+
+def prune_md_conversion_cache(cache_dir, max_bytes=MD_CONVERSION_CACHE_MAX_BYTES):
+    """
+    Evict the least-recently-used entries of the markdown conversion cache.
+
+    Entries are deleted, oldest modification time first (see
+    `read_cached_md_conversion`), until the total size of the cache is at most
+    `max_bytes`. This is run once at the end of every build.
+
+    Arguments
+    ---------
+    cache_dir : pathlib.Path
+        The markdown conversion cache directory, typically
+        '<textbook-root>/.build_cache/pandoc_cache/'
+    max_bytes : int, optional
+        The maximum total size of all cached conversions. Default is
+        `MD_CONVERSION_CACHE_MAX_BYTES`.
+
+    Returns
+    -------
+    int
+        The number of evicted entries
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return 0
+
+    entries = []
+    for cache_path in cache_dir.glob("*/*.html"):
+        try:
+            cache_stat = cache_path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((cache_stat.st_mtime_ns, cache_stat.st_size, cache_path))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    n_evicted = 0
+    for _, size, cache_path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        cache_path.unlink(missing_ok=True)
+        total_bytes -= size
+        n_evicted += 1
+
+    if n_evicted:
+        print(
+            f"Building: Evicted {n_evicted} least-recently-used entries from the "
+            "markdown conversion cache."
+        )
+    return n_evicted
+
+
+def _convert_md_to_html_uncached(markdown_text, wrap, bibliography_path):
+    """Convert markdown to HTML with the Pandoc worker, or else with PyPandoc."""
+    request = {
+        "text": markdown_text,
+        "from": "markdown-auto_identifiers",
+        "wrap": wrap,
+    }
+    if bibliography_path is not None:
+        request["bibliography"] = str(bibliography_path)
+        # Lets the worker re-parse the bibliography only if it has changed
+        request["bibliography_version"] = Path(bibliography_path).stat().st_mtime_ns
+
+    converted_html = _convert_with_pandoc_worker(request)
+    if converted_html is not None:
+        return converted_html
+
+    extra_args = []
+    if wrap != "auto":
+        extra_args.append(f"--wrap={wrap}")
+    if bibliography_path is not None:
+        extra_args.extend([f"--bibliography={bibliography_path}", "--citeproc"])
+    extra_args.extend(
+        [
+            "--mathml",
+            # the "-f", "markdown-auto_identifiers" arguments below
+            # disable the automatic ids added to header tags
+            "-f",
+            "markdown-auto_identifiers",
+        ]
+    )
+    return pypandoc.convert_text(
+        markdown_text,
+        format="md",
+        to="html",
+        extra_args=extra_args,
+    )
+
+
+def convert_md_to_html(
+    markdown_text,
+    wrap="auto",
+    bibliography_path=None,
+    cache_dir=None,
+):
+    """
+    Convert markdown to HTML using Pandoc.
+
+    This is the single entry point for all markdown-to-HTML conversions in the build,
+    for both markdown pages and notebook markdown cells. Conversions are done by this
+    process's long-lived Pandoc workers if possible (see `PANDOC_WORKER_SCRIPT_PATH`),
+    and otherwise by running Pandoc through PyPandoc. Both produce identical output.
+
+    If `cache_dir` is given, the result is looked up in (and otherwise added to) the
+    on-disk markdown conversion cache, so that content which has not changed since a
+    previous build is never converted again.
+
+    Every call is timed as a profiling event, if profiling is enabled (see
+    `scripts/profiling.py`).
+
+    Arguments
+    ---------
+    markdown_text : str
+        The markdown to convert. Automatic header identifiers are always disabled.
+    wrap : str, optional
+        Pandoc's '--wrap' option, one of "auto", "none", or "preserve". Default is
+        "auto", which is also Pandoc's default.
+    bibliography_path : pathlib.Path or str, optional
+        Path to a BibTeX bibliography. If given, citations are processed with
+        citeproc, equivalent to passing '--bibliography=<path> --citeproc' to Pandoc.
+        Default is None, for no citation processing.
+    cache_dir : pathlib.Path, optional
+        The markdown conversion cache directory, typically
+        '<textbook-root>/.build_cache/pandoc_cache/'. Default is None, which disables
+        the cache.
+
+    Returns
+    -------
+    str
+        The converted HTML
+    """
+    with profile_phase(
+        "convert_md_to_html",
+        "pandoc",
+        n_chars=len(markdown_text),
+        cached=False,
+    ) as event_args:
+        if cache_dir is None:
+            return _convert_md_to_html_uncached(markdown_text, wrap, bibliography_path)
+
+        cache_key = get_md_conversion_cache_key(markdown_text, wrap, bibliography_path)
+        converted_html = read_cached_md_conversion(cache_key, cache_dir)
+        if converted_html is None:
+            converted_html = _convert_md_to_html_uncached(
+                markdown_text,
+                wrap,
+                bibliography_path,
+            )
+            write_cached_md_conversion(cache_key, converted_html, cache_dir)
+        else:
+            event_args["cached"] = True
+        return converted_html
@@ -0,0 +1,102 @@
+-- Long-lived Pandoc worker used by `scripts/pandoc_conversion.py`.
+--
+-- Run with `pandoc lua scripts/pandoc_worker.lua <path-to-pandoc>`. Each line read from stdin is a JSON
+-- conversion request, and exactly one line of JSON is written back to stdout for each
+-- of them, so a single Pandoc process can convert every piece of markdown in a build.
+--
+-- Requests have the following keys:
+-- - "text": The markdown text to convert
+-- - "from": The Pandoc input format, including extensions
+-- - "wrap": The "wrap" writer option ("auto", "none", or "preserve")
+-- - "bibliography": (Optional) Path to a BibTeX bibliography. If given, citations are
+--     processed with citeproc, equivalent to `--bibliography=<path> --citeproc`.
+-- - "bibliography_version": (Optional) Changes whenever the bibliography file does
+--     (e.g. its modification time), so the parsed bibliography can be cached.
+--
+-- Responses are either {"html": <converted HTML>} or {"error": <message>}.
+
+if pandoc.json == nil or pandoc.utils.citeproc == nil then
+  error("The Pandoc worker requires Pandoc 3.1.1 or newer")
+end
+
+-- The Pandoc command line reads markdown with the abbreviations in its "abbreviations"
+-- data file (so that e.g. "et al. (2007)" gets a non-breaking space), but the Lua
+-- `pandoc.read` only uses a small built-in list. Load the same file the command line
+-- would, which is the user's own copy if there is one.
+local function read_abbreviations()
+  local abbreviations_text
+  if PANDOC_STATE.user_data_dir then
+    local user_file = io.open(
+      pandoc.path.join({ PANDOC_STATE.user_data_dir, "abbreviations" }),
+      "r"
+    )
+    if user_file then
+      abbreviations_text = user_file:read("a")
+      user_file:close()
+    end
+  end
+  if abbreviations_text == nil then
+    abbreviations_text = pandoc.pipe(
+      arg[1],
+      { "--print-default-data-file", "abbreviations" },
+      ""
+    )
+  end
+  local abbreviations = {}
+  for abbreviation in abbreviations_text:gmatch("[^\n]+") do
+    abbreviations[abbreviation] = true
+  end
+  return abbreviations
+end
+
+local reader_options = { abbreviations = read_abbreviations() }
+
+-- Parsed bibliographies, keyed on their path and version. Parsing a large BibTeX file is
+-- the slowest part of converting a page with citations, so this only happens once for
+-- every version of the bibliography that this worker sees.
+local references_cache = {}
+
+local function get_references(bibliography_path, bibliography_version)
+  local cache_key = bibliography_path .. "@" .. tostring(bibliography_version)
+  if references_cache[cache_key] == nil then
+    local bib_file = assert(io.open(bibliography_path, "r"))
+    local bib_text = bib_file:read("a")
+    bib_file:close()
+    references_cache[cache_key] = pandoc.read(bib_text, "bibtex").meta.references
+  end
+  return references_cache[cache_key]
+end
+
+local function convert(request)
+  local doc = pandoc.read(request.text, request.from, reader_options)
+  if request.bibliography then
+    doc.meta.references = get_references(
+      request.bibliography,
+      request.bibliography_version
+    )
+    doc = pandoc.utils.citeproc(doc)
+  end
+  -- The Pandoc command line always ends its output with a newline
+  return pandoc.write(doc, "html", {
+    wrap_text = request.wrap,
+    html_math_method = "mathml",
+  }) .. "\n"
+end
+
+-- Let the parent process know the worker started successfully
+io.stdout:write(pandoc.json.encode({ ready = true }), "\n")
+io.stdout:flush()
+
+for line in io.lines() do
+  local ok, result = pcall(function()
+    return convert(pandoc.json.decode(line, false))
+  end)
+  local response
+  if ok then
+    response = { html = result }
+  else
+    response = { error = tostring(result) }
+  end
+  io.stdout:write(pandoc.json.encode(response), "\n")
+  io.stdout:flush()
+end
@@ -1,7 +1,79 @@
-import subprocess
-import requests
+import functools
+from importlib import metadata
+import json
+import re
+import textwrap
+import time
+import warnings
 
-from hnn_core import __version__ as installed_version
+# Note that neither hnn-core (which also imports NEURON, matplotlib, and SciPy) nor
+# requests are imported at startup, see `get_installed_hnn_version` and `_get_json`
+
+# Base URLs of the APIs used to look up hnn-core versions and commits. These are only
+# arguments of the functions that use them so that they can be pointed at a local
+# stand-in server, e.g. for testing.
+PYPI_API_URL = "https://pypi.org/pypi"
+GITHUB_API_URL = "https://api.github.com"
+
+# Bump this whenever the layout of the version cache changes, which invalidates it
+# (see `_load_version_cache`)
+VERSION_CACHE_FORMAT_VERSION = 1
+
+# How long (in seconds) looked-up values are used from the version cache before being
+# looked up again. Full commit hashes never change, so those of specific (e.g. short)
+# commit hashes are cached forever.
+# --------------------------------------------------------------------------------------
+# - "latest_stable_version": The latest stable version of hnn-core on PyPI
+# - "branch_commit": The commit that a branch (e.g. 'master') currently points to
+VERSION_CACHE_TTLS = {
+    "latest_stable_version": 6 * 60 * 60,
+    "branch_commit": 10 * 60,
+}
+
+# Timeouts (in seconds) for connecting to, and then reading a response from, the APIs
+REQUEST_TIMEOUTS = (5, 15)
+
+# How many times to try each request, waiting `REQUEST_RETRY_DELAY * 2**attempt`
+# seconds between attempts. Only connection errors, timeouts, and server errors (or
+# being rate-limited) are retried.
+REQUEST_ATTEMPTS = 3
+REQUEST_RETRY_DELAY = 1
+
+# Commit hashes (full or abbreviated), as opposed to branch names
+COMMIT_HASH_PATTERN = re.compile(r"^[0-9a-f]{4,40}$")
+
+
+@functools.lru_cache(maxsize=None)
+def get_installed_hnn_version():
+    """
+    Get the installed version of hnn-core, e.g. '0.4.2'.
+
+    This is read from the distribution metadata of hnn-core, rather than from
+    `hnn_core.__version__`, since importing hnn-core takes seconds.
+    """
+    return metadata.version("hnn-core")
+
+
+@functools.lru_cache(maxsize=None)
+def _read_installed_hnn_commit():
+    """
+    Read the installed commit (or version) of hnn-core from its distribution metadata.
+
+    For installs from a git repository (e.g. 'pip install "hnn-core @
+    git+https://github.com/jonescompneurolab/hnn-core.git@<commit>"'), pip records the
+    exact commit in the 'direct_url.json' file of the distribution (see PEP 610), which
+    is the same commit that `pip freeze` reports. For every other install, this is the
+    installed version instead. Reading these files takes milliseconds, while `pip
+    freeze` has to inspect every installed distribution. The result is cached, since it
+    cannot change during a build.
+    """
+    distribution = metadata.distribution("hnn-core")
+    direct_url_text = distribution.read_text("direct_url.json")
+    if direct_url_text:
+        vcs_info = json.loads(direct_url_text).get("vcs_info", {})
+        if "commit_id" in vcs_info:
+            return vcs_info["commit_id"]
+    return distribution.version
 
 
 def get_hnn_commit_hash():
@@ -14,39 +86,278 @@ def get_hnn_commit_hash():
         source. Otherwise, the current version of hnn-core that is installed
     """
     try:
-        installed_commit = subprocess.check_output(["pip", "freeze"], text=True)
-        for line in installed_commit.splitlines():
-            if "hnn" in line:
-                if "@" in line:
-                    installed_commit = line.split("@")[2].split("#")[0]
-                else:
-                    installed_commit = line.split("hnn-core==")[-1]
+        installed_commit = _read_installed_hnn_commit()
         print(
             "Configuration: The installed version of hnn-core is:\n"
-            f"    {installed_version}"
+            f"    {get_installed_hnn_version()}"
             "\nConfiguration: The installed commit (or version if not installed from "
             "source) of hnn-core is:\n"
             f"    {installed_commit}\n"
         )
     except Exception as e:
         raise RuntimeError(
-            f"Could not import hnn_core and retrieve the installed commit:\n{e}"
+            f"Could not find hnn-core and retrieve the installed commit:\n{e}"
         )
     return installed_commit
 
 
+def _load_version_cache(version_cache_path):
+    """
+    Load the version cache, see `_resolve_with_cache`. Returns an empty cache if there
+    is none, or if it was written by a different `VERSION_CACHE_FORMAT_VERSION`.
+    """
+    if version_cache_path is None:
+        return {"format_version": VERSION_CACHE_FORMAT_VERSION, "values": {}}
+    try:
+        with open(version_cache_path, "r", encoding="utf-8") as f:
+            version_cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        version_cache = {}
+    if version_cache.get("format_version") != VERSION_CACHE_FORMAT_VERSION:
+        version_cache = {"format_version": VERSION_CACHE_FORMAT_VERSION, "values": {}}
+    return version_cache
+
+
+def _save_version_cache(version_cache, version_cache_path):
+    """Save the version cache, see `_resolve_with_cache`."""
+    if version_cache_path is None:
+        return
+    version_cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(version_cache_path, "w", encoding="utf-8") as f:
+        json.dump(version_cache, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def _get_json(url):
+    """
+    Get the JSON response of an API, with timeouts and retries.
+
+    Connection errors, timeouts, server errors, and rate-limiting responses (which are
+    likely to be temporary) are retried up to `REQUEST_ATTEMPTS` times, while any other
+    error response (e.g. a commit that does not exist) is raised immediately.
+    """
+    import requests
+
+    for attempt in range(REQUEST_ATTEMPTS):
+        is_last_attempt = attempt == REQUEST_ATTEMPTS - 1
+        try:
+            response = requests.get(
+                url,
+                headers={"Accept": "application/json"},
+                timeout=REQUEST_TIMEOUTS,
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            if is_last_attempt:
+                raise
+        else:
+            is_rate_limited = (response.status_code == 429) or (
+                (response.status_code == 403)
+                and (response.headers.get("X-RateLimit-Remaining") == "0")
+            )
+            if (response.status_code < 500 and not is_rate_limited) or is_last_attempt:
+                response.raise_for_status()
+                return response.json()
+        time.sleep(REQUEST_RETRY_DELAY * 2**attempt)
+
+
+def _resolve_with_cache(
+    cache_key,
+    url,
+    get_value,
+    ttl,
+    version_cache_path,
+    offline,
+    refresh=False,
+):
+    """
+    Look up a value from an API, using the version cache when possible.
+
+    The version cache (typically '<textbook-root>/.build_cache/hnn_versions.json') maps
+    each `cache_key` to its last looked-up "value", and the time it was "fetched_at".
+
+    - If `offline` is True, the cached value is always used, however old it is, and an
+      error is raised if there is none.
+    - Otherwise, the cached value is used if it is younger than `ttl` seconds (unless
+      `refresh` is True), and the API is queried if not. If the API cannot be reached
+      (e.g. no network, or being rate-limited), an older cached value is used instead,
+      with a warning, if there is one.
+
+    Parameters
+    ----------
+    cache_key : str
+        Key of the value in the version cache, e.g. 'pypi:hnn-core:latest'
+    url : str
+        The API URL to get the value from
+    get_value : callable
+        Called with the JSON response of `url` to get the value
+    ttl : float or None
+        Maximum age (in seconds) of a cached value to use without querying the API. If
+        None, cached values never expire.
+    version_cache_path : pathlib.Path or None
+        Path of the version cache. If None, nothing is cached.
+    offline : bool
+        Whether to only use the version cache
+    refresh : bool, optional
+        Whether to query the API even if the cached value has not expired. Default is
+        False.
+
+    Returns
+    -------
+    value
+        The looked-up value
+    from_cache : bool
+        Whether the value came from the version cache instead of the API
+    """
+    version_cache = _load_version_cache(version_cache_path)
+    cached = version_cache["values"].get(cache_key)
+
+    if offline:
+        if cached is None:
+            raise RuntimeError(
+                f"Cannot look up '{cache_key}' while offline, since it has not been "
+                "looked up (and cached) by a previous build. Please run the build "
+                "without '--offline' once, or use '--code-version=no-check'."
+            )
+        return cached["value"], True
+
+    if (
+        (cached is not None)
+        and (not refresh)
+        and ((ttl is None) or (time.time() - cached["fetched_at"] < ttl))
+    ):
+        return cached["value"], True
+
+    import requests
+
+    try:
+        value = get_value(_get_json(url))
+    except requests.RequestException as e:
+        if cached is None or (
+            isinstance(e, requests.HTTPError)
+            and e.response is not None
+            and e.response.status_code == 404
+        ):
+            raise
+        warnings.warn(
+            textwrap.dedent(f"""
+            # ----------------------------------------------------------------------
+            # WARNING: Could not look up '{cache_key}' at:
+            # {url}
+            # Using the value cached by a previous build instead: '{cached["value"]}'
+            # Error message: {e}
+            # ----------------------------------------------------------------------
+        """)
+        )
+        return cached["value"], True
+
+    version_cache["values"][cache_key] = {"value": value, "fetched_at": time.time()}
+    _save_version_cache(version_cache, version_cache_path)
+    return value, False
+
+
+def resolve_latest_stable_version(
+    version_cache_path=None,
+    offline=False,
+    refresh=False,
+    pypi_url=PYPI_API_URL,
+):
+    """
+    Get the latest stable version of hnn-core on PyPI.
+
+    Parameters
+    ----------
+    version_cache_path : pathlib.Path, optional
+        Path of the version cache, see `_resolve_with_cache`. Default is None, which
+        always queries PyPI.
+    offline : bool, optional
+        Whether to only use the version cache. Default is False.
+    refresh : bool, optional
+        Whether to query PyPI even if the cached version has not expired. Default is
+        False.
+    pypi_url : str, optional
+        Base URL of the PyPI JSON API. Default is `PYPI_API_URL`.
+
+    Returns
+    -------
+    latest_stable_version : str
+        The latest stable version, e.g. '0.4.2'
+    from_cache : bool
+        Whether the version came from the version cache instead of PyPI
+    """
+    return _resolve_with_cache(
+        "pypi:hnn-core:latest",
+        f"{pypi_url}/hnn-core/json",
+        lambda response_json: response_json["info"]["version"],
+        VERSION_CACHE_TTLS["latest_stable_version"],
+        version_cache_path,
+        offline,
+        refresh=refresh,
+    )
+
+
+def resolve_commit_hash(
+    owner,
+    ref,
+    version_cache_path=None,
+    offline=False,
+    refresh=False,
+    github_url=GITHUB_API_URL,
+):
+    """
+    Get the full commit hash of a branch or (abbreviated) commit of an hnn-core repo.
+
+    Parameters
+    ----------
+    owner : str
+        Owner of the 'hnn-core' GitHub repository, e.g. 'jonescompneurolab'
+    ref : str
+        Branch name (e.g. 'master') or abbreviated commit hash (e.g. '92b000c')
+    version_cache_path : pathlib.Path, optional
+        Path of the version cache, see `_resolve_with_cache`. Commit hashes are cached
+        forever, while branches are looked up again after
+        `VERSION_CACHE_TTLS["branch_commit"]` seconds. Default is None, which always
+        queries GitHub.
+    offline : bool, optional
+        Whether to only use the version cache. Default is False.
+    refresh : bool, optional
+        Whether to query GitHub even if the cached commit has not expired. Default is
+        False.
+    github_url : str, optional
+        Base URL of the GitHub API. Default is `GITHUB_API_URL`.
+
+    Returns
+    -------
+    full_commit_hash : str
+        The full (40-character) commit hash
+    from_cache : bool
+        Whether the commit hash came from the version cache instead of GitHub
+    """
+    return _resolve_with_cache(
+        f"github:{owner}/hnn-core:{ref}",
+        f"{github_url}/repos/{owner}/hnn-core/commits/{ref}",
+        lambda response_json: response_json["sha"],
+        None if COMMIT_HASH_PATTERN.match(ref) else VERSION_CACHE_TTLS["branch_commit"],
+        version_cache_path,
+        offline,
+        refresh=refresh,
+    )
+
+
 def validate_hnn_versions(
     installed_commit,
     code_version,
     custom_owner_commit=None,
+    version_cache_path=None,
+    offline=False,
 ):
     """Validate the installed hnn-core version/hash against 'code-version' options.
 
     This function verifies that the installed hnn-core version/commit matches the
     requested version/commit for building the textbook (unless `code_version` is set to
     'no-check'), then returns the appropriate commit hash to use for documentation
-    links. The function requires internet access to query PyPI and/or GitHub APIs
-    (unless `code_version` is set to 'no-check').
+    links. The function queries PyPI and/or GitHub APIs (unless `code_version` is set to
+    'no-check'), but the results are cached in `version_cache_path`, so that most builds
+    do not need to, and builds with `offline` set never do.
 
     Parameters
     ----------
@@ -63,6 +374,15 @@ def validate_hnn_versions(
         Required when code_version='custom'. Format: '<owner>:<commit-hash>'
         Example: 'asoplata:92b000c' to retrieve the commit for
         https://github.com/asoplata/hnn-core/commit/92b000c597052a661d9e177b8754695446336b96
+    version_cache_path : pathlib.Path, optional
+        Path of the cache of looked-up versions and commits, see `_resolve_with_cache`.
+        Typically '<textbook-root>/.build_cache/hnn_versions.json'. If a cached version
+        or commit does not match the installed one, it is looked up again before
+        failing (unless `offline` is True). Default is None, which disables the cache.
+    offline : bool, optional
+        Whether to only use cached versions and commits, without any network access.
+        This descends from the '--offline' argument passed to the CLI of 'build.py'.
+        Default is False.
 
     Returns
     -------
@@ -79,11 +399,23 @@ def validate_hnn_versions(
         # output will not show a commit hash version for what was last used for execution. The hash
         # being None indicates a stable build.
         hnn_commit_hash = None
+        installed_version = get_installed_hnn_version()
 
-        # Lookup online the latest stable version
-        latest_stable_version = requests.get(
-            "https://pypi.org/pypi/hnn-core/json"
-        ).json()["info"]["version"]
+        # Lookup online (or in the cache) the latest stable version. A cached version
+        # that does not match may simply be out of date, so it is looked up again.
+        latest_stable_version, from_cache = resolve_latest_stable_version(
+            version_cache_path,
+            offline,
+        )
+        if (
+            from_cache
+            and (not offline)
+            and (installed_version != latest_stable_version)
+        ):
+            latest_stable_version, _ = resolve_latest_stable_version(
+                version_cache_path,
+                refresh=True,
+            )
 
         # "stable" case version validation
         if installed_version > latest_stable_version:
@@ -124,11 +456,22 @@ def validate_hnn_versions(
     # 'master' version checks and commit setting
     # ----------------------------------------------------------------------------------
     elif code_version == "master":
-        # Lookup online the latest commit hash from upstream/master
-        url = "https://api.github.com/repos/jonescompneurolab/hnn-core/commits/master"
-        response = requests.get(url)
-        response.raise_for_status()
-        latest_master_commit = response.json()["sha"]
+        # Lookup online (or in the cache) the latest commit hash from upstream/master.
+        # A cached commit that does not match may simply be out of date, so it is
+        # looked up again.
+        latest_master_commit, from_cache = resolve_commit_hash(
+            "jonescompneurolab",
+            "master",
+            version_cache_path,
+            offline,
+        )
+        if from_cache and (not offline) and (installed_commit != latest_master_commit):
+            latest_master_commit, _ = resolve_commit_hash(
+                "jonescompneurolab",
+                "master",
+                version_cache_path,
+                refresh=True,
+            )
         hnn_commit_hash = latest_master_commit
 
         # "master" case version/commit validation
@@ -176,10 +519,12 @@ def validate_hnn_versions(
         try:
             owner, provided_commit = owner_hash.split(":")
 
-            url = f"https://api.github.com/repos/{owner}/hnn-core/commits/{provided_commit}"
-            response = requests.get(url)
-            response.raise_for_status()
-            full_provided_commit = response.json()["sha"]
+            full_provided_commit, _ = resolve_commit_hash(
+                owner,
+                provided_commit,
+                version_cache_path,
+                offline,
+            )
             hnn_commit_hash = full_provided_commit
 
         except Exception as e:
@@ -0,0 +1,222 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import os
+import threading
+import time
+
+# Bump this whenever the layout of the timing report changes
+PROFILE_REPORT_FORMAT_VERSION = 1
+
+# Number of slowest events listed for each category in the timing report, see
+# `save_profile_report`
+PROFILE_REPORT_N_SLOWEST = 10
+
+# State of this process's profiling
+# --------------------------------------------------------------------------------------
+# Profiling is off unless it is enabled with 'python build.py --profile'. While it is
+# off, `profile_phase` and `record_profile_event` do nothing, so the instrumented code
+# runs as it would without them.
+#
+# - "enabled": Whether events are being recorded
+# - "events": The events recorded so far, see `record_profile_event`
+# - "lock": Protects "events", since pages are generated by several threads at once
+_profile = {
+    "enabled": False,
+    "events": [],
+    "lock": threading.Lock(),
+}
+
+
+def enable_profiling():
+    """Start recording profiling events in this process."""
+    _profile["enabled"] = True
+
+
+def is_profiling_enabled():
+    """Check whether profiling events are being recorded in this process."""
+    return _profile["enabled"]
+
+
+def record_profile_event(name, category, start_time, duration, **event_args):
+    """
+    Record a single timed event, if profiling is enabled.
+
+    Arguments
+    ---------
+    name : str
+        What was timed, e.g. the filename of a notebook or page
+    category : str
+        The kind of event, e.g. "notebook", "cell", "page", or "pandoc". The timing
+        report summarizes events by category.
+    start_time : float
+        When the event started, in seconds since the epoch (as in `time.time`), so that
+        events recorded by different processes can be compared
+    duration : float
+        How long the event took, in seconds
+    **event_args
+        Any extra details of the event (e.g. whether a conversion was cached), which
+        must be JSON-serializable
+    """
+    if not _profile["enabled"]:
+        return
+    event = {
+        "name": name,
+        "category": category,
+        "start_time": start_time,
+        "duration": duration,
+        "pid": os.getpid(),
+        "tid": threading.get_native_id(),
+        "args": event_args,
+    }
+    with _profile["lock"]:
+        _profile["events"].append(event)
+
+
+@contextmanager
+def profile_phase(name, category, **event_args):
+    """
+    Time the code in a `with` block as a single event, if profiling is enabled.
+
+    See `record_profile_event` for the arguments. The block is given the dict of
+    `event_args`, to which it can add details that are only known once it is done, e.g.
+
+        with profile_phase(page_name, "page") as event_args:
+            ...
+            event_args["skipped"] = True
+
+    The event is recorded even if the block raises an exception.
+    """
+    if not _profile["enabled"]:
+        yield event_args
+        return
+    start_time = time.time()
+    start_counter = time.perf_counter()
+    try:
+        yield event_args
+    finally:
+        record_profile_event(
+            name,
+            category,
+            start_time,
+            time.perf_counter() - start_counter,
+            **event_args,
+        )
+
+
+def collect_profile_events():
+    """
+    Remove and return all the events recorded so far in this process.
+
+    This is used by worker processes (see `execute_and_convert_nbs_to_json`) to send
+    their events back to the main process, which adds them with `add_profile_events`.
+    """
+    with _profile["lock"]:
+        events = _profile["events"]
+        _profile["events"] = []
+    return events
+
+
+def add_profile_events(events):
+    """Add events recorded by another process, see `collect_profile_events`."""
+    with _profile["lock"]:
+        _profile["events"].extend(events)
+
+
+def _summarize_profile_events(events):
+    """Summarize the count, total, and slowest of the events of every category."""
+    summary = {}
+    for event in sorted(events, key=lambda event: event["duration"], reverse=True):
+        category_summary = summary.setdefault(
+            event["category"],
+            {"count": 0, "total_duration": 0.0, "max_duration": 0.0, "slowest": []},
+        )
+        category_summary["count"] += 1
+        category_summary["total_duration"] += event["duration"]
+        category_summary["max_duration"] = max(
+            category_summary["max_duration"],
+            event["duration"],
+        )
+        if len(category_summary["slowest"]) < PROFILE_REPORT_N_SLOWEST:
+            category_summary["slowest"].append(
+                {"name": event["name"], "duration": round(event["duration"], 6)}
+            )
+    for category_summary in summary.values():
+        category_summary["total_duration"] = round(
+            category_summary["total_duration"], 6
+        )
+        category_summary["max_duration"] = round(category_summary["max_duration"], 6)
+    return dict(sorted(summary.items()))
+
+
+def save_profile_report(report_path, trace_path):
+    """
+    Save all the events recorded so far to a timing report and a trace file.
+
+    Events are removed once they are saved, so that every rebuild while serving (see
+    `scripts/serve.py`) gets its own report.
+
+    Arguments
+    ---------
+    report_path : pathlib.Path
+        Path of the timing report, a JSON file with:
+        - "format_version": `PROFILE_REPORT_FORMAT_VERSION`
+        - "created": When the report was saved, as an ISO 8601 timestamp
+        - "total_duration": Seconds from the start of the first event to the end of the
+            last one
+        - "categories": For every category of event, its "count", "total_duration",
+            "max_duration", and its `PROFILE_REPORT_N_SLOWEST` "slowest" events
+        - "events": Every event, ordered by its start time. All times are in seconds.
+    trace_path : pathlib.Path
+        Path of the trace file, in the Chrome trace event format, which can be opened in
+        'chrome://tracing' or https://ui.perfetto.dev to see the events on a timeline,
+        with a row for every process and thread
+
+    Returns
+    -------
+    int
+        The number of events saved
+    """
+    events = sorted(collect_profile_events(), key=lambda event: event["start_time"])
+    if events:
+        first_start_time = events[0]["start_time"]
+        total_duration = max(
+            event["start_time"] + event["duration"] for event in events
+        ) - first_start_time
+    else:
+        first_start_time = 0.0
+        total_duration = 0.0
+
+    report = {
+        "format_version": PROFILE_REPORT_FORMAT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "total_duration": round(total_duration, 6),
+        "categories": _summarize_profile_events(events),
+        "events": events,
+    }
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    # Complete ("X") events, with times in microseconds since the first event
+    trace = {
+        "traceEvents": [
+            {
+                "name": event["name"],
+                "cat": event["category"],
+                "ph": "X",
+                "ts": round((event["start_time"] - first_start_time) * 1e6, 1),
+                "dur": round(event["duration"] * 1e6, 1),
+                "pid": event["pid"],
+                "tid": event["tid"],
+                "args": event["args"],
+            }
+            for event in events
+        ],
+        "displayTimeUnit": "ms",
+    }
+    trace_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(trace_path, "w") as f:
+        json.dump(trace, f)
+
+    return len(events)
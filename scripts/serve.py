@@ -0,0 +1,247 @@
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import threading
+import time
+import traceback
+from urllib.parse import urlsplit
+
+# The URL path that browsers listen on for reload events
+LIVE_RELOAD_PATH = "/__live_reload"
+
+# Injected into every served HTML page (but never into the built files themselves), so
+# that the page reloads itself whenever a rebuild finishes
+LIVE_RELOAD_SCRIPT = f"""
+<script>
+    new EventSource("{LIVE_RELOAD_PATH}").addEventListener("reload", () => {{
+        window.location.reload();
+    }});
+</script>
+"""
+
+# State shared between the file watcher and the server threads
+# --------------------------------------------------------------------------------------
+# - "generation": Incremented after every rebuild. Browsers are sent a reload event
+#     whenever it changes.
+# - "condition": Lets the server threads wait for "generation" to change
+_live_reload = {
+    "generation": 0,
+    "condition": threading.Condition(),
+}
+
+
+def _notify_live_reload():
+    """Tell every connected browser to reload its page."""
+    with _live_reload["condition"]:
+        _live_reload["generation"] += 1
+        _live_reload["condition"].notify_all()
+
+
+class _LiveReloadRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serve the built website files, plus a stream of reload events for browsers.
+
+    HTML pages are served with `LIVE_RELOAD_SCRIPT` added before their closing body
+    tag, and `LIVE_RELOAD_PATH` is a server-sent event stream that sends a "reload"
+    event after every rebuild.
+    """
+
+    def do_GET(self):
+        url_path = urlsplit(self.path).path
+        if url_path == LIVE_RELOAD_PATH:
+            self._send_live_reload_events()
+            return
+
+        file_path = Path(self.translate_path(self.path))
+        if file_path.is_dir():
+            file_path = file_path / "index.html"
+        if file_path.suffix == ".html" and file_path.is_file():
+            self._send_html_with_live_reload(file_path)
+            return
+
+        super().do_GET()
+
+    def end_headers(self):
+        # Always serve the latest build, never a cached copy
+        self.send_header("Cache-Control", "no-store")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        # Requests are not worth logging during development
+        pass
+
+    def _send_html_with_live_reload(self, file_path):
+        html_content = file_path.read_text(encoding="utf-8")
+        if "</body>" in html_content:
+            html_content = html_content.replace(
+                "</body>",
+                LIVE_RELOAD_SCRIPT + "</body>",
+                1,
+            )
+        else:
+            html_content += LIVE_RELOAD_SCRIPT
+        encoded_content = html_content.encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(encoded_content)))
+        self.end_headers()
+        self.wfile.write(encoded_content)
+
+    def _send_live_reload_events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        condition = _live_reload["condition"]
+        with condition:
+            seen_generation = _live_reload["generation"]
+        try:
+            while True:
+                with condition:
+                    # Wake up regularly to send a comment, so that connections to
+                    # closed pages are noticed and this thread can exit
+                    condition.wait_for(
+                        lambda: _live_reload["generation"] != seen_generation,
+                        timeout=15,
+                    )
+                    current_generation = _live_reload["generation"]
+                if current_generation != seen_generation:
+                    seen_generation = current_generation
+                    self.wfile.write(b"event: reload\ndata: reload\n\n")
+                else:
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def _snapshot_watched_files(watch_patterns):
+    """
+    Get the modification time and size of every watched file.
+
+    Arguments
+    ---------
+    watch_patterns : list of tuple
+        Pairs of (directory or file path, glob pattern). The pattern is ignored for
+        file paths.
+
+    Returns
+    -------
+    dict
+        Mapping of each watched file path to a (modification time, size) tuple
+    """
+    snapshot = {}
+    for watch_path, pattern in watch_patterns:
+        if watch_path.is_file():
+            candidate_paths = [watch_path]
+        else:
+            candidate_paths = watch_path.glob(pattern)
+        for file_path in candidate_paths:
+            if ".ipynb_checkpoints" in file_path.parts:
+                continue
+            try:
+                file_stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            if file_path.is_file():
+                snapshot[file_path] = (file_stat.st_mtime_ns, file_stat.st_size)
+    return snapshot
+
+
+def serve(
+    serve_root_path,
+    start_url_path,
+    watch_patterns,
+    rebuild,
+    host="127.0.0.1",
+    port=8000,
+    poll_interval=0.2,
+):
+    """
+    Serve the built website locally, rebuilding and reloading it on source changes.
+
+    The website is served over HTTP from a background thread, while the current thread
+    polls the watched source files for changes. Whenever any of them are added,
+    modified, or deleted, `rebuild` is called with the changed paths, and then every
+    open page in the browser is reloaded.
+
+    Only source files should be watched (e.g. not the HTML pages or notebook JSON output
+    files, which are written by the build itself), otherwise every rebuild would
+    trigger another one.
+
+    Arguments
+    ---------
+    serve_root_path : pathlib.Path
+        Directory to serve as the website root. Since links between pages are relative
+        to the parent of '<textbook-root>' (e.g. '/textbook/content/preface.html'),
+        this is typically that parent directory.
+    start_url_path : str
+        The URL path of the first page of the website, which is printed for
+        convenience.
+    watch_patterns : list of tuple
+        Pairs of (directory or file path, glob pattern) describing which source files
+        to watch, e.g. `(content_path, "**/*.md")`.
+    rebuild : callable
+        Called with a sorted list of the changed (pathlib.Path) files whenever any of
+        them change. Any exception it raises is printed, and serving continues.
+    host : str, optional
+        Host to serve on. Default is "127.0.0.1", which is only reachable from this
+        machine.
+    port : int, optional
+        Port to serve on. Default is 8000.
+    poll_interval : float, optional
+        Seconds between checks of the watched files. Default is 0.2.
+
+    Returns
+    -------
+    None
+        This runs until interrupted (e.g. with Ctrl-C).
+    """
+    handler = partial(_LiveReloadRequestHandler, directory=str(serve_root_path))
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    print(
+        f"Serving: Website available at http://{host}:{port}{start_url_path}"
+        "\nServing: Watching for changes, press Ctrl-C to stop."
+    )
+
+    snapshot = _snapshot_watched_files(watch_patterns)
+    try:
+        while True:
+            time.sleep(poll_interval)
+            new_snapshot = _snapshot_watched_files(watch_patterns)
+            if new_snapshot == snapshot:
+                continue
+
+            changed_paths = sorted(
+                path
+                for path in set(snapshot) | set(new_snapshot)
+                if snapshot.get(path) != new_snapshot.get(path)
+            )
+            snapshot = new_snapshot
+            print(
+                "Serving: Detected changes in "
+                + ", ".join(f"'{path.name}'" for path in changed_paths)
+            )
+
+            rebuild_start = time.perf_counter()
+            try:
+                rebuild(changed_paths)
+            except Exception:
+                # Keep serving, so the error can be fixed and the page rebuilt
+                traceback.print_exc()
+                print("Serving: Rebuild failed, waiting for further changes.")
+                continue
+            print(
+                "Serving: Rebuilt in "
+                f"{time.perf_counter() - rebuild_start:.2f} seconds, reloading pages."
+            )
+            _notify_live_reload()
+    except KeyboardInterrupt:
+        print("\nServing: Stopped.")
+    finally:
+        server.shutdown()
+        server.server_close()
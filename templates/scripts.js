@@ -511,8 +511,8 @@ document.addEventListener('DOMContentLoaded', () => {
 // Add a clickable '#' for each heading 
 // that directs to that heading
 // ----------------------------------------
-document.addEventListener("DOMContentLoaded", function () {
-    document.querySelectorAll("h1, h2, h3, h4, h5, h6").forEach(header => {
+function addHeaderLinks(root) {
+    root.querySelectorAll("h1, h2, h3, h4, h5, h6").forEach(header => {
         if (!header.id) {
             let text = header.textContent.trim().toLowerCase().replace(/\s+/g, '-').replace(/[^\w\-]/g, '');
             header.id = text;
@@ -529,6 +529,10 @@ document.addEventListener("DOMContentLoaded", function () {
             header.appendChild(link);
         }
     });
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+    addHeaderLinks(document);
 });
 
 // ----------------------------------------
@@ -537,9 +541,9 @@ document.addEventListener("DOMContentLoaded", function () {
 
 // Remove the leading whitespace/newlines around code blocks 
 // caused by the html structure used for readability
-document.addEventListener("DOMContentLoaded", function() {
+function trimCodeBlocks(root) {
     // Select all code blocks
-    const codeBlocks = document.querySelectorAll('.code-cell code.language-python');
+    const codeBlocks = root.querySelectorAll('.code-cell code.language-python');
 
     codeBlocks.forEach(function(block) {
         // Apply syntax highlighting to the code block
@@ -556,20 +560,24 @@ document.addEventListener("DOMContentLoaded", function() {
     });
 
     // Select all output-code blocks
-    const outputBlocks = document.querySelectorAll('.output-cell .output-code');
+    const outputBlocks = root.querySelectorAll('.output-cell .output-code');
 
     outputBlocks.forEach(function(block) {
         // Remove unwanted leading/trailing whitespace or newlines
         block.textContent = block.textContent.trim();
     });
+}
+
+document.addEventListener("DOMContentLoaded", function() {
+    trimCodeBlocks(document);
 });
 
 // ----------------------------------------
 // Copy button on code cells
 // ----------------------------------------
 
-document.addEventListener("DOMContentLoaded", () => {
-    document.querySelectorAll('.code-cell').forEach(cell => {
+function addCopyButtons(root) {
+    root.querySelectorAll('.code-cell').forEach(cell => {
         // Avoid inserting the button multiple times
         if (cell.querySelector('.copy-button')) return;
 
@@ -599,17 +607,132 @@ document.addEventListener("DOMContentLoaded", () => {
 
         cell.appendChild(button);
     });
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    addCopyButtons(document);
 });
 
-document.querySelectorAll(".collapsible-header").forEach(header => {
-    header.addEventListener("click", function () {
-        const section = this.closest(".collapsible-section"); // Get parent section
-        section.classList.toggle("active");
-        this.classList.toggle("active"); // Keep this for toggling the plus/minus sign
+function initCollapsibleHeaders(root) {
+    root.querySelectorAll(".collapsible-header").forEach(header => {
+        header.addEventListener("click", function () {
+            const section = this.closest(".collapsible-section"); // Get parent section
+            section.classList.toggle("active");
+            this.classList.toggle("active"); // Keep this for toggling the plus/minus sign
 
-        const content = section.querySelector(".collapsible-content");
-        content.style.display = content.style.display === "block" ? "none" : "block";
+            const content = section.querySelector(".collapsible-content");
+            content.style.display = content.style.display === "block" ? "none" : "block";
+        });
+    });
+}
+
+initCollapsibleHeaders(document);
+
+// ----------------------------------------
+// Lazy-loaded notebook sections
+// ----------------------------------------
+//     Notes:
+//     When the website is built with '--lazy-nb-sections', the later
+//     sections of long notebooks are not part of the page itself.
+//     Instead, each is replaced by a '.nb-lazy-section' placeholder
+//     whose 'data-src' is the section's HTML fragment file. Sections
+//     are loaded one at a time, in order, once the reader scrolls
+//     near the next one, so that the page can be displayed before
+//     the rest of the notebook has been downloaded.
+
+async function loadNbSection(placeholder) {
+    const response = await fetch(placeholder.dataset.src);
+    if (!response.ok) {
+        throw new Error(`Failed to load ${placeholder.dataset.src}`);
+    }
+    const template = document.createElement("template");
+    template.innerHTML = await response.text();
+
+    // Relative URLs in the fragment file are relative to its own
+    // directory (so that it also works when opened by itself), rather
+    // than to the page
+    const content = template.content;
+    const fragmentUrl = response.url;
+    content.querySelectorAll("[src], [href]").forEach(element => {
+        for (const attribute of ["src", "href"]) {
+            const url = element.getAttribute(attribute);
+            if (url && !url.startsWith("#")) {
+                element.setAttribute(attribute, new URL(url, fragmentUrl).href);
+            }
+        }
     });
+    content.querySelectorAll("[srcset]").forEach(element => {
+        const candidates = element.getAttribute("srcset").split(",").map(candidate => {
+            const [url, ...descriptors] = candidate.trim().split(/\s+/);
+            return [new URL(url, fragmentUrl).href, ...descriptors].join(" ");
+        });
+        element.setAttribute("srcset", candidates.join(", "));
+    });
+
+    // Set up the new content the same way as the rest of the page
+    addHeaderLinks(content);
+    trimCodeBlocks(content);
+    if (window.Prism) {
+        content.querySelectorAll('.code-cell code.language-python').forEach(block => {
+            Prism.highlightElement(block);
+        });
+    }
+    addCopyButtons(content);
+    initCollapsibleHeaders(content);
+
+    placeholder.replaceWith(content);
+}
+
+async function loadNextNbSections(loadAll) {
+    let placeholder;
+    while ((placeholder = document.querySelector(".nb-lazy-section"))) {
+        try {
+            await loadNbSection(placeholder);
+        } catch (error) {
+            // Leave the placeholder's link to the section in place
+            console.error(error);
+            placeholder.classList.remove("nb-lazy-section");
+            continue;
+        }
+        if (!loadAll) {
+            break;
+        }
+    }
+    return document.querySelector(".nb-lazy-section");
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+    if (!document.querySelector(".nb-lazy-section")) {
+        return;
+    }
+
+    // Links to a heading inside a section that is not loaded yet need
+    // every section to be loaded first
+    const targetId = decodeURIComponent(window.location.hash.slice(1));
+    if (targetId && !document.getElementById(targetId)) {
+        loadNextNbSections(true).then(() => {
+            const target = document.getElementById(targetId);
+            if (target) {
+                target.scrollIntoView();
+            }
+        });
+        return;
+    }
+
+    // Otherwise, load the next section whenever its placeholder gets
+    // within a couple of screens of the viewport
+    const observer = new IntersectionObserver(entries => {
+        if (!entries.some(entry => entry.isIntersecting)) {
+            return;
+        }
+        observer.disconnect();
+        loadNextNbSections(false).then(nextPlaceholder => {
+            if (nextPlaceholder) {
+                observer.observe(nextPlaceholder);
+            }
+        });
+    }, { rootMargin: "200% 0px" });
+    observer.observe(document.querySelector(".nb-lazy-section"));
 });
 
 // ----------------------------------------
@@ -0,0 +1,286 @@
+# %%
+
+import pytest  # noqa
+import sys
+
+from pathlib import Path
+
+import nbformat
+
+# Add project root to sys.path to allow importing from scripts folder
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(
+    0,
+    str(project_root),
+)
+
+import scripts.execute_and_convert_nbs as execute_and_convert_nbs  # noqa
+
+HNN_VERSION = "0.4.2"
+
+CODE_SOURCES = [
+    "import numpy as np",
+    "x = np.arange(3)",
+    "print(x)",
+    "x.sum()",
+]
+
+############################################################
+# Fixtures
+# --------------------
+
+
+def _make_nb(code_sources=CODE_SOURCES, markdown_source="# Title"):
+    """Make an unexecuted notebook with a markdown cell before every code cell."""
+    nb = nbformat.v4.new_notebook()
+    for cell_idx, code_source in enumerate(code_sources):
+        nb.cells.append(
+            nbformat.v4.new_markdown_cell(f"{markdown_source} ({cell_idx})")
+        )
+        nb.cells.append(nbformat.v4.new_code_cell(code_source))
+    return nb
+
+
+def _execute_nb(nb):
+    """Fill in made-up outputs for every code cell, as if the notebook was executed."""
+    code_cells = [cell for cell in nb.cells if cell.cell_type == "code"]
+    for execution_count, cell in enumerate(code_cells, start=1):
+        cell.execution_count = execution_count
+        cell.outputs = [
+            nbformat.v4.new_output(
+                "stream",
+                name="stdout",
+                text=f"output of cell {execution_count}\n",
+            )
+        ]
+    return nb
+
+
+def _write_nb(nb, nb_path):
+    """Write a notebook to a file, for the functions that load it themselves."""
+    with open(nb_path, "w", encoding="utf-8") as f:
+        nbformat.write(nb, f)
+    return nb_path
+
+
+def _process_nb(nb_path, nb_hashes, monkeypatch):
+    """
+    Process a notebook that was successfully executed by a previous build.
+
+    Executing the notebook only fills in made-up outputs (see `_execute_nb` above), and
+    every execution is recorded in the returned list.
+    """
+    execute_calls = []
+
+    def _fake_execute_nb(nb_path, timeout=600):
+        execute_calls.append(nb_path)
+        return _execute_nb(execute_and_convert_nbs._load_nb(nb_path)), True, True, None
+
+    monkeypatch.setattr(execute_and_convert_nbs, "_execute_nb", _fake_execute_nb)
+    monkeypatch.setattr(
+        execute_and_convert_nbs,
+        "_read_nb_json_output_metadata",
+        lambda nb_path, nb_json_output_dir: (False, True, HNN_VERSION),
+    )
+    results = execute_and_convert_nbs._process_nb(
+        nb_path,
+        nb_hashes,
+        [],
+        nb_path.parent,
+        "updated-unskipped-notebooks",
+        False,
+        None,
+    )
+    return results, execute_calls
+
+
+############################################################
+# Unit Tests
+# ----------------------
+
+
+def test_nb_hashes_split_code_and_markdown():
+    """Code and markdown edits each change only their own hash."""
+    nb_hashes = execute_and_convert_nbs._calculate_nb_hashes(_make_nb())
+    markdown_edit_hashes = execute_and_convert_nbs._calculate_nb_hashes(
+        _make_nb(markdown_source="# Edited title")
+    )
+    code_edit_hashes = execute_and_convert_nbs._calculate_nb_hashes(
+        _make_nb(CODE_SOURCES[:-1] + ["x.mean()"])
+    )
+
+    assert markdown_edit_hashes["code"] == nb_hashes["code"]
+    assert markdown_edit_hashes["markdown"] != nb_hashes["markdown"]
+    assert code_edit_hashes["code"] != nb_hashes["code"]
+    # Outputs are not part of either hash
+    assert execute_and_convert_nbs._calculate_nb_hashes(_execute_nb(_make_nb())) == (
+        nb_hashes
+    )
+
+
+def test_markdown_edit_is_rerendered(tmp_path, monkeypatch):
+    """A markdown-only edit re-renders the notebook with its prior outputs."""
+    nb_hashes = {
+        "example.ipynb": execute_and_convert_nbs._calculate_nb_hashes(_make_nb())
+    }
+    nb_path = _write_nb(
+        _execute_nb(_make_nb(markdown_source="# Edited title")),
+        tmp_path / "example.ipynb",
+    )
+    (
+        (current_nb_hashes, loaded_nb, execution_initiated, _, _, outputs_rerendered),
+        execute_calls,
+    ) = _process_nb(nb_path, nb_hashes, monkeypatch)
+
+    assert not execute_calls
+    assert not execution_initiated
+    assert outputs_rerendered
+    assert loaded_nb.cells[0].source == "# Edited title (0)"
+    assert execute_and_convert_nbs._is_nb_fully_executed(loaded_nb)
+    assert current_nb_hashes["code"] == nb_hashes["example.ipynb"]["code"]
+
+
+def test_code_edit_is_executed(tmp_path, monkeypatch):
+    """A code edit executes the notebook, even if only its markdown also changed."""
+    nb_hashes = {
+        "example.ipynb": execute_and_convert_nbs._calculate_nb_hashes(_make_nb())
+    }
+    nb_path = _write_nb(
+        _execute_nb(
+            _make_nb(CODE_SOURCES[:-1] + ["x.mean()"], markdown_source="# Edited")
+        ),
+        tmp_path / "example.ipynb",
+    )
+    (
+        (_, _, execution_initiated, execution_successful, _, outputs_rerendered),
+        execute_calls,
+    ) = _process_nb(nb_path, nb_hashes, monkeypatch)
+
+    assert execute_calls == [nb_path]
+    assert execution_initiated
+    assert execution_successful
+    assert not outputs_rerendered
+
+
+def test_rerender_without_prior_outputs():
+    """Notebooks are only re-rendered if their file has the prior outputs."""
+    executed_nb = _execute_nb(_make_nb())
+    assert (
+        execute_and_convert_nbs._rerender_nb_with_prior_outputs(executed_nb)
+        is executed_nb
+    )
+    assert execute_and_convert_nbs._rerender_nb_with_prior_outputs(_make_nb()) is None
+
+
+def test_markdown_edit_without_outputs_is_not_executed(tmp_path, monkeypatch):
+    """A markdown-only edit never executes the notebook, even without prior outputs."""
+    nb_hashes = {
+        "example.ipynb": execute_and_convert_nbs._calculate_nb_hashes(_make_nb())
+    }
+    nb_path = _write_nb(
+        _make_nb(markdown_source="# Edited title"),
+        tmp_path / "example.ipynb",
+    )
+    with pytest.warns(UserWarning, match="not fully executed"):
+        (
+            (_, _, execution_initiated, _, _, outputs_rerendered),
+            execute_calls,
+        ) = _process_nb(nb_path, nb_hashes, monkeypatch)
+
+    assert not execute_calls
+    assert not execution_initiated
+    assert not outputs_rerendered
+
+
+def test_old_single_hash_entries(tmp_path):
+    """Single-hash entries of older 'nb_hashes.json' files are still understood."""
+    loaded_nb = _make_nb()
+    nb_hashes_path = tmp_path / "nb_hashes.json"
+    execute_and_convert_nbs._save_nb_hashes(
+        {
+            "unchanged.ipynb": execute_and_convert_nbs._calculate_nb_hash(loaded_nb),
+            "changed.ipynb": execute_and_convert_nbs._calculate_nb_hash(
+                _make_nb(markdown_source="# Old title")
+            ),
+        },
+        nb_hashes_path,
+    )
+    nb_hashes = execute_and_convert_nbs._load_nb_hashes(nb_hashes_path)
+    current_nb_hashes = execute_and_convert_nbs._calculate_nb_hashes(loaded_nb)
+
+    # A matching hash is split into the current code and markdown hashes
+    assert (
+        execute_and_convert_nbs._get_prior_nb_hashes(
+            "unchanged.ipynb",
+            nb_hashes,
+            loaded_nb,
+        )
+        == current_nb_hashes
+    )
+    # Since a hash that does not match cannot be split, it counts as a code change
+    prior_nb_hashes = execute_and_convert_nbs._get_prior_nb_hashes(
+        "changed.ipynb",
+        nb_hashes,
+        loaded_nb,
+    )
+    assert prior_nb_hashes["code"] != current_nb_hashes["code"]
+    assert (
+        execute_and_convert_nbs._get_prior_nb_hashes("new.ipynb", nb_hashes, loaded_nb)
+        is None
+    )
+
+
+def test_old_single_hash_entry_is_not_executed_again(tmp_path, monkeypatch):
+    """An unchanged notebook with a single-hash entry is not executed again."""
+    loaded_nb = _execute_nb(_make_nb())
+    nb_path = _write_nb(loaded_nb, tmp_path / "example.ipynb")
+    nb_hashes = {
+        "example.ipynb": execute_and_convert_nbs._calculate_nb_hash(
+            execute_and_convert_nbs._load_nb(nb_path)
+        )
+    }
+    (
+        (current_nb_hashes, _, execution_initiated, _, _, outputs_rerendered),
+        execute_calls,
+    ) = _process_nb(nb_path, nb_hashes, monkeypatch)
+
+    assert not execute_calls
+    assert not execution_initiated
+    assert not outputs_rerendered
+    assert current_nb_hashes == execute_and_convert_nbs._calculate_nb_hashes(loaded_nb)
+
+
+def test_unreferenced_nb_images_are_removed(tmp_path):
+    """Images are only deleted once no output in their directory refers to them."""
+    # 'skipped.ipynb' stands for a notebook that was not converted in this build
+    for nb_name in ["example", "skipped"]:
+        img_output_dir = tmp_path / f"output_nb_{nb_name}"
+        (img_output_dir / "optimized").mkdir(parents=True)
+        for img_name in ["fig_shared.png", "fig_stale.png", "fig_standalone.png"]:
+            (img_output_dir / img_name).write_bytes(b"PNG")
+        (img_output_dir / "optimized" / "fig_shared_480w.png").write_bytes(b"PNG")
+        (img_output_dir / "optimized" / "fig_stale_480w.png").write_bytes(b"PNG")
+        (tmp_path / f"{nb_name}.json").write_text(
+            f'{{"Example": "<img src=\\"output_nb_{nb_name}/fig_shared.png\\">"}}'
+        )
+    (tmp_path / "example.html").write_text(
+        '<img src="output_nb_example/fig_standalone.png">'
+    )
+
+    assert (
+        execute_and_convert_nbs._remove_unreferenced_nb_images(
+            tmp_path,
+            save_standalone_nb_html=True,
+        )
+        == 3
+    )
+    assert sorted(
+        str(img_path.relative_to(tmp_path))
+        for img_path in tmp_path.glob("output_nb_*/**/fig_*")
+    ) == [
+        "output_nb_example/fig_shared.png",
+        "output_nb_example/fig_standalone.png",
+        "output_nb_example/optimized/fig_shared_480w.png",
+        "output_nb_skipped/fig_shared.png",
+        "output_nb_skipped/optimized/fig_shared_480w.png",
+    ]
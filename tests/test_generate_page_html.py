@@ -0,0 +1,184 @@
+# %%
+
+import pytest  # noqa
+import sys
+
+import re
+from pathlib import Path
+
+# Add project root to sys.path to allow importing from scripts folder
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(
+    0,
+    str(project_root),
+)
+
+import scripts.generate_page_html as generate_page_html  # noqa
+
+PAGE_TEMPLATE = """<!--
+# Title: {title}
+-->
+
+{body}
+"""
+
+############################################################
+# Fixtures
+# --------------------
+
+
+@pytest.fixture
+def converted_titles(monkeypatch):
+    """
+    Record the title of every page whose markdown is converted, i.e. that is generated.
+
+    Pandoc itself is replaced by a stand-in, and embedded notebooks are left as their
+    '[[<notebook_name>.ipynb]' references, since only whether pages are regenerated is
+    tested here.
+    """
+    converted_titles = []
+
+    def _convert_md_to_html(markdown_text, **kwargs):
+        title = re.search(r"# Title: (.*)", markdown_text).group(1)
+        converted_titles.append(title)
+        return f"<p>{markdown_text}</p>"
+
+    monkeypatch.setattr(
+        generate_page_html,
+        "convert_md_to_html",
+        _convert_md_to_html,
+    )
+    monkeypatch.setattr(
+        generate_page_html,
+        "_add_nb_to_html",
+        lambda converted_html, *args, **kwargs: (converted_html, {}),
+    )
+    monkeypatch.setattr(generate_page_html, "get_pandoc_version", lambda: "3.0")
+    return converted_titles
+
+
+@pytest.fixture
+def content_path(tmp_path):
+    """A textbook with one section of two pages, the second embedding a notebook."""
+    content_path = tmp_path / "content"
+    section_path = content_path / "01_section"
+    section_path.mkdir(parents=True)
+    (section_path / "README.md").write_text(
+        PAGE_TEMPLATE.format(title="1. Section", body="The section.")
+    )
+    (section_path / "01_first.md").write_text(
+        PAGE_TEMPLATE.format(title="1.1 First", body="The first page.")
+    )
+    (section_path / "02_second.md").write_text(
+        PAGE_TEMPLATE.format(
+            title="1.2 Second",
+            body="The second page.\n\n[[example.ipynb][Example]]",
+        )
+    )
+    (section_path / "example.json").write_text('{"Example": "<p>Output</p>"}')
+    return content_path
+
+
+def _generate_pages(content_path, converted_titles):
+    """Generate every page, and return the titles of those that were regenerated."""
+    converted_titles.clear()
+    generate_page_html.generate_page_html(
+        content_path,
+        project_root / "templates",
+        False,
+        page_dependencies_path=content_path.parent / ".build_cache" / "deps.json",
+    )
+    return sorted(converted_titles)
+
+
+############################################################
+# Unit Tests
+# ----------------------
+
+
+def test_unchanged_pages_are_skipped(content_path, converted_titles):
+    """Pages whose inputs are all unchanged are not regenerated."""
+    all_titles = ["1.1 First", "1.2 Second"]
+    assert _generate_pages(content_path, converted_titles) == all_titles
+    assert _generate_pages(content_path, converted_titles) == []
+
+
+def test_markdown_edit_regenerates_page(content_path, converted_titles):
+    """Editing the content of a page only regenerates that page."""
+    _generate_pages(content_path, converted_titles)
+    (content_path / "01_section" / "01_first.md").write_text(
+        PAGE_TEMPLATE.format(title="1.1 First", body="The edited first page.")
+    )
+    assert _generate_pages(content_path, converted_titles) == ["1.1 First"]
+
+
+def test_title_edit_regenerates_every_page(content_path, converted_titles):
+    """Editing a page title regenerates every page, since it is in every sidebar."""
+    _generate_pages(content_path, converted_titles)
+    (content_path / "01_section" / "01_first.md").write_text(
+        PAGE_TEMPLATE.format(title="1.1 Renamed", body="The first page.")
+    )
+    assert _generate_pages(content_path, converted_titles) == [
+        "1.1 Renamed",
+        "1.2 Second",
+    ]
+
+
+def test_nb_json_edit_regenerates_page(content_path, converted_titles):
+    """Editing the JSON output of a notebook regenerates the pages embedding it."""
+    _generate_pages(content_path, converted_titles)
+    (content_path / "01_section" / "example.json").write_text(
+        '{"Example": "<p>New output</p>"}'
+    )
+    assert _generate_pages(content_path, converted_titles) == ["1.2 Second"]
+
+
+def test_edited_output_html_is_regenerated(content_path, converted_titles):
+    """A page whose output HTML file was edited by hand is regenerated."""
+    _generate_pages(content_path, converted_titles)
+    page_dependencies = generate_page_html._load_page_dependencies(
+        content_path.parent / ".build_cache" / "deps.json"
+    )
+    (first_html_path,) = [
+        Path(page_key) for page_key in page_dependencies if "first" in page_key
+    ]
+    with open(first_html_path, "a") as f:
+        f.write("<!-- Edited by hand -->")
+    assert _generate_pages(content_path, converted_titles) == ["1.1 First"]
+
+    first_html_path.unlink()
+    assert _generate_pages(content_path, converted_titles) == ["1.1 First"]
+
+
+def test_images_are_lazy_loaded(content_path, converted_titles):
+    """Images are lazy-loaded even if they are not optimized."""
+    (content_path / "01_section" / "01_first.md").write_text(
+        PAGE_TEMPLATE.format(
+            title="1.1 First",
+            body='<img src="images/a.png"> <img loading="eager" src="images/b.png">',
+        )
+    )
+    _generate_pages(content_path, converted_titles)
+    (first_html_path,) = content_path.glob("**/*first*.html")
+    first_html = first_html_path.read_text()
+    assert '<img loading="lazy" decoding="async" src="images/a.png">' in first_html
+    assert '<img decoding="async" loading="eager" src="images/b.png">' in first_html
+
+
+def test_fragment_urls_are_rebased():
+    """Relative URLs of notebook fragment files are made relative to their directory."""
+    fragment_html = generate_page_html._rebase_relative_urls(
+        '<img src="output_nb_example/fig.png" '
+        'srcset="output_nb_example/optimized/fig_480w.png 480w, '
+        'output_nb_example/fig.png 960w">'
+        '<a href="#example">Example</a>'
+        '<img src="https://example.com/fig.png">',
+        "../",
+    )
+    assert fragment_html == (
+        '<img src="../output_nb_example/fig.png" '
+        'srcset="../output_nb_example/optimized/fig_480w.png 480w, '
+        '../output_nb_example/fig.png 960w">'
+        '<a href="#example">Example</a>'
+        '<img src="https://example.com/fig.png">'
+    )
@@ -0,0 +1,248 @@
+# %%
+
+import pytest  # noqa
+import sys
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import threading
+
+import requests
+
+# Add project root to sys.path to allow importing from scripts folder
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(
+    0,
+    str(project_root),
+)
+
+import scripts.process_hnn_commit_hashes as process_hnn_commit_hashes  # noqa
+
+FULL_COMMIT = "92b000c597052a661d9e177b8754695446336b96"
+MASTER_COMMIT = "1413550b2c610b700b7bb12ce7e1ae408ef8d4d3"
+
+############################################################
+# Fixtures
+# --------------------
+
+
+@pytest.fixture
+def api_server():
+    """
+    Serve a local stand-in for the PyPI and GitHub APIs.
+
+    Responses are looked up in `server.routes` (URL path -> (status, JSON body)), and
+    every requested path is recorded in `server.requested_paths`.
+    """
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.server.requested_paths.append(self.path)
+            status, body = self.server.routes.get(self.path, (404, {}))
+            encoded_body = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded_body)))
+            self.end_headers()
+            self.wfile.write(encoded_body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.routes = {
+        "/pypi/hnn-core/json": (200, {"info": {"version": "0.4.2"}}),
+        "/repos/jonescompneurolab/hnn-core/commits/master": (
+            200,
+            {"sha": MASTER_COMMIT},
+        ),
+        "/repos/asoplata/hnn-core/commits/92b000c": (200, {"sha": FULL_COMMIT}),
+    }
+    server.requested_paths = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _no_retry_delay(monkeypatch):
+    monkeypatch.setattr(process_hnn_commit_hashes, "REQUEST_RETRY_DELAY", 0)
+
+
+############################################################
+# Unit Tests
+# ----------------------
+
+
+def test_latest_stable_version_is_cached(api_server, tmp_path):
+    """The latest stable version is only looked up once within its TTL."""
+    version_cache_path = tmp_path / "hnn_versions.json"
+    for expected_from_cache in (False, True):
+        version, from_cache = process_hnn_commit_hashes.resolve_latest_stable_version(
+            version_cache_path,
+            pypi_url=f"{api_server.url}/pypi",
+        )
+        assert version == "0.4.2"
+        assert from_cache == expected_from_cache
+    assert api_server.requested_paths == ["/pypi/hnn-core/json"]
+
+
+def test_expired_branch_commit_is_looked_up_again(api_server, tmp_path, monkeypatch):
+    """Branch commits are looked up again once their TTL has passed."""
+    version_cache_path = tmp_path / "hnn_versions.json"
+    monkeypatch.setitem(
+        process_hnn_commit_hashes.VERSION_CACHE_TTLS,
+        "branch_commit",
+        0,
+    )
+    for _ in range(2):
+        commit, from_cache = process_hnn_commit_hashes.resolve_commit_hash(
+            "jonescompneurolab",
+            "master",
+            version_cache_path,
+            github_url=api_server.url,
+        )
+        assert commit == MASTER_COMMIT
+        assert not from_cache
+    assert len(api_server.requested_paths) == 2
+
+
+def test_short_commit_is_cached_forever(api_server, tmp_path, monkeypatch):
+    """Abbreviated commit hashes always resolve to the same full hash."""
+    version_cache_path = tmp_path / "hnn_versions.json"
+    monkeypatch.setitem(
+        process_hnn_commit_hashes.VERSION_CACHE_TTLS,
+        "branch_commit",
+        0,
+    )
+    for expected_from_cache in (False, True):
+        commit, from_cache = process_hnn_commit_hashes.resolve_commit_hash(
+            "asoplata",
+            "92b000c",
+            version_cache_path,
+            github_url=api_server.url,
+        )
+        assert commit == FULL_COMMIT
+        assert from_cache == expected_from_cache
+    assert len(api_server.requested_paths) == 1
+
+
+def test_offline_uses_cache_only(api_server, tmp_path):
+    """Offline lookups never make requests, and fail if nothing was cached."""
+    version_cache_path = tmp_path / "hnn_versions.json"
+    with pytest.raises(RuntimeError, match="offline"):
+        process_hnn_commit_hashes.resolve_latest_stable_version(
+            version_cache_path,
+            offline=True,
+            pypi_url=f"{api_server.url}/pypi",
+        )
+    process_hnn_commit_hashes.resolve_latest_stable_version(
+        version_cache_path,
+        pypi_url=f"{api_server.url}/pypi",
+    )
+    api_server.requested_paths.clear()
+
+    # Make the cached version as old as possible
+    version_cache = json.loads(version_cache_path.read_text())
+    for cached in version_cache["values"].values():
+        cached["fetched_at"] = 0
+    version_cache_path.write_text(json.dumps(version_cache))
+
+    version, from_cache = process_hnn_commit_hashes.resolve_latest_stable_version(
+        version_cache_path,
+        offline=True,
+        pypi_url=f"{api_server.url}/pypi",
+    )
+    assert (version, from_cache) == ("0.4.2", True)
+    assert api_server.requested_paths == []
+
+
+def test_server_errors_are_retried(api_server):
+    """Server errors are retried, up to `REQUEST_ATTEMPTS` attempts in total."""
+    api_server.routes["/pypi/hnn-core/json"] = (503, {})
+    with pytest.raises(requests.HTTPError):
+        process_hnn_commit_hashes.resolve_latest_stable_version(
+            pypi_url=f"{api_server.url}/pypi",
+        )
+    assert len(api_server.requested_paths) == (
+        process_hnn_commit_hashes.REQUEST_ATTEMPTS
+    )
+
+
+def test_unreachable_api_falls_back_to_expired_cache(api_server, tmp_path):
+    """If the API cannot be reached, an expired cached value is used with a warning."""
+    version_cache_path = tmp_path / "hnn_versions.json"
+    process_hnn_commit_hashes.resolve_latest_stable_version(
+        version_cache_path,
+        pypi_url=f"{api_server.url}/pypi",
+    )
+    version_cache = json.loads(version_cache_path.read_text())
+    for cached in version_cache["values"].values():
+        cached["fetched_at"] = 0
+    version_cache_path.write_text(json.dumps(version_cache))
+
+    api_server.routes["/pypi/hnn-core/json"] = (429, {})
+    with pytest.warns(UserWarning, match="Could not look up"):
+        version, from_cache = process_hnn_commit_hashes.resolve_latest_stable_version(
+            version_cache_path,
+            pypi_url=f"{api_server.url}/pypi",
+        )
+    assert (version, from_cache) == ("0.4.2", True)
+
+
+def test_missing_commit_is_not_retried(api_server):
+    """Commits that do not exist fail immediately."""
+    with pytest.raises(requests.HTTPError):
+        process_hnn_commit_hashes.resolve_commit_hash(
+            "asoplata",
+            "deadbee",
+            github_url=api_server.url,
+        )
+    assert len(api_server.requested_paths) == 1
+
+
+@pytest.mark.parametrize(
+    "direct_url, expected_commit",
+    [
+        # Regular install from PyPI
+        (None, "0.4.2"),
+        # Install from a git repository
+        (
+            {
+                "url": "https://github.com/asoplata/hnn-core.git",
+                "vcs_info": {"vcs": "git", "commit_id": FULL_COMMIT},
+            },
+            FULL_COMMIT,
+        ),
+        # Editable install from a local directory
+        ({"url": "file:///home/hnn-core", "dir_info": {"editable": True}}, "0.4.2"),
+    ],
+)
+def test_installed_commit_from_distribution_metadata(
+    monkeypatch,
+    direct_url,
+    expected_commit,
+):
+    """The installed commit is read from 'direct_url.json', if there is one."""
+
+    class _FakeDistribution:
+        version = "0.4.2"
+
+        def read_text(self, filename):
+            assert filename == "direct_url.json"
+            return None if direct_url is None else json.dumps(direct_url)
+
+    monkeypatch.setattr(
+        process_hnn_commit_hashes.metadata,
+        "distribution",
+        lambda name: _FakeDistribution(),
+    )
+    process_hnn_commit_hashes._read_installed_hnn_commit.cache_clear()
+    try:
+        assert process_hnn_commit_hashes.get_hnn_commit_hash() == expected_commit
+    finally:
+        process_hnn_commit_hashes._read_installed_hnn_commit.cache_clear()